@@ -0,0 +1,287 @@
+# ============================================================
+# PQEXPRESS - Caché en Memoria
+# Caché LRU con expiración (TTL) y caché de sesiones autenticadas
+# ============================================================
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+from dotenv import load_dotenv
+import threading
+import time
+import os
+
+# Cargar variables de entorno
+load_dotenv()
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+# Segundos que una sesión validada permanece en caché
+SESSION_CACHE_TTL_SEGUNDOS = float(os.getenv("SESSION_CACHE_TTL_SEGUNDOS", "60"))
+# Número máximo de sesiones en caché (se descartan las menos usadas)
+SESSION_CACHE_MAX_ENTRADAS = int(os.getenv("SESSION_CACHE_MAX_ENTRADAS", "10000"))
+
+
+# ============================================================
+# CACHÉ GENÉRICA LRU + TTL
+# ============================================================
+
+class CacheTTL:
+    """
+    Caché en memoria con política LRU y expiración por entrada.
+    Es segura para usarse desde varios hilos (threadpool de FastAPI).
+
+    Args:
+        max_entradas: Número máximo de entradas antes de descartar la menos usada.
+        ttl_segundos: Tiempo de vida por defecto de cada entrada.
+
+    Example:
+        >>> cache = CacheTTL(max_entradas=100, ttl_segundos=30)
+        >>> cache.guardar("clave", {"dato": 1})
+        >>> cache.obtener("clave")  # {"dato": 1}
+    """
+
+    def __init__(self, max_entradas: int, ttl_segundos: float):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._entradas: "OrderedDict[Any, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expiradas = 0
+        self.descartadas = 0
+
+    def obtener(self, clave: Any) -> Optional[Any]:
+        """
+        Obtiene un valor de la caché.
+
+        Returns:
+            El valor almacenado, o None si no existe o ya expiró.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            expira, valor = entrada
+            if expira <= ahora:
+                self._eliminar(clave)
+                self.expiradas += 1
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave: Any, valor: Any, ttl_segundos: Optional[float] = None) -> None:
+        """
+        Guarda un valor en la caché.
+
+        Args:
+            clave: Clave de la entrada.
+            valor: Valor a almacenar.
+            ttl_segundos: Tiempo de vida (usa el default de la caché si no se especifica).
+        """
+        if ttl_segundos is None:
+            ttl_segundos = self.ttl_segundos
+        if ttl_segundos <= 0 or self.max_entradas <= 0:
+            return
+        with self._lock:
+            if clave in self._entradas:
+                self._eliminar(clave)
+            self._entradas[clave] = (time.monotonic() + ttl_segundos, valor)
+            self._al_guardar(clave, valor)
+            while len(self._entradas) > self.max_entradas:
+                clave_vieja = next(iter(self._entradas))
+                self._eliminar(clave_vieja)
+                self.descartadas += 1
+
+    def guardar_si_no_existe(self, clave: Any, valor: Any, ttl_segundos: Optional[float] = None) -> bool:
+        """
+        Guarda un valor solo si la clave no tiene una entrada vigente
+        (comprobación y escritura atómicas).
+
+        Returns:
+            bool: True si se guardó; False si ya existía.
+        """
+        if ttl_segundos is None:
+            ttl_segundos = self.ttl_segundos
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada[0] > time.monotonic():
+                    return False
+                self._eliminar(clave)
+                self.expiradas += 1
+            if ttl_segundos <= 0 or self.max_entradas <= 0:
+                return True
+            self._entradas[clave] = (time.monotonic() + ttl_segundos, valor)
+            self._al_guardar(clave, valor)
+            while len(self._entradas) > self.max_entradas:
+                self._eliminar(next(iter(self._entradas)))
+                self.descartadas += 1
+            return True
+
+    def invalidar(self, clave: Any) -> bool:
+        """
+        Elimina una entrada de la caché.
+
+        Returns:
+            bool: True si la entrada existía.
+        """
+        with self._lock:
+            if clave not in self._entradas:
+                return False
+            self._eliminar(clave)
+            return True
+
+    def limpiar(self) -> None:
+        """Elimina todas las entradas de la caché."""
+        with self._lock:
+            for clave in list(self._entradas):
+                self._eliminar(clave)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """
+        Retorna los contadores de uso de la caché.
+
+        Returns:
+            dict: Entradas actuales, aciertos, fallos, expiradas, descartadas y tasa de aciertos.
+        """
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl_segundos,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expiradas": self.expiradas,
+                "descartadas": self.descartadas,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    # Ganchos para subclases (se llaman con el lock adquirido)
+
+    def _eliminar(self, clave: Any) -> None:
+        expira, valor = self._entradas.pop(clave)
+        self._al_eliminar(clave, valor)
+
+    def _al_guardar(self, clave: Any, valor: Any) -> None:
+        pass
+
+    def _al_eliminar(self, clave: Any, valor: Any) -> None:
+        pass
+
+
+# ============================================================
+# CACHÉ DE SESIONES AUTENTICADAS
+# ============================================================
+
+class CacheSesiones(CacheTTL):
+    """
+    Caché de sesiones validadas, indexada por el hash del token JWT.
+
+    Cada entrada guarda una copia de los datos del repartidor, de modo que
+    obtener_usuario_actual evita consultar tokens_sesion y repartidores
+    mientras la entrada esté vigente. Mantiene un índice por repartidor
+    para invalidar todas sus sesiones de una sola vez.
+
+    Cada invalidación incrementa la generación del repartidor: una
+    validación que empezó antes (consultando la BD) y termina después no
+    vuelve a guardar la sesión ya revocada (ver guardar_sesion).
+    """
+
+    def __init__(self, max_entradas: int, ttl_segundos: float):
+        super().__init__(max_entradas, ttl_segundos)
+        # Reentrante: guardar_sesion compara la generación y guarda bajo el mismo lock
+        self._lock = threading.RLock()
+        self._por_repartidor: Dict[int, Set[str]] = {}
+        self._generaciones: Dict[int, int] = {}
+
+    def generacion(self, id_repartidor: int) -> int:
+        """Número de invalidaciones de las sesiones del repartidor en este proceso."""
+        with self._lock:
+            return self._generaciones.get(id_repartidor, 0)
+
+    def guardar_sesion(
+        self,
+        hash_token: str,
+        datos_usuario: Dict[str, Any],
+        expira_en: datetime,
+        generacion: Optional[int] = None
+    ) -> bool:
+        """
+        Guarda una sesión validada sin exceder la expiración del token.
+
+        Args:
+            hash_token: Hash SHA-256 del token JWT.
+            datos_usuario: Columnas del repartidor autenticado.
+            expira_en: Fecha/hora (UTC) de expiración de la sesión.
+            generacion: generacion() leída antes de validar la sesión en BD;
+                si cambió desde entonces la sesión no se guarda.
+
+        Returns:
+            bool: True si se guardó.
+        """
+        restante = (expira_en - datetime.utcnow()).total_seconds()
+        with self._lock:
+            id_repartidor = datos_usuario["id_repartidor"]
+            if generacion is not None and self._generaciones.get(id_repartidor, 0) != generacion:
+                return False
+            self.guardar(hash_token, datos_usuario, min(self.ttl_segundos, restante))
+            return True
+
+    def invalidar_sesion(self, hash_token: str, id_repartidor: Optional[int] = None) -> bool:
+        """
+        Elimina una sesión de la caché (logout).
+
+        Args:
+            hash_token: Hash SHA-256 del token JWT.
+            id_repartidor: Dueño del token, para descartar validaciones en curso.
+
+        Returns:
+            bool: True si la entrada existía.
+        """
+        with self._lock:
+            if id_repartidor is not None:
+                self._generaciones[id_repartidor] = self._generaciones.get(id_repartidor, 0) + 1
+            return self.invalidar(hash_token)
+
+    def invalidar_repartidor(self, id_repartidor: int) -> int:
+        """
+        Elimina todas las sesiones en caché de un repartidor.
+
+        Returns:
+            int: Número de entradas eliminadas.
+        """
+        with self._lock:
+            self._generaciones[id_repartidor] = self._generaciones.get(id_repartidor, 0) + 1
+            claves = self._por_repartidor.get(id_repartidor, set()).copy()
+            for clave in claves:
+                if clave in self._entradas:
+                    self._eliminar(clave)
+            return len(claves)
+
+    def _al_guardar(self, clave: str, valor: Dict[str, Any]) -> None:
+        self._por_repartidor.setdefault(valor["id_repartidor"], set()).add(clave)
+
+    def _al_eliminar(self, clave: str, valor: Dict[str, Any]) -> None:
+        claves = self._por_repartidor.get(valor["id_repartidor"])
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._por_repartidor[valor["id_repartidor"]]
+
+
+# Instancia global usada por security.obtener_usuario_actual
+cache_sesiones = CacheSesiones(
+    max_entradas=SESSION_CACHE_MAX_ENTRADAS,
+    ttl_segundos=SESSION_CACHE_TTL_SEGUNDOS
+)
@@ -0,0 +1,288 @@
+# ============================================================
+# PQEXPRESS - Compresión de Respuestas
+# gzip / brotli con umbral de tamaño, tipos permitidos y caché por ETag
+# ============================================================
+"""
+Comprime las respuestas de un solo bloque (JSONResponse y similares) si:
+- el cliente acepta br o gzip (Accept-Encoding, con valores q),
+- el Content-Type está en COMPRESION_TIPOS,
+- el cuerpo mide al menos COMPRESION_MIN_BYTES,
+- la respuesta no trae ya Content-Encoding.
+
+Las respuestas en streaming (/stream, evidencias) pasan sin tocar: con
+SSE, comprimir obligaría a retener eventos.
+
+Toda respuesta con un tipo de COMPRESION_TIPOS (y todo 304) lleva
+Vary: Accept-Encoding aunque se envíe sin comprimir (cliente sin gzip,
+cuerpo bajo el umbral, streaming): su codificación depende de ese
+encabezado y una caché intermedia no debe servir una variante por otra.
+
+Si la respuesta tiene ETag (listas de envíos, ver app/etags.py) los
+bytes comprimidos se guardan en una caché LRU acotada por entradas y por
+bytes, así que las repeticiones de la misma versión no se recomprimen.
+El ETag de la variante comprimida se vuelve débil (W/"..."); etags.py
+ya compara If-None-Match ignorando W/.
+
+Brotli es opcional (paquete `brotli`); sin él solo se ofrece gzip.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
+import asyncio
+import gzip
+import os
+import threading
+import time
+
+from .cache import CacheTTL
+
+# Cargar variables de entorno
+load_dotenv()
+
+try:
+    import brotli
+    BROTLI_DISPONIBLE = True
+except ImportError:  # Sin brotli se responde con gzip
+    brotli = None
+    BROTLI_DISPONIBLE = False
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+COMPRESION_HABILITADA = os.getenv("COMPRESION_HABILITADA", "True").lower() == "true"
+# Cuerpos más chicos no se comprimen (el encabezado gzip y el CPU no compensan)
+COMPRESION_MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))
+COMPRESION_TIPOS = frozenset(
+    tipo.strip() for tipo in os.getenv(
+        "COMPRESION_TIPOS", "application/json,text/plain,text/html,text/css,application/javascript"
+    ).split(",") if tipo.strip()
+)
+# Niveles: gzip 1-9, brotli 0-11 (ver benchmarks/bench_compresion.py)
+COMPRESION_NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+COMPRESION_NIVEL_BROTLI = int(os.getenv("COMPRESION_NIVEL_BROTLI", "4"))
+# Cuerpos a partir de este tamaño se comprimen en un hilo (zlib y brotli liberan el GIL)
+COMPRESION_HILO_BYTES = int(os.getenv("COMPRESION_HILO_BYTES", "65536"))
+# Caché de respuestas comprimidas con ETag
+COMPRESION_CACHE_ENTRADAS = int(os.getenv("COMPRESION_CACHE_ENTRADAS", "1000"))
+COMPRESION_CACHE_MAX_BYTES = int(os.getenv("COMPRESION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+COMPRESION_CACHE_TTL_SEGUNDOS = float(os.getenv("COMPRESION_CACHE_TTL_SEGUNDOS", "600"))
+
+CODIFICACIONES = ("br", "gzip") if BROTLI_DISPONIBLE else ("gzip",)
+
+
+def elegir_codificacion(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Elige la codificación según Accept-Encoding (valores q incluidos).
+    Ante empate se prefiere br.
+
+    Returns:
+        'br', 'gzip' o None si el cliente no acepta ninguna.
+    """
+    if not accept_encoding:
+        return None
+    pesos: Dict[str, float] = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        pesos[nombre.strip().lower()] = q
+
+    comodin = pesos.get("*", 0.0)
+    mejor, mejor_q = None, 0.0
+    for codificacion in CODIFICACIONES:
+        q = pesos.get(codificacion, comodin)
+        if q > mejor_q:
+            mejor, mejor_q = codificacion, q
+    return mejor
+
+
+def comprimir(cuerpo: bytes, codificacion: str) -> bytes:
+    """Comprime con el nivel configurado para la codificación."""
+    if codificacion == "br":
+        return brotli.compress(cuerpo, quality=COMPRESION_NIVEL_BROTLI)
+    return gzip.compress(cuerpo, compresslevel=COMPRESION_NIVEL_GZIP, mtime=0)
+
+
+class CacheComprimidos(CacheTTL):
+    """CacheTTL de cuerpos comprimidos, acotada también por bytes totales."""
+
+    def __init__(self, max_entradas: int, max_bytes: int, ttl_segundos: float):
+        super().__init__(max_entradas, ttl_segundos)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+
+    def _al_guardar(self, clave: Any, valor: bytes) -> None:
+        self.bytes += len(valor)
+        while self.bytes > self.max_bytes and len(self._entradas) > 1:
+            self._eliminar(next(iter(self._entradas)))
+            self.descartadas += 1
+
+    def _al_eliminar(self, clave: Any, valor: bytes) -> None:
+        self.bytes -= len(valor)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {**super().estadisticas(), "bytes": self.bytes, "max_bytes": self.max_bytes}
+
+
+class MetricasCompresion:
+    """Contadores de la compresión de este proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.comprimidas: Dict[str, int] = {codificacion: 0 for codificacion in CODIFICACIONES}
+        self.omitidas_tamano = 0
+        self.bytes_originales = 0
+        self.bytes_enviados = 0
+        self.compresion_segundos = 0.0
+
+    def registrar(self, codificacion: str, originales: int, enviados: int, segundos: float) -> None:
+        with self._lock:
+            self.comprimidas[codificacion] += 1
+            self.bytes_originales += originales
+            self.bytes_enviados += enviados
+            self.compresion_segundos += segundos
+
+    def registrar_omitida(self) -> None:
+        with self._lock:
+            self.omitidas_tamano += 1
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(self.comprimidas.values())
+            return {
+                "habilitada": COMPRESION_HABILITADA,
+                "codificaciones": list(CODIFICACIONES),
+                "min_bytes": COMPRESION_MIN_BYTES,
+                "comprimidas": dict(self.comprimidas),
+                "omitidas_por_tamano": self.omitidas_tamano,
+                "bytes_originales": self.bytes_originales,
+                "bytes_enviados": self.bytes_enviados,
+                "proporcion": round(self.bytes_enviados / self.bytes_originales, 4) if self.bytes_originales else None,
+                "compresion_ms_total": round(self.compresion_segundos * 1000, 2),
+                "compresion_ms_promedio": round(self.compresion_segundos / total * 1000, 3) if total else 0.0,
+                "cache": cache_comprimidos.estadisticas(),
+            }
+
+
+# Instancias globales usadas por el middleware y /metricas/compresion
+cache_comprimidos = CacheComprimidos(
+    max_entradas=COMPRESION_CACHE_ENTRADAS,
+    max_bytes=COMPRESION_CACHE_MAX_BYTES,
+    ttl_segundos=COMPRESION_CACHE_TTL_SEGUNDOS
+)
+metricas_compresion = MetricasCompresion()
+
+
+def _comprimible(encabezados: MutableHeaders) -> bool:
+    """El tipo está en COMPRESION_TIPOS y la app no lo codificó ya."""
+    tipo = encabezados.get("content-type", "").split(";")[0].strip().lower()
+    return tipo in COMPRESION_TIPOS and "content-encoding" not in encabezados
+
+
+async def _comprimir_medido(cuerpo: bytes, codificacion: str) -> Tuple[bytes, float]:
+    inicio = time.perf_counter()
+    if len(cuerpo) >= COMPRESION_HILO_BYTES:
+        comprimido = await asyncio.to_thread(comprimir, cuerpo, codificacion)
+    else:
+        comprimido = comprimir(cuerpo, codificacion)
+    return comprimido, time.perf_counter() - inicio
+
+
+class MiddlewareCompresion:
+    """
+    Middleware ASGI de compresión. Retiene http.response.start hasta ver
+    el primer fragmento del cuerpo: si es el único, decide y comprime; si
+    vienen más (streaming), lo deja pasar sin cambios.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codificacion = elegir_codificacion(Headers(scope=scope).get("accept-encoding"))
+        if codificacion is None:
+            async def enviar_sin_comprimir(mensaje):
+                if mensaje["type"] == "http.response.start":
+                    encabezados = MutableHeaders(raw=mensaje["headers"])
+                    if mensaje["status"] == 304 or _comprimible(encabezados):
+                        encabezados.add_vary_header("Accept-Encoding")
+                await send(mensaje)
+
+            await self.app(scope, receive, enviar_sin_comprimir)
+            return
+
+        estado: Dict[str, Any] = {"inicio": None, "decidido": False}
+
+        async def enviar(mensaje):
+            if estado["decidido"]:
+                await send(mensaje)
+                return
+            if mensaje["type"] == "http.response.start":
+                estado["inicio"] = mensaje
+                return
+            if mensaje["type"] != "http.response.body":
+                await send(mensaje)
+                return
+
+            estado["decidido"] = True
+            inicio = estado["inicio"]
+            encabezados = MutableHeaders(raw=inicio["headers"])
+            etag = encabezados.get("etag")
+            if inicio["status"] == 304:
+                # Mismo ETag (débil) que la variante comprimida que el cliente ya tiene
+                if etag and not etag.startswith("W/"):
+                    encabezados["etag"] = "W/" + etag
+                encabezados.add_vary_header("Accept-Encoding")
+                await send(inicio)
+                await send(mensaje)
+                return
+            if not _comprimible(encabezados):
+                await send(inicio)
+                await send(mensaje)
+                return
+
+            encabezados.add_vary_header("Accept-Encoding")
+            cuerpo = mensaje.get("body", b"")
+            if mensaje.get("more_body", False) or inicio["status"] == 204:
+                await send(inicio)
+                await send(mensaje)
+                return
+            if len(cuerpo) < COMPRESION_MIN_BYTES:
+                metricas_compresion.registrar_omitida()
+                await send(inicio)
+                await send(mensaje)
+                return
+
+            clave = None
+            comprimido = None
+            if etag and inicio["status"] == 200:
+                clave = (scope["path"], scope.get("query_string", b""), etag, codificacion)
+                comprimido = cache_comprimidos.obtener(clave)
+            segundos = 0.0
+            if comprimido is None:
+                comprimido, segundos = await _comprimir_medido(cuerpo, codificacion)
+                if clave is not None:
+                    cache_comprimidos.guardar(clave, comprimido)
+            metricas_compresion.registrar(codificacion, len(cuerpo), len(comprimido), segundos)
+
+            encabezados["content-encoding"] = codificacion
+            encabezados["content-length"] = str(len(comprimido))
+            if etag and not etag.startswith("W/"):
+                encabezados["etag"] = "W/" + etag
+            await send(inicio)
+            await send({"type": "http.response.body", "body": comprimido})
+
+        await self.app(scope, receive, enviar)
+        if not estado["decidido"] and estado["inicio"] is not None:
+            # La app terminó sin enviar cuerpo
+            await send(estado["inicio"])
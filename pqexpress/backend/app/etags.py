@@ -0,0 +1,101 @@
+# ============================================================
+# PQEXPRESS - ETags de Envíos
+# Respuestas condicionales (If-None-Match → 304) a partir de una
+# versión barata de los envíos de cada repartidor
+# ============================================================
+
+from datetime import timedelta
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import Request, Response, status
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+import hashlib
+import os
+
+from .models import Envio
+
+# Cargar variables de entorno
+load_dotenv()
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+# Si el último cambio es más reciente que esto no se emite ETag: dos
+# escrituras en el mismo segundo (DATETIME de MySQL) darían la misma versión.
+# Con esto la versión sale solo de la BD y vale igual en todos los workers.
+ETAG_VENTANA_SEGUNDOS = int(os.getenv("ETAG_VENTANA_SEGUNDOS", "2"))
+
+
+def consulta_version(id_repartidor: int):
+    """
+    Huella de los envíos de un repartidor: cantidad, último modificado_en y
+    hora de la BD. Se resuelve solo con idx_envios_rep_modificado.
+    """
+    return select(
+        func.count(Envio.id_envio),
+        func.max(Envio.modificado_en),
+        func.now()
+    ).where(Envio.id_repartidor == id_repartidor)
+
+
+async def calcular_etag(db: AsyncSession, request: Request, id_repartidor: int) -> Optional[str]:
+    """
+    Calcula el ETag fuerte de una lectura de envíos.
+
+    Combina la huella de la BD (cantidad y último modificado_en), el
+    repartidor y la URL (ruta + parámetros). No depende del proceso, así
+    que el 304 funciona aunque cada sondeo caiga en otro worker.
+
+    Returns:
+        str: ETag entre comillas, o None si hubo cambios demasiado recientes.
+    """
+    total, ultimo_cambio, ahora = (await db.execute(consulta_version(id_repartidor))).one()
+    if ultimo_cambio is not None and ultimo_cambio > ahora - timedelta(seconds=ETAG_VENTANA_SEGUNDOS):
+        return None
+
+    huella = "|".join([
+        str(id_repartidor),
+        str(total),
+        ultimo_cambio.isoformat() if ultimo_cambio else "",
+        request.url.path,
+        str(request.query_params),
+    ])
+    return '"' + hashlib.sha256(huella.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def coincide_etag(if_none_match: Optional[str], etag: str) -> bool:
+    """Evalúa If-None-Match (lista separada por comas, '*' o ETags débiles W/)."""
+    if not if_none_match:
+        return False
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*" or candidato.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+async def respuesta_condicional(
+    request: Request,
+    response: Response,
+    db: AsyncSession,
+    id_repartidor: int
+) -> Optional[Response]:
+    """
+    Resuelve If-None-Match antes de consultar los envíos.
+
+    Returns:
+        Response: 304 si el cliente ya tiene la versión actual (el endpoint
+        debe retornarla tal cual). None para continuar; en ese caso el
+        ETag queda agregado a `response`.
+    """
+    etag = await calcular_etag(db, request, id_repartidor)
+    if etag is None:
+        return None
+
+    encabezados = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if coincide_etag(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=encabezados)
+    response.headers.update(encabezados)
+    return None
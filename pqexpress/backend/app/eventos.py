@@ -0,0 +1,263 @@
+# ============================================================
+# PQEXPRESS - Eventos de Envíos (pub/sub)
+# Notificaciones en vivo de cambios de estado para GET /envios/stream
+# ============================================================
+"""
+Cada repartidor tiene un canal; los endpoints que modifican envíos
+publican en él después del commit y cada conexión abierta de
+/envios/stream recibe el evento en su propia cola acotada.
+
+Backends (EVENTOS_BACKEND):
+- memoria: un solo proceso (por defecto)
+- redis: varios workers; cada proceso reenvía a sus conexiones locales
+  lo que llega por Redis pub/sub (requiere el paquete `redis`)
+
+Los eventos no se guardan: si una conexión se cae o su cola se llena,
+la app debe ponerse al día con GET /envios/sync.
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+import asyncio
+import itertools
+import json
+import logging
+import os
+
+# Cargar variables de entorno
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as redis_asyncio
+    REDIS_DISPONIBLE = True
+except ImportError:  # Solo necesario con EVENTOS_BACKEND=redis
+    redis_asyncio = None
+    REDIS_DISPONIBLE = False
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+EVENTOS_BACKEND = os.getenv("EVENTOS_BACKEND", "memoria").lower()
+EVENTOS_REDIS_URL = os.getenv("EVENTOS_REDIS_URL", "redis://localhost:6379/0")
+# Eventos que puede acumular una conexión lenta antes de pedirle resincronizar
+EVENTOS_COLA_MAX = int(os.getenv("EVENTOS_COLA_MAX", "100"))
+# Conexiones de /stream abiertas como máximo en este proceso
+EVENTOS_MAX_CONEXIONES = int(os.getenv("EVENTOS_MAX_CONEXIONES", "20000"))
+# Espera máxima al publicar en Redis (corre en la solicitud, después del commit)
+EVENTOS_PUBLICAR_TIMEOUT_MS = float(os.getenv("EVENTOS_PUBLICAR_TIMEOUT_MS", "200"))
+
+PREFIJO_CANAL_REDIS = "pqexpress:eventos:"
+
+# Evento que reemplaza a los perdidos cuando la cola de una conexión se llena
+TIPO_RESINCRONIZAR = "resincronizar"
+
+
+def canal_repartidor(id_repartidor: int) -> str:
+    """Nombre del canal de eventos de un repartidor."""
+    return f"repartidor:{id_repartidor}"
+
+
+class Suscripcion:
+    """
+    Conexión suscrita a un canal, con cola acotada (backpressure).
+
+    Si el cliente no consume a tiempo y la cola se llena, los eventos
+    pendientes se descartan y el siguiente que recibe es 'resincronizar'.
+    """
+
+    __slots__ = ("canal", "cola", "desbordada")
+
+    def __init__(self, canal: str, max_cola: int):
+        self.canal = canal
+        self.cola: asyncio.Queue = asyncio.Queue(max_cola)
+        self.desbordada = False
+
+    def entregar(self, evento: Dict[str, Any]) -> bool:
+        """Encola sin esperar. Returns: False si la cola estaba llena."""
+        if self.desbordada:
+            return False
+        try:
+            self.cola.put_nowait(evento)
+            return True
+        except asyncio.QueueFull:
+            self.desbordada = True
+            return False
+
+    async def siguiente(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Siguiente evento, o None si no llegó ninguno en `timeout` segundos."""
+        if self.desbordada:
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.desbordada = False
+            return {"tipo": TIPO_RESINCRONIZAR, "datos": {}}
+        try:
+            return await asyncio.wait_for(self.cola.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BrokerEventos:
+    """Pub/sub en memoria: entrega cada evento a las suscripciones locales del canal."""
+
+    def __init__(self, max_cola: int):
+        self.max_cola = max_cola
+        self._canales: Dict[str, Set[Suscripcion]] = {}
+        self._secuencia = itertools.count(1)
+        # Métricas
+        self.conexiones = 0
+        self.max_conexiones_observado = 0
+        self.publicados = 0
+        self.entregados = 0
+        self.desbordes = 0
+
+    def suscribir(self, canal: str) -> Suscripcion:
+        suscripcion = Suscripcion(canal, self.max_cola)
+        self._canales.setdefault(canal, set()).add(suscripcion)
+        self.conexiones += 1
+        self.max_conexiones_observado = max(self.max_conexiones_observado, self.conexiones)
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion) -> None:
+        suscriptores = self._canales.get(suscripcion.canal)
+        if suscriptores is None or suscripcion not in suscriptores:
+            return
+        suscriptores.discard(suscripcion)
+        if not suscriptores:
+            del self._canales[suscripcion.canal]
+        self.conexiones -= 1
+
+    async def publicar(self, canal: str, tipo: str, datos: Dict[str, Any]) -> None:
+        """Publica un evento en el canal."""
+        self.publicados += 1
+        self.entregar_local(canal, {"id": next(self._secuencia), "tipo": tipo, "datos": datos})
+
+    def entregar_local(self, canal: str, evento: Dict[str, Any]) -> None:
+        """Entrega un evento a las conexiones de este proceso suscritas al canal."""
+        for suscripcion in list(self._canales.get(canal, ())):
+            if suscripcion.entregar(evento):
+                self.entregados += 1
+            elif suscripcion.desbordada:
+                self.desbordes += 1
+
+    async def cerrar(self) -> None:
+        """Libera recursos del backend (shutdown)."""
+
+    def estadisticas(self) -> dict:
+        """Contadores del broker para /metricas/eventos."""
+        return {
+            "backend": "memoria",
+            "conexiones": self.conexiones,
+            "max_conexiones_observado": self.max_conexiones_observado,
+            "canales": len(self._canales),
+            "publicados": self.publicados,
+            "entregados": self.entregados,
+            "desbordes": self.desbordes,
+        }
+
+
+class BrokerEventosRedis(BrokerEventos):
+    """
+    Pub/sub entre workers sobre Redis. Publicar envía a Redis; una tarea
+    por proceso escucha todos los canales y entrega a las conexiones locales.
+    """
+
+    def __init__(self, max_cola: int, url: str):
+        super().__init__(max_cola)
+        self._redis = redis_asyncio.from_url(url)
+        self._escucha: Optional[asyncio.Task] = None
+        self.timeout_publicar = EVENTOS_PUBLICAR_TIMEOUT_MS / 1000
+        self.fallos_publicacion = 0
+
+    def suscribir(self, canal: str) -> Suscripcion:
+        if self._escucha is None or self._escucha.done():
+            self._escucha = asyncio.get_running_loop().create_task(self._escuchar())
+        return super().suscribir(canal)
+
+    async def publicar(self, canal: str, tipo: str, datos: Dict[str, Any]) -> None:
+        self.publicados += 1
+        evento = {"id": next(self._secuencia), "tipo": tipo, "datos": datos}
+        try:
+            await asyncio.wait_for(
+                self._redis.publish(PREFIJO_CANAL_REDIS + canal, json.dumps(evento, default=str)),
+                timeout=self.timeout_publicar
+            )
+        except asyncio.TimeoutError:
+            # Redis lento no debe frenar la respuesta; el cambio ya está en la BD
+            self.fallos_publicacion += 1
+            logger.warning("Publicar en Redis tardó más de %.0f ms; evento solo local", self.timeout_publicar * 1000)
+            self.entregar_local(canal, evento)
+        except Exception:
+            # Sin Redis al menos se entera este proceso
+            self.fallos_publicacion += 1
+            logger.exception("No se pudo publicar el evento en Redis")
+            self.entregar_local(canal, evento)
+
+    async def _escuchar(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.psubscribe(PREFIJO_CANAL_REDIS + "*")
+                    async for mensaje in pubsub.listen():
+                        if mensaje["type"] != "pmessage":
+                            continue
+                        canal = mensaje["channel"].decode("utf-8")[len(PREFIJO_CANAL_REDIS):]
+                        self.entregar_local(canal, json.loads(mensaje["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Conexión a Redis pub/sub perdida; reintentando")
+                await asyncio.sleep(1)
+
+    async def cerrar(self) -> None:
+        if self._escucha is not None:
+            self._escucha.cancel()
+        await self._redis.aclose()
+
+    def estadisticas(self) -> dict:
+        return {
+            **super().estadisticas(),
+            "backend": "redis",
+            "fallos_publicacion": self.fallos_publicacion,
+        }
+
+
+def crear_broker_eventos() -> BrokerEventos:
+    """Crea el broker configurado por EVENTOS_BACKEND."""
+    if EVENTOS_BACKEND == "redis":
+        if not REDIS_DISPONIBLE:
+            raise RuntimeError("EVENTOS_BACKEND=redis requiere el paquete 'redis'")
+        return BrokerEventosRedis(EVENTOS_COLA_MAX, EVENTOS_REDIS_URL)
+    return BrokerEventos(EVENTOS_COLA_MAX)
+
+
+# Instancia global usada por routers/envios.py
+broker_eventos = crear_broker_eventos()
+
+
+async def publicar_cambios_envios(id_repartidor: int, cambios: List[Tuple[int, str]]) -> None:
+    """
+    Notifica a las conexiones del repartidor que cambiaron envíos.
+
+    Args:
+        cambios: Lista de (id_envio, estatus_envio) ya confirmados en la BD.
+    """
+    if not cambios:
+        return
+    await broker_eventos.publicar(
+        canal_repartidor(id_repartidor),
+        "envios_actualizados",
+        {"envios": [{"id_envio": id_envio, "estatus_envio": estatus} for id_envio, estatus in cambios]}
+    )
+
+
+def formatear_sse(evento: Dict[str, Any]) -> str:
+    """Serializa un evento en formato text/event-stream."""
+    lineas = []
+    if "id" in evento:
+        lineas.append(f"id: {evento['id']}")
+    lineas.append(f"event: {evento['tipo']}")
+    lineas.append("data: " + json.dumps(evento["datos"], ensure_ascii=False, default=str))
+    return "\n".join(lineas) + "\n\n"
@@ -0,0 +1,799 @@
+# ============================================================
+# PQEXPRESS - Almacén de Evidencias
+# Fotos de entrega fuera de la BD, direccionadas por contenido (SHA-256)
+# ============================================================
+
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Optional, Tuple
+from dotenv import load_dotenv
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+# Cargar variables de entorno
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+# Backend de almacenamiento: "local" (sistema de archivos) o "s3" (compatible con S3)
+EVIDENCIAS_BACKEND = os.getenv("EVIDENCIAS_BACKEND", "local").lower()
+# Directorio raíz del almacén local
+EVIDENCIAS_DIR = os.getenv("EVIDENCIAS_DIR", os.path.join("uploads", "evidencias"))
+# Configuración S3 (solo si EVIDENCIAS_BACKEND=s3)
+EVIDENCIAS_S3_BUCKET = os.getenv("EVIDENCIAS_S3_BUCKET", "")
+EVIDENCIAS_S3_PREFIJO = os.getenv("EVIDENCIAS_S3_PREFIJO", "evidencias")
+EVIDENCIAS_S3_ENDPOINT = os.getenv("EVIDENCIAS_S3_ENDPOINT") or None  # ej. MinIO
+# Tamaño máximo de una foto subida por POST /envios/{id}/evidencia
+EVIDENCIAS_MAX_BYTES = int(os.getenv("EVIDENCIAS_MAX_BYTES", str(10 * 1024 * 1024)))
+# Al iniciar, mover al almacén las fotos Base64 que quedaron pendientes
+EVIDENCIAS_REINTENTAR_AL_INICIAR = os.getenv("EVIDENCIAS_REINTENTAR_AL_INICIAR", "True").lower() == "true"
+# Un archivo liberado se borra solo si nadie lo reutilizó en este tiempo
+EVIDENCIAS_GRACIA_SEGUNDOS = float(os.getenv("EVIDENCIAS_GRACIA_SEGUNDOS", "600"))
+# Cada cuánto se revisan los archivos liberados
+EVIDENCIAS_BARRIDO_SEGUNDOS = float(os.getenv("EVIDENCIAS_BARRIDO_SEGUNDOS", "60"))
+# Bytes de la subida que se acumulan antes de escribirlos en un hilo
+EVIDENCIAS_BLOQUE_ESCRITURA = int(os.getenv("EVIDENCIAS_BLOQUE_ESCRITURA", str(256 * 1024)))
+
+# Firmas de archivo para detectar el tipo de imagen
+_FIRMAS_MIME = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+]
+
+
+def detectar_mime(contenido: bytes) -> str:
+    """
+    Detecta el tipo MIME de una imagen por sus primeros bytes.
+
+    Returns:
+        str: Tipo MIME, o application/octet-stream si no se reconoce.
+    """
+    for firma, mime in _FIRMAS_MIME:
+        if contenido.startswith(firma):
+            return mime
+    if contenido[:4] == b"RIFF" and contenido[8:12] == b"WEBP":
+        return "image/webp"
+    if contenido[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return "image/heic"
+    return "application/octet-stream"
+
+
+def decodificar_base64(datos: str) -> bytes:
+    """
+    Decodifica una imagen en Base64, aceptando el prefijo data URI
+    (data:image/jpeg;base64,...) y saltos de línea.
+
+    Raises:
+        ValueError: Si el texto no es Base64 válido o la imagen está vacía.
+    """
+    if datos.startswith("data:") and "," in datos:
+        datos = datos.split(",", 1)[1]
+    try:
+        contenido = base64.b64decode("".join(datos.split()), validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Base64 inválido: {e}")
+    if not contenido:
+        raise ValueError("Imagen de evidencia vacía")
+    return contenido
+
+
+def ruta_relativa(sha256: str) -> str:
+    """Ruta direccionada por contenido: ab/cd/abcd...."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+# ============================================================
+# ALMACENES
+# ============================================================
+
+class AlmacenEvidencias(ABC):
+    """
+    Interfaz de almacenamiento de evidencias direccionado por contenido.
+    La clave de cada archivo es el SHA-256 de sus bytes, por lo que guardar
+    dos veces la misma foto no duplica espacio.
+
+    Reutilizar un archivo existente renueva su fecha de modificación: el
+    recolector (RecolectorEvidencias) no borra archivos tocados dentro del
+    periodo de gracia aunque todavía no tengan referencias en la BD.
+    """
+
+    def guardar(self, contenido: bytes) -> str:
+        """
+        Guarda los bytes y retorna su SHA-256.
+        Operación bloqueante: desde código async usar asyncio.to_thread.
+        """
+        sha256 = hashlib.sha256(contenido).hexdigest()
+        if not self.tocar(sha256):
+            self._escribir(sha256, contenido)
+        return sha256
+
+    def guardar_archivo(self, ruta_temporal: str, sha256: str) -> None:
+        """
+        Incorpora al almacén un archivo temporal ya escrito cuyo hash se
+        calculó mientras se recibía. El temporal deja de existir al terminar.
+        """
+        try:
+            if not self.tocar(sha256):
+                self._mover(ruta_temporal, sha256)
+        finally:
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+
+    def directorio_temporal(self) -> str:
+        """Carpeta donde se reciben las subidas antes de incorporarlas."""
+        return tempfile.gettempdir()
+
+    @abstractmethod
+    def existe(self, sha256: str) -> bool:
+        """Indica si el archivo con ese SHA-256 ya está en el almacén."""
+
+    @abstractmethod
+    def leer(self, sha256: str) -> bytes:
+        """Retorna los bytes del archivo. FileNotFoundError si no existe."""
+
+    @abstractmethod
+    def eliminar(self, sha256: str) -> None:
+        """Borra el archivo; no falla si ya no existe."""
+
+    @abstractmethod
+    def tocar(self, sha256: str) -> bool:
+        """Renueva la fecha de modificación. False si el archivo no existe."""
+
+    @abstractmethod
+    def modificado_en(self, sha256: str) -> Optional[float]:
+        """Fecha de modificación (epoch), o None si el archivo no existe."""
+
+    @abstractmethod
+    def _escribir(self, sha256: str, contenido: bytes) -> None:
+        """Escribe bytes nuevos bajo su SHA-256."""
+
+    @abstractmethod
+    def _mover(self, ruta_temporal: str, sha256: str) -> None:
+        """Mueve un archivo temporal al almacén bajo su SHA-256."""
+
+
+class AlmacenLocal(AlmacenEvidencias):
+    """
+    Almacén en el sistema de archivos local.
+
+    Args:
+        directorio: Carpeta raíz; los archivos quedan en directorio/ab/cd/<sha256>.
+    """
+
+    def __init__(self, directorio: str):
+        self.directorio = os.path.abspath(directorio)
+
+    def ruta(self, sha256: str) -> str:
+        """Ruta absoluta del archivo de una evidencia."""
+        return os.path.join(self.directorio, *ruta_relativa(sha256).split("/"))
+
+    def existe(self, sha256: str) -> bool:
+        return os.path.exists(self.ruta(sha256))
+
+    def leer(self, sha256: str) -> bytes:
+        with open(self.ruta(sha256), "rb") as archivo:
+            return archivo.read()
+
+    def eliminar(self, sha256: str) -> None:
+        try:
+            os.remove(self.ruta(sha256))
+        except FileNotFoundError:
+            pass
+
+    def tocar(self, sha256: str) -> bool:
+        try:
+            os.utime(self.ruta(sha256))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def modificado_en(self, sha256: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.ruta(sha256))
+        except FileNotFoundError:
+            return None
+
+    def _escribir(self, sha256: str, contenido: bytes) -> None:
+        destino = self.ruta(sha256)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        # Escribir a un temporal y renombrar: nunca queda un archivo a medias
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as archivo:
+                archivo.write(contenido)
+            os.replace(temporal, destino)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+    def directorio_temporal(self) -> str:
+        # Mismo sistema de archivos que el destino: os.replace es atómico
+        directorio = os.path.join(self.directorio, "tmp")
+        os.makedirs(directorio, exist_ok=True)
+        return directorio
+
+    def _mover(self, ruta_temporal: str, sha256: str) -> None:
+        destino = self.ruta(sha256)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(ruta_temporal, destino)
+
+
+class AlmacenS3(AlmacenEvidencias):
+    """
+    Almacén compatible con S3 (AWS S3, MinIO, etc.). Requiere boto3.
+
+    Args:
+        bucket: Nombre del bucket.
+        prefijo: Prefijo de las claves dentro del bucket.
+        endpoint: URL del servicio (None para AWS).
+    """
+
+    def __init__(self, bucket: str, prefijo: str = "evidencias", endpoint: Optional[str] = None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("EVIDENCIAS_BACKEND=s3 requiere instalar boto3")
+        self.bucket = bucket
+        self.prefijo = prefijo.strip("/")
+        self._cliente = boto3.client("s3", endpoint_url=endpoint)
+
+    def clave(self, sha256: str) -> str:
+        return f"{self.prefijo}/{ruta_relativa(sha256)}"
+
+    def existe(self, sha256: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self._cliente.head_object(Bucket=self.bucket, Key=self.clave(sha256))
+            return True
+        except ClientError:
+            return False
+
+    def leer(self, sha256: str) -> bytes:
+        try:
+            respuesta = self._cliente.get_object(Bucket=self.bucket, Key=self.clave(sha256))
+        except self._cliente.exceptions.NoSuchKey:
+            raise FileNotFoundError(self.clave(sha256))
+        return respuesta["Body"].read()
+
+    def eliminar(self, sha256: str) -> None:
+        self._cliente.delete_object(Bucket=self.bucket, Key=self.clave(sha256))
+
+    def tocar(self, sha256: str) -> bool:
+        from botocore.exceptions import ClientError
+        clave = self.clave(sha256)
+        try:
+            cabecera = self._cliente.head_object(Bucket=self.bucket, Key=clave)
+        except ClientError:
+            return False
+        # S3 no permite cambiar LastModified: copiar el objeto sobre sí mismo lo renueva
+        self._cliente.copy_object(
+            Bucket=self.bucket,
+            Key=clave,
+            CopySource={"Bucket": self.bucket, "Key": clave},
+            MetadataDirective="REPLACE",
+            ContentType=cabecera.get("ContentType", "application/octet-stream")
+        )
+        return True
+
+    def modificado_en(self, sha256: str) -> Optional[float]:
+        from botocore.exceptions import ClientError
+        try:
+            cabecera = self._cliente.head_object(Bucket=self.bucket, Key=self.clave(sha256))
+        except ClientError:
+            return None
+        return cabecera["LastModified"].timestamp()
+
+    def _escribir(self, sha256: str, contenido: bytes) -> None:
+        self._cliente.put_object(
+            Bucket=self.bucket,
+            Key=self.clave(sha256),
+            Body=contenido,
+            ContentType=detectar_mime(contenido)
+        )
+
+    def _mover(self, ruta_temporal: str, sha256: str) -> None:
+        with open(ruta_temporal, "rb") as archivo:
+            mime = detectar_mime(archivo.read(16))
+        self._cliente.upload_file(
+            ruta_temporal, self.bucket, self.clave(sha256),
+            ExtraArgs={"ContentType": mime}
+        )
+
+
+def crear_almacen() -> AlmacenEvidencias:
+    """Crea el almacén configurado por EVIDENCIAS_BACKEND."""
+    if EVIDENCIAS_BACKEND == "s3":
+        return AlmacenS3(EVIDENCIAS_S3_BUCKET, EVIDENCIAS_S3_PREFIJO, EVIDENCIAS_S3_ENDPOINT)
+    return AlmacenLocal(EVIDENCIAS_DIR)
+
+
+# Instancia global usada por los routers
+almacen_evidencias = crear_almacen()
+
+
+# ============================================================
+# PROCESAMIENTO
+# ============================================================
+
+def guardar_evidencia(contenido: bytes) -> Tuple[str, int, str]:
+    """
+    Guarda una foto ya decodificada en el almacén.
+    Operación bloqueante: desde código async usar asyncio.to_thread.
+
+    Returns:
+        tuple: (sha256, tamaño en bytes, tipo MIME)
+    """
+    sha256 = almacen_evidencias.guardar(contenido)
+    return sha256, len(contenido), detectar_mime(contenido)
+
+
+def guardar_evidencia_base64(imagen_base64: str) -> Tuple[str, int, str]:
+    """
+    Decodifica una imagen Base64 y la guarda en el almacén.
+
+    Returns:
+        tuple: (sha256, tamaño en bytes, tipo MIME)
+
+    Raises:
+        ValueError: Si el Base64 no es válido o la imagen está vacía.
+    """
+    return guardar_evidencia(decodificar_base64(imagen_base64))
+
+
+def validar_evidencia_base64(imagen_base64: str) -> bytes:
+    """
+    Decodifica y valida la foto Base64 de una entrega antes de registrarla.
+
+    Raises:
+        EvidenciaInvalidaError: Base64 inválido o imagen vacía (400).
+        EvidenciaDemasiadoGrandeError: Si supera EVIDENCIAS_MAX_BYTES.
+    """
+    try:
+        contenido = decodificar_base64(imagen_base64)
+    except ValueError as e:
+        raise EvidenciaInvalidaError(f"imagen_evidencia inválida: {e}")
+    if len(contenido) > EVIDENCIAS_MAX_BYTES:
+        raise EvidenciaDemasiadoGrandeError(f"La foto supera el máximo de {EVIDENCIAS_MAX_BYTES} bytes")
+    return contenido
+
+
+async def procesar_evidencia(id_confirmacion: int, contenido: Optional[bytes] = None) -> None:
+    """
+    Mueve la foto de una confirmación de la columna imagen_evidencia al
+    almacén y deja en la fila solo hash, tamaño y tipo.
+
+    Los endpoints de entrega ya guardan la foto en el almacén antes del
+    commit; esta función atiende las filas antiguas que aún tienen el
+    Base64 (reintentar_evidencias_pendientes() o
+    herramientas/migrar_evidencias.py). Si falla, la fila conserva el
+    Base64. Al terminar se optimiza la foto y se genera su miniatura
+    (imagenes.procesar_imagen).
+
+    Args:
+        id_confirmacion: Confirmación con imagen_evidencia pendiente.
+        contenido: Foto ya decodificada (None para leerla de la fila).
+    """
+    from sqlalchemy import select, update
+    from .database import AsyncSessionLocal
+    from .imagenes import procesar_imagen
+    from .models import ConfirmacionEntrega
+
+    try:
+        async with AsyncSessionLocal() as db:
+            if contenido is None:
+                imagen_base64 = (await db.execute(
+                    select(ConfirmacionEntrega.imagen_evidencia)
+                    .where(ConfirmacionEntrega.id_confirmacion == id_confirmacion)
+                )).scalar_one_or_none()
+                if imagen_base64 is None:
+                    return
+                contenido = decodificar_base64(imagen_base64)
+
+            sha256 = await asyncio.to_thread(almacen_evidencias.guardar, contenido)
+            # Solo si sigue pendiente: una subida por /evidencia pudo reemplazarla
+            resultado = await db.execute(
+                update(ConfirmacionEntrega)
+                .where(
+                    ConfirmacionEntrega.id_confirmacion == id_confirmacion,
+                    ConfirmacionEntrega.imagen_evidencia.isnot(None)
+                )
+                .values(
+                    evidencia_sha256=sha256,
+                    evidencia_bytes=len(contenido),
+                    evidencia_mime=detectar_mime(contenido),
+                    imagen_evidencia=None
+                )
+            )
+            await db.commit()
+            if resultado.rowcount == 0:
+                liberar_evidencias(sha256)
+                return
+    except Exception:
+        logger.exception(
+            "No se pudo mover la evidencia de la confirmación %s (conserva imagen_evidencia)", id_confirmacion
+        )
+        return
+
+    await procesar_imagen(id_confirmacion, sha256)
+
+
+async def reintentar_evidencias_pendientes(tamano_lote: int = 100) -> int:
+    """
+    Mueve al almacén las fotos que quedaron en imagen_evidencia (filas
+    registradas antes de que las entregas guardaran la foto en el almacén).
+    Se lanza al iniciar la app; con varios workers todos la ejecutan, lo
+    cual es seguro (almacén por contenido y UPDATE condicional).
+
+    Returns:
+        int: Confirmaciones procesadas.
+    """
+    from sqlalchemy import select
+    from .database import AsyncSessionLocal
+    from .models import ConfirmacionEntrega
+
+    procesadas = 0
+    ultimo_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            ids = (await db.execute(
+                select(ConfirmacionEntrega.id_confirmacion)
+                .where(
+                    ConfirmacionEntrega.id_confirmacion > ultimo_id,
+                    ConfirmacionEntrega.imagen_evidencia.isnot(None)
+                )
+                .order_by(ConfirmacionEntrega.id_confirmacion)
+                .limit(tamano_lote)
+            )).scalars().all()
+        if not ids:
+            break
+        for id_confirmacion in ids:
+            await procesar_evidencia(id_confirmacion)
+        procesadas += len(ids)
+        ultimo_id = ids[-1]
+    if procesadas:
+        logger.info("Evidencias pendientes reintentadas: %d", procesadas)
+    return procesadas
+
+
+# ============================================================
+# RECOLECCIÓN DE ARCHIVOS LIBERADOS
+# ============================================================
+
+class RecolectorEvidencias:
+    """
+    Borra del almacén los archivos que una confirmación dejó de usar y que
+    nadie referencia ni reutilizó durante el periodo de gracia.
+
+    Contar referencias y borrar no puede ser atómico: entre ambos pasos una
+    subida del mismo contenido (mismo SHA-256) puede reutilizar el archivo y
+    hacer commit de su referencia. Por eso el borrado no es inmediato: el
+    barrido solo elimina archivos liberados hace más de `gracia_segundos`,
+    sin referencias en la BD y cuya fecha de modificación (que guardar()
+    renueva al reutilizarlos) también es anterior a la gracia.
+
+    Los candidatos viven en memoria de cada proceso: si se reinicia antes
+    del barrido, esos archivos quedan huérfanos (ocupan espacio, ninguna
+    fila apunta a ellos).
+    """
+
+    def __init__(self, gracia_segundos: float = EVIDENCIAS_GRACIA_SEGUNDOS):
+        self.gracia_segundos = gracia_segundos
+        self.eliminados = 0
+        self._candidatos: Dict[str, float] = {}
+
+    def registrar(self, *hashes: Optional[str]) -> None:
+        """Marca archivos liberados; se ignoran los None."""
+        ahora = time.time()
+        for sha256 in hashes:
+            if sha256:
+                self._candidatos[sha256] = ahora
+
+    @property
+    def pendientes(self) -> int:
+        return len(self._candidatos)
+
+    async def barrer(self) -> int:
+        """
+        Revisa los candidatos cuya gracia ya venció.
+
+        Returns:
+            int: Archivos eliminados del almacén.
+        """
+        from sqlalchemy import or_, select
+        from .database import AsyncSessionLocal
+        from .models import ConfirmacionEntrega
+
+        limite = time.time() - self.gracia_segundos
+        vencidos = [sha256 for sha256, liberado in self._candidatos.items() if liberado <= limite]
+        if not vencidos:
+            return 0
+        for sha256 in vencidos:
+            del self._candidatos[sha256]
+
+        async with AsyncSessionLocal() as db:
+            filas = (await db.execute(
+                select(ConfirmacionEntrega.evidencia_sha256, ConfirmacionEntrega.miniatura_sha256)
+                .where(or_(
+                    ConfirmacionEntrega.evidencia_sha256.in_(vencidos),
+                    ConfirmacionEntrega.miniatura_sha256.in_(vencidos)
+                ))
+            )).all()
+        referenciados = {sha256 for fila in filas for sha256 in fila}
+
+        eliminados = 0
+        for sha256 in vencidos:
+            if sha256 in referenciados:
+                continue
+            # La fecha se revisa después de consultar la BD: una subida que
+            # reutilizó el archivo antes de la consulta ya lo tocó
+            modificado = await asyncio.to_thread(almacen_evidencias.modificado_en, sha256)
+            if modificado is None:
+                continue
+            if modificado > limite:
+                # Reutilizado hace poco: se revisa de nuevo tras otra gracia
+                self.registrar(sha256)
+                continue
+            await asyncio.to_thread(almacen_evidencias.eliminar, sha256)
+            eliminados += 1
+        self.eliminados += eliminados
+        return eliminados
+
+    async def ejecutar(self, intervalo_segundos: float = EVIDENCIAS_BARRIDO_SEGUNDOS) -> None:
+        """Barrido periódico; se lanza al iniciar la app y se cancela al cerrarla."""
+        while True:
+            await asyncio.sleep(intervalo_segundos)
+            try:
+                eliminados = await self.barrer()
+                if eliminados:
+                    logger.info("Evidencias sin referencias eliminadas: %d", eliminados)
+            except Exception:
+                logger.exception("Error al barrer evidencias liberadas")
+
+
+# Instancia global: los routers registran, main.py lanza el barrido
+recolector_evidencias = RecolectorEvidencias()
+
+
+def liberar_evidencias(*hashes: Optional[str]) -> None:
+    """
+    Marca archivos que una confirmación dejó de usar (foto o miniatura
+    reemplazada). Se borran en el siguiente barrido de recolector_evidencias
+    si para entonces siguen sin referencias.
+
+    Args:
+        hashes: SHA-256 liberados (después del commit); se ignoran los None.
+    """
+    recolector_evidencias.registrar(*hashes)
+
+
+# ============================================================
+# SUBIDA EN STREAMING
+# ============================================================
+
+class EvidenciaInvalidaError(ValueError):
+    """
+    El cuerpo de la subida no tiene el formato esperado.
+
+    Attributes:
+        codigo: Código HTTP sugerido (400, o 415 si el Content-Type no se soporta).
+    """
+
+    def __init__(self, mensaje: str, codigo: int = 400):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+
+class EvidenciaDemasiadoGrandeError(ValueError):
+    """La foto supera EVIDENCIAS_MAX_BYTES."""
+
+
+class EscritorEvidencia:
+    """
+    Recibe una foto por bloques: la escribe a un archivo temporal y calcula
+    su SHA-256 al mismo tiempo, sin tener nunca el archivo completo en memoria.
+
+    Uso:
+        with EscritorEvidencia() as escritor:
+            escritor.escribir(bloque)  # por cada bloque recibido
+            sha256, tamano, mime = escritor.finalizar()
+
+    Si no se llama a finalizar(), el temporal se descarta al salir. Todos
+    los métodos hacen E/S bloqueante: desde código async llamarlos con
+    asyncio.to_thread (ver recibir_evidencia).
+    """
+
+    def __init__(self, almacen: Optional[AlmacenEvidencias] = None, limite_bytes: int = EVIDENCIAS_MAX_BYTES):
+        self.almacen = almacen or almacen_evidencias
+        self.limite_bytes = limite_bytes
+        self.tamano = 0
+        self._hash = hashlib.sha256()
+        self._inicio = b""
+        descriptor, self._temporal = tempfile.mkstemp(
+            dir=self.almacen.directorio_temporal(), suffix=".subida"
+        )
+        self._archivo = os.fdopen(descriptor, "wb")
+
+    def escribir(self, bloque: bytes) -> None:
+        """
+        Agrega un bloque a la foto.
+
+        Raises:
+            EvidenciaDemasiadoGrandeError: Si se supera el límite.
+        """
+        if not bloque:
+            return
+        self.tamano += len(bloque)
+        if self.tamano > self.limite_bytes:
+            raise EvidenciaDemasiadoGrandeError(
+                f"La foto supera el máximo de {self.limite_bytes} bytes"
+            )
+        if len(self._inicio) < 16:
+            self._inicio += bloque[:16 - len(self._inicio)]
+        self._hash.update(bloque)
+        self._archivo.write(bloque)
+
+    def finalizar(self) -> Tuple[str, int, str]:
+        """
+        Cierra el temporal y lo incorpora al almacén.
+
+        Returns:
+            tuple: (sha256, tamaño en bytes, tipo MIME)
+        """
+        self._archivo.close()
+        if self.tamano == 0:
+            raise EvidenciaInvalidaError("Imagen de evidencia vacía")
+        sha256 = self._hash.hexdigest()
+        self.almacen.guardar_archivo(self._temporal, sha256)
+        return sha256, self.tamano, detectar_mime(self._inicio)
+
+    def descartar(self) -> None:
+        """Cierra y elimina el temporal (no hace nada si ya se incorporó)."""
+        self._archivo.close()
+        if os.path.exists(self._temporal):
+            os.remove(self._temporal)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.descartar()
+        return False
+
+
+def _parser_multipart(content_type: str, escritor: EscritorEvidencia, campo: str):
+    """
+    Crea un parser multipart/form-data incremental que manda al escritor
+    solo los bytes de la parte `campo` (o de la primera parte con archivo).
+    """
+    try:
+        from python_multipart.multipart import MultipartParser, parse_options_header
+    except ImportError:  # python-multipart < 0.0.13
+        from multipart.multipart import MultipartParser, parse_options_header
+
+    _, opciones = parse_options_header(content_type)
+    boundary = opciones.get(b"boundary")
+    if not boundary:
+        raise EvidenciaInvalidaError("multipart/form-data sin boundary")
+
+    estado = {"campo": b"", "valor": b"", "disposicion": b"", "activa": False, "recibida": False}
+
+    def on_part_begin():
+        estado["disposicion"] = b""
+        estado["activa"] = False
+
+    def on_header_field(datos, inicio, fin):
+        estado["campo"] += datos[inicio:fin]
+
+    def on_header_value(datos, inicio, fin):
+        estado["valor"] += datos[inicio:fin]
+
+    def on_header_end():
+        if estado["campo"].lower() == b"content-disposition":
+            estado["disposicion"] = estado["valor"]
+        estado["campo"] = b""
+        estado["valor"] = b""
+
+    def on_headers_finished():
+        _, parametros = parse_options_header(estado["disposicion"])
+        nombre = parametros.get(b"name", b"").decode("latin-1")
+        es_archivo = b"filename" in parametros
+        estado["activa"] = not estado["recibida"] and (nombre == campo or es_archivo)
+
+    def on_part_data(datos, inicio, fin):
+        if estado["activa"]:
+            escritor.escribir(datos[inicio:fin])
+
+    def on_part_end():
+        if estado["activa"]:
+            estado["recibida"] = True
+            estado["activa"] = False
+
+    callbacks = {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    }
+    return MultipartParser(boundary, callbacks), estado
+
+
+async def recibir_evidencia(
+    flujo: AsyncIterator[bytes],
+    content_type: str,
+    campo: str = "imagen"
+) -> Tuple[str, int, str]:
+    """
+    Guarda en el almacén una foto recibida como flujo de bytes.
+
+    Acepta multipart/form-data (parte `campo` o el primer archivo) o el
+    binario crudo (image/* o application/octet-stream). Los bloques se
+    acumulan hasta EVIDENCIAS_BLOQUE_ESCRITURA y se escriben a disco en un
+    hilo, sin bloquear el event loop.
+
+    Args:
+        flujo: Bloques del cuerpo (ej. request.stream()).
+        content_type: Encabezado Content-Type de la solicitud.
+        campo: Nombre del campo del formulario con la foto.
+
+    Returns:
+        tuple: (sha256, tamaño en bytes, tipo MIME)
+
+    Raises:
+        EvidenciaInvalidaError: Formato no soportado o sin foto.
+        EvidenciaDemasiadoGrandeError: Si supera EVIDENCIAS_MAX_BYTES.
+    """
+    tipo = content_type.split(";", 1)[0].strip().lower()
+    es_multipart = tipo == "multipart/form-data"
+    if not es_multipart and not (tipo.startswith("image/") or tipo == "application/octet-stream"):
+        raise EvidenciaInvalidaError(
+            "Content-Type no soportado: usar multipart/form-data, image/* o application/octet-stream",
+            codigo=415
+        )
+
+    escritor = await asyncio.to_thread(EscritorEvidencia)
+    try:
+        if es_multipart:
+            parser, estado = _parser_multipart(content_type, escritor, campo)
+            try:
+                await _consumir(flujo, parser.write)
+                parser.finalize()
+            except (EvidenciaInvalidaError, EvidenciaDemasiadoGrandeError):
+                raise
+            except ValueError as e:  # errores de python-multipart
+                raise EvidenciaInvalidaError(f"multipart/form-data inválido: {e}")
+            if not estado["recibida"]:
+                raise EvidenciaInvalidaError(f"El formulario no incluye el archivo '{campo}'")
+        else:
+            await _consumir(flujo, escritor.escribir)
+        return await asyncio.to_thread(escritor.finalizar)
+    finally:
+        await asyncio.to_thread(escritor.descartar)
+
+
+async def _consumir(flujo: AsyncIterator[bytes], escribir) -> None:
+    """
+    Pasa el flujo a `escribir` en bloques de EVIDENCIAS_BLOQUE_ESCRITURA,
+    cada uno en un hilo (la escritura a disco no corre en el event loop).
+    """
+    pendiente = bytearray()
+    async for bloque in flujo:
+        pendiente += bloque
+        if len(pendiente) >= EVIDENCIAS_BLOQUE_ESCRITURA:
+            await asyncio.to_thread(escribir, bytes(pendiente))
+            pendiente.clear()
+    if pendiente:
+        await asyncio.to_thread(escribir, bytes(pendiente))
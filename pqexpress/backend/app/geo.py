@@ -0,0 +1,139 @@
+# ============================================================
+# PQEXPRESS - Utilidades Geográficas
+# Geohash de destinos y distancias para búsquedas por cercanía
+# ============================================================
+"""
+Los destinos se indexan por geohash (envios.geohash_destino): puntos
+cercanos comparten prefijo, así que una zona se traduce en unos cuantos
+rangos de texto que el índice B-tree (id_repartidor, geohash_destino)
+resuelve sin recorrer la tabla. El filtro exacto (caja o radio) se
+aplica después sobre los candidatos.
+"""
+
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+import math
+import os
+
+# Cargar variables de entorno
+load_dotenv()
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+# Caracteres guardados por destino (9 ≈ celdas de 5 m); debe coincidir con los triggers de schema.sql
+GEOHASH_PRECISION = 9
+# Máximo de celdas por búsqueda: con más, se usa una precisión menor (celdas más grandes)
+GEOHASH_MAX_CELDAS = int(os.getenv("GEOHASH_MAX_CELDAS", "16"))
+
+RADIO_TIERRA_METROS = 6_371_000.0
+ALFABETO_GEOHASH = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Caja geográfica: (lat_min, lng_min, lat_max, lng_max)
+Caja = Tuple[float, float, float, float]
+
+
+def codificar_geohash(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Geohash estándar (mismo resultado que ST_GeoHash de MySQL)."""
+    rango_lat, rango_lng = [-90.0, 90.0], [-180.0, 180.0]
+    caracteres = []
+    valor, bits, es_lng = 0, 0, True
+    while len(caracteres) < precision:
+        rango, coordenada = (rango_lng, lng) if es_lng else (rango_lat, lat)
+        medio = (rango[0] + rango[1]) / 2
+        if coordenada >= medio:
+            valor = (valor << 1) | 1
+            rango[0] = medio
+        else:
+            valor <<= 1
+            rango[1] = medio
+        es_lng = not es_lng
+        bits += 1
+        if bits == 5:
+            caracteres.append(ALFABETO_GEOHASH[valor])
+            valor, bits = 0, 0
+    return "".join(caracteres)
+
+
+def dimensiones_celda(precision: int) -> Tuple[float, float]:
+    """Alto y ancho en grados de una celda geohash de `precision` caracteres."""
+    bits = 5 * precision
+    bits_lng = (bits + 1) // 2
+    bits_lat = bits // 2
+    return 180.0 / (1 << bits_lat), 360.0 / (1 << bits_lng)
+
+
+def _indices(minimo: float, maximo: float, origen: float, tamano: float, total: int) -> range:
+    """Índices de celda (en un eje) que cubren [minimo, maximo]."""
+    inicio = max(0, int((minimo - origen) // tamano))
+    fin = min(total - 1, int((maximo - origen) // tamano))
+    return range(inicio, fin + 1)
+
+
+def celdas_para_caja(caja: Caja, max_celdas: int = GEOHASH_MAX_CELDAS) -> List[str]:
+    """
+    Celdas geohash que cubren la caja, con la mayor precisión que no
+    exceda max_celdas. No considera cajas que crucen el antimeridiano.
+    """
+    lat_min, lng_min, lat_max, lng_max = caja
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        alto, ancho = dimensiones_celda(precision)
+        filas = _indices(lat_min, lat_max, -90.0, alto, round(180.0 / alto))
+        columnas = _indices(lng_min, lng_max, -180.0, ancho, round(360.0 / ancho))
+        if len(filas) * len(columnas) <= max_celdas or precision == 1:
+            return sorted({
+                codificar_geohash(-90.0 + (fila + 0.5) * alto, -180.0 + (columna + 0.5) * ancho, precision)
+                for fila in filas for columna in columnas
+            })
+    return []
+
+
+def siguiente_prefijo(prefijo: str) -> Optional[str]:
+    """
+    Menor cadena mayor que todas las que empiezan con `prefijo`, o None
+    si no existe (prefijo de solo 'z'). Usa únicamente caracteres del
+    alfabeto geohash, que ordenan igual en cualquier collation.
+    """
+    while prefijo:
+        posicion = ALFABETO_GEOHASH.index(prefijo[-1])
+        if posicion + 1 < len(ALFABETO_GEOHASH):
+            return prefijo[:-1] + ALFABETO_GEOHASH[posicion + 1]
+        prefijo = prefijo[:-1]
+    return None
+
+
+def rangos_para_celdas(celdas: List[str]) -> List[Tuple[str, Optional[str]]]:
+    """
+    Convierte celdas (ordenadas) en rangos [inicio, fin) de geohash,
+    uniendo las celdas contiguas para reducir las condiciones del WHERE.
+    """
+    rangos: List[Tuple[str, Optional[str]]] = []
+    for celda in celdas:
+        fin = siguiente_prefijo(celda)
+        if rangos and rangos[-1][1] == celda:
+            rangos[-1] = (rangos[-1][0], fin)
+        else:
+            rangos.append((celda, fin))
+    return rangos
+
+
+def caja_para_radio(lat: float, lng: float, radio_metros: float) -> Caja:
+    """Caja que contiene el círculo de `radio_metros` alrededor del punto."""
+    delta_lat = math.degrees(radio_metros / RADIO_TIERRA_METROS)
+    coseno = max(math.cos(math.radians(lat)), 1e-6)
+    delta_lng = min(180.0, delta_lat / coseno)
+    return (
+        max(-90.0, lat - delta_lat), max(-180.0, lng - delta_lng),
+        min(90.0, lat + delta_lat), min(180.0, lng + delta_lng),
+    )
+
+
+def distancia_metros(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Distancia de círculo máximo (haversine) entre dos puntos."""
+    fi1, fi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((fi2 - fi1) / 2) ** 2
+        + math.cos(fi1) * math.cos(fi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    )
+    return 2 * RADIO_TIERRA_METROS * math.asin(math.sqrt(min(1.0, a)))
@@ -0,0 +1,254 @@
+# ============================================================
+# PQEXPRESS - Claves de Idempotencia
+# Reintentos seguros de operaciones de escritura (encabezado Idempotency-Key)
+# ============================================================
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from fastapi import Depends, Header, HTTPException, Request, Response, status
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+import hashlib
+import os
+
+from .cache import CacheTTL
+from .models import Repartidor, ClaveIdempotencia
+from .security import obtener_usuario_actual
+
+# Cargar variables de entorno
+load_dotenv()
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+# "memoria" (un solo proceso) o "bd" (varios workers comparten la tabla claves_idempotencia)
+IDEMPOTENCIA_BACKEND = os.getenv("IDEMPOTENCIA_BACKEND", "memoria").lower()
+# Tiempo que se conserva la respuesta de una clave
+IDEMPOTENCIA_TTL_SEGUNDOS = int(os.getenv("IDEMPOTENCIA_TTL_SEGUNDOS", "86400"))
+# Tiempo máximo que una clave puede quedar "en proceso" (si el proceso muere a medias)
+IDEMPOTENCIA_RESERVA_SEGUNDOS = int(os.getenv("IDEMPOTENCIA_RESERVA_SEGUNDOS", "60"))
+# Entradas máximas del almacén en memoria
+IDEMPOTENCIA_MAX_ENTRADAS = int(os.getenv("IDEMPOTENCIA_MAX_ENTRADAS", "50000"))
+
+EN_PROCESO = "en_proceso"
+COMPLETADA = "completada"
+
+
+# ============================================================
+# ALMACENES
+# ============================================================
+
+class AlmacenIdempotencia(ABC):
+    """
+    Interfaz del almacén de claves. Cada registro es un dict con
+    estado, huella (hash del cuerpo de la solicitud), codigo y cuerpo.
+    """
+
+    @abstractmethod
+    async def reservar(self, clave: str, huella: str) -> Optional[Dict[str, Any]]:
+        """
+        Marca la clave como en proceso si no existe.
+
+        Returns:
+            None si se reservó; si ya existía, su registro.
+        """
+
+    @abstractmethod
+    async def completar(self, clave: str, huella: str, codigo: int, cuerpo: str) -> None:
+        """Guarda la respuesta final de la clave por IDEMPOTENCIA_TTL_SEGUNDOS."""
+
+    @abstractmethod
+    async def liberar(self, clave: str) -> None:
+        """Elimina la reserva (la operación falló y puede reintentarse)."""
+
+
+class AlmacenIdempotenciaMemoria(AlmacenIdempotencia):
+    """Almacén en memoria sobre CacheTTL (LRU + TTL). Solo sirve con un worker."""
+
+    def __init__(self, max_entradas: int):
+        self.cache = CacheTTL(max_entradas=max_entradas, ttl_segundos=IDEMPOTENCIA_TTL_SEGUNDOS)
+
+    async def reservar(self, clave: str, huella: str) -> Optional[Dict[str, Any]]:
+        registro = {"estado": EN_PROCESO, "huella": huella}
+        if self.cache.guardar_si_no_existe(clave, registro, IDEMPOTENCIA_RESERVA_SEGUNDOS):
+            return None
+        existente = self.cache.obtener(clave)
+        if existente is None:  # Expiró justo ahora
+            return await self.reservar(clave, huella)
+        return existente
+
+    async def completar(self, clave: str, huella: str, codigo: int, cuerpo: str) -> None:
+        self.cache.guardar(clave, {"estado": COMPLETADA, "huella": huella, "codigo": codigo, "cuerpo": cuerpo})
+
+    async def liberar(self, clave: str) -> None:
+        self.cache.invalidar(clave)
+
+
+class AlmacenIdempotenciaBD(AlmacenIdempotencia):
+    """
+    Almacén en la tabla claves_idempotencia, compartido por todos los
+    workers. Usa sesiones propias: la reserva se confirma antes de que el
+    endpoint abra su transacción.
+    """
+
+    async def reservar(self, clave: str, huella: str) -> Optional[Dict[str, Any]]:
+        from .database import AsyncSessionLocal
+
+        ahora = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            for _ in range(2):
+                try:
+                    await db.execute(insert(ClaveIdempotencia).values(
+                        clave=clave,
+                        huella=huella,
+                        estado=EN_PROCESO,
+                        expira_en=ahora + timedelta(seconds=IDEMPOTENCIA_RESERVA_SEGUNDOS)
+                    ))
+                    await db.commit()
+                    return None
+                except IntegrityError:
+                    await db.rollback()
+
+                fila = (await db.execute(
+                    select(ClaveIdempotencia).where(ClaveIdempotencia.clave == clave)
+                )).scalars().first()
+                if fila is not None and fila.expira_en > ahora:
+                    return {
+                        "estado": fila.estado,
+                        "huella": fila.huella,
+                        "codigo": fila.codigo_estado,
+                        "cuerpo": fila.cuerpo,
+                    }
+                # Expirada: borrarla y volver a intentar la reserva
+                await db.execute(delete(ClaveIdempotencia).where(
+                    ClaveIdempotencia.clave == clave,
+                    ClaveIdempotencia.expira_en <= ahora
+                ))
+                await db.commit()
+        return None
+
+    async def completar(self, clave: str, huella: str, codigo: int, cuerpo: str) -> None:
+        from .database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(ClaveIdempotencia)
+                .where(ClaveIdempotencia.clave == clave)
+                .values(
+                    estado=COMPLETADA,
+                    codigo_estado=codigo,
+                    cuerpo=cuerpo,
+                    expira_en=datetime.utcnow() + timedelta(seconds=IDEMPOTENCIA_TTL_SEGUNDOS)
+                )
+            )
+            await db.commit()
+
+    async def liberar(self, clave: str) -> None:
+        from .database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(ClaveIdempotencia).where(
+                ClaveIdempotencia.clave == clave,
+                ClaveIdempotencia.estado == EN_PROCESO
+            ))
+            await db.commit()
+
+
+def crear_almacen_idempotencia() -> AlmacenIdempotencia:
+    """Crea el almacén configurado por IDEMPOTENCIA_BACKEND."""
+    if IDEMPOTENCIA_BACKEND == "bd":
+        return AlmacenIdempotenciaBD()
+    return AlmacenIdempotenciaMemoria(IDEMPOTENCIA_MAX_ENTRADAS)
+
+
+# Instancia global usada por control_idempotencia
+almacen_idempotencia = crear_almacen_idempotencia()
+
+
+# ============================================================
+# DEPENDENCIA PARA ENDPOINTS
+# ============================================================
+
+class ControlIdempotencia:
+    """
+    Estado de la clave de idempotencia de una solicitud.
+
+    Attributes:
+        respuesta_previa: Respuesta guardada de un intento anterior; si no es
+            None, el endpoint debe retornarla sin hacer nada más.
+    """
+
+    def __init__(self, clave: Optional[str] = None, huella: Optional[str] = None):
+        self.clave = clave
+        self.huella = huella
+        self.respuesta_previa: Optional[Response] = None
+        self.completada = False
+
+    async def completar(self, respuesta: BaseModel, codigo: int = status.HTTP_200_OK) -> None:
+        """Guarda la respuesta exitosa para devolverla en los reintentos."""
+        if self.clave is None:
+            return
+        await almacen_idempotencia.completar(self.clave, self.huella, codigo, respuesta.model_dump_json())
+        self.completada = True
+
+
+async def control_idempotencia(
+    request: Request,
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", max_length=255,
+        description="Identificador único del intento; los reintentos con la misma clave devuelven la respuesta original"
+    ),
+    usuario_actual: Repartidor = Depends(obtener_usuario_actual)
+):
+    """
+    Dependencia de FastAPI para endpoints de escritura.
+
+    - Sin encabezado Idempotency-Key: no hace nada
+    - Clave nueva: la reserva y deja ejecutar el endpoint
+    - Clave completada con el mismo cuerpo: respuesta_previa con la respuesta original
+    - Clave en proceso: 409 (el primer intento aún no termina)
+    - Clave reutilizada con otro cuerpo: 422
+
+    Si el endpoint falla, la reserva se libera para permitir el reintento.
+    """
+    if not idempotency_key:
+        yield ControlIdempotencia()
+        return
+
+    # La clave es por repartidor y por endpoint
+    clave = hashlib.sha256(
+        f"{usuario_actual.id_repartidor}|{request.method}|{request.url.path}|{idempotency_key}".encode("utf-8")
+    ).hexdigest()
+    huella = hashlib.sha256(await request.body()).hexdigest()
+    control = ControlIdempotencia(clave, huella)
+
+    registro = await almacen_idempotencia.reservar(clave, huella)
+    if registro is not None:
+        if registro["huella"] != huella:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key ya usada con un cuerpo distinto"
+            )
+        if registro["estado"] != COMPLETADA:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Hay una solicitud en proceso con la misma Idempotency-Key",
+                headers={"Retry-After": "1"}
+            )
+        control.respuesta_previa = Response(
+            content=registro["cuerpo"],
+            status_code=registro["codigo"],
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"}
+        )
+        control.completada = True
+
+    try:
+        yield control
+    finally:
+        if not control.completada:
+            await almacen_idempotencia.liberar(clave)
@@ -0,0 +1,181 @@
+# ============================================================
+# PQEXPRESS - Procesamiento de Imágenes de Evidencia
+# Recompresión, eliminación de EXIF y miniaturas (Pillow opcional)
+# ============================================================
+
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+import io
+import logging
+import os
+
+from .pool_hash import PoolHash, PoolSaturadoError
+
+# Cargar variables de entorno
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+    PILLOW_DISPONIBLE = True
+except ImportError:  # Sin Pillow las fotos se guardan tal como llegan
+    Image = ImageOps = None
+    PILLOW_DISPONIBLE = False
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+# Lado mayor máximo de la foto guardada (px) y calidad JPEG
+IMAGEN_MAX_LADO = int(os.getenv("IMAGEN_MAX_LADO", "1600"))
+IMAGEN_CALIDAD = int(os.getenv("IMAGEN_CALIDAD", "80"))
+# Lado mayor de la miniatura (px) y calidad JPEG
+MINIATURA_LADO = int(os.getenv("MINIATURA_LADO", "320"))
+MINIATURA_CALIDAD = int(os.getenv("MINIATURA_CALIDAD", "70"))
+# Hilos para procesar imágenes (Pillow libera el GIL al decodificar/redimensionar)
+IMAGENES_POOL_WORKERS = int(os.getenv("IMAGENES_POOL_WORKERS", "2"))
+IMAGENES_POOL_MAX_COLA = int(os.getenv("IMAGENES_POOL_MAX_COLA", "64"))
+# Rechazar imágenes con más píxeles que esto (protección contra "bombas" de descompresión)
+IMAGEN_MAX_PIXELES = int(os.getenv("IMAGEN_MAX_PIXELES", str(50_000_000)))
+
+if PILLOW_DISPONIBLE:
+    Image.MAX_IMAGE_PIXELS = IMAGEN_MAX_PIXELES
+
+MIME_PROCESADO = "image/jpeg"
+
+
+def _codificar_jpeg(imagen, lado: int, calidad: int) -> bytes:
+    """Reduce una imagen a `lado` px como máximo y la codifica como JPEG sin metadatos."""
+    copia = imagen.copy()
+    copia.thumbnail((lado, lado), Image.LANCZOS)
+    salida = io.BytesIO()
+    # Sin exif= ni icc_profile=: el archivo resultante no lleva metadatos (GPS, modelo, etc.)
+    copia.save(salida, format="JPEG", quality=calidad, optimize=True, progressive=True)
+    return salida.getvalue()
+
+
+def optimizar_imagen(contenido: bytes) -> Tuple[bytes, bytes]:
+    """
+    Genera las dos variantes de una foto de evidencia.
+
+    - Aplica la orientación EXIF a los píxeles y descarta los metadatos
+    - Recomprime a JPEG con lado mayor IMAGEN_MAX_LADO
+    - Genera una miniatura JPEG con lado mayor MINIATURA_LADO
+
+    Operación bloqueante de CPU: ejecutar en pool_imagenes.
+
+    Returns:
+        tuple: (foto optimizada, miniatura)
+
+    Raises:
+        ValueError: Si los bytes no son una imagen que Pillow pueda leer.
+    """
+    try:
+        imagen = Image.open(io.BytesIO(contenido))
+        # En JPEG, decodificar directamente a escala reducida (1/2, 1/4, 1/8)
+        imagen.draft("RGB", (IMAGEN_MAX_LADO, IMAGEN_MAX_LADO))
+        imagen = ImageOps.exif_transpose(imagen)
+        if imagen.mode != "RGB":
+            imagen = imagen.convert("RGB")
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Imagen no procesable: {e}")
+
+    return (
+        _codificar_jpeg(imagen, IMAGEN_MAX_LADO, IMAGEN_CALIDAD),
+        _codificar_jpeg(imagen, MINIATURA_LADO, MINIATURA_CALIDAD),
+    )
+
+
+# Pool compartido por todas las tareas de imágenes del proceso
+pool_imagenes = PoolHash(
+    max_workers=IMAGENES_POOL_WORKERS,
+    max_cola=IMAGENES_POOL_MAX_COLA,
+    nombre="imagenes"
+)
+
+
+def generar_variantes(sha256: str) -> Optional[Tuple[str, int, str, int]]:
+    """
+    Lee la foto original del almacén, genera sus variantes y las guarda.
+
+    Returns:
+        tuple: (sha256 de la foto, bytes de la foto, sha256 de la miniatura,
+        bytes de la miniatura), o None si la imagen no se pudo procesar.
+        La foto es siempre la recodificada, aunque pese más que la
+        original: la original conserva el EXIF (GPS, modelo del teléfono).
+    """
+    from .evidencias import almacen_evidencias
+
+    original = almacen_evidencias.leer(sha256)
+    try:
+        optimizada, miniatura = optimizar_imagen(original)
+    except ValueError as e:
+        logger.warning("Evidencia %s sin optimizar: %s", sha256, e)
+        return None
+
+    return (
+        almacen_evidencias.guardar(optimizada), len(optimizada),
+        almacen_evidencias.guardar(miniatura), len(miniatura),
+    )
+
+
+async def procesar_imagen(id_confirmacion: int, sha256: str) -> None:
+    """
+    Tarea en segundo plano: reemplaza la foto de una confirmación por su
+    versión optimizada y registra la miniatura.
+
+    Si entretanto se subió otra foto para la misma confirmación, el
+    resultado se descarta. La original y la miniatura anterior se liberan
+    (liberar_evidencias) y el recolector las borra si nadie las reutiliza.
+    """
+    if not PILLOW_DISPONIBLE:
+        return
+
+    from sqlalchemy import select, update
+    from .database import AsyncSessionLocal
+    from .evidencias import liberar_evidencias
+    from .models import ConfirmacionEntrega
+
+    try:
+        variantes = await pool_imagenes.ejecutar(generar_variantes, sha256)
+    except PoolSaturadoError:
+        logger.warning("Pool de imágenes lleno; evidencia %s queda sin optimizar", sha256)
+        return
+    except Exception:
+        logger.exception("Error al optimizar la evidencia %s", sha256)
+        return
+    if variantes is None:
+        return
+    sha_foto, bytes_foto, sha_miniatura, bytes_miniatura = variantes
+
+    async with AsyncSessionLocal() as db:
+        miniatura_anterior = (await db.execute(
+            select(ConfirmacionEntrega.miniatura_sha256)
+            .where(
+                ConfirmacionEntrega.id_confirmacion == id_confirmacion,
+                ConfirmacionEntrega.evidencia_sha256 == sha256
+            )
+            .with_for_update()
+        )).scalar_one_or_none()
+        resultado = await db.execute(
+            update(ConfirmacionEntrega)
+            .where(
+                ConfirmacionEntrega.id_confirmacion == id_confirmacion,
+                ConfirmacionEntrega.evidencia_sha256 == sha256
+            )
+            .values(
+                evidencia_sha256=sha_foto,
+                evidencia_bytes=bytes_foto,
+                evidencia_mime=MIME_PROCESADO,
+                miniatura_sha256=sha_miniatura,
+                miniatura_bytes=bytes_miniatura
+            )
+        )
+        await db.commit()
+
+        if resultado.rowcount == 0:
+            # Ya hay otra foto: las variantes generadas quedaron sin usar
+            liberar_evidencias(sha_foto, sha_miniatura)
+        else:
+            liberar_evidencias(sha256, miniatura_anterior)
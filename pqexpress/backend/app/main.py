@@ -3,15 +3,31 @@
 # Punto de entrada del backend
 # ============================================================
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
+from typing import Optional
+import asyncio
 import os
 
 # Importar routers
-from .routers import auth_router, envios_router
-from .database import engine, Base
+from .routers import auth_router, envios_router, metricas_router, rastreo_router
+from .database import engine, async_engine, Base, metricas_pool_sync, metricas_pool_async
+from .compresion import COMPRESION_HABILITADA, MiddlewareCompresion
+from .metricas_http import MiddlewareMetricas, metricas_http, lineas_pools
+from .perfil_sql import PERFIL_SQL_HABILITADO, MiddlewarePerfilSQL
+from .pool_hash import pool_hash
+from .imagenes import pool_imagenes
+from .rutas import pool_rutas
+from .rastreo import buffer_rastreo
+from .eventos import broker_eventos
+from .salud import estado_readiness, resumen_publico
+from .security import (
+    security_metricas, security_metricas_bearer, token_metricas_valido, verificar_token_metricas
+)
+from .evidencias import EVIDENCIAS_REINTENTAR_AL_INICIAR, recolector_evidencias, reintentar_evidencias_pendientes
 
 # Cargar variables de entorno
 load_dotenv()
@@ -80,19 +96,33 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Compresión gzip/brotli de respuestas (por fuera de CORS y por dentro de
+# las métricas, que así miden también el tiempo de comprimir)
+if COMPRESION_HABILITADA:
+    app.add_middleware(MiddlewareCompresion)
+
+# Métricas por ruta (GET /metrics). Se agrega al final para quedar por
+# fuera de CORS y medir la solicitud completa.
+app.add_middleware(MiddlewareMetricas)
+
+# Perfil de consultas SQL por solicitud (opcional, para desarrollo y pruebas)
+if PERFIL_SQL_HABILITADO:
+    app.add_middleware(MiddlewarePerfilSQL)
+
 # ============================================================
 # MANEJADORES DE EXCEPCIONES GLOBALES
 # ============================================================
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    """Manejador personalizado para excepciones HTTP."""
+    """Manejador personalizado para excepciones HTTP (conserva Retry-After, WWW-Authenticate, etc.)."""
     return JSONResponse(
         status_code=exc.status_code,
         content={
             "detalle": exc.detail,
             "codigo": f"HTTP_{exc.status_code}"
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -125,6 +155,12 @@ app.include_router(auth_router, prefix="/api")
 # Router de envíos: /api/envios/*
 app.include_router(envios_router, prefix="/api")
 
+# Router de métricas: /api/metricas/*
+app.include_router(metricas_router, prefix="/api")
+
+# Router de rastreo GPS: /api/rastreo/*
+app.include_router(rastreo_router, prefix="/api")
+
 # ============================================================
 # ENDPOINTS RAÍZ Y DE SALUD
 # ============================================================
@@ -147,16 +183,70 @@ async def root():
     }
 
 
+@app.get("/health/live", tags=["Root"])
+async def health_live():
+    """
+    Liveness: el proceso responde. No consulta la BD, para que una caída
+    de la BD no provoque reinicios de todos los workers.
+    """
+    return {"estado": "vivo", "servicio": "PQExpress API"}
+
+
+@app.get("/health/ready", tags=["Root"])
+async def health_ready(
+    token: Optional[str] = Depends(security_metricas),
+    credenciales: Optional[HTTPAuthorizationCredentials] = Depends(security_metricas_bearer)
+):
+    """
+    Readiness: 200 si el worker puede atender (BD responde y el pool de
+    conexiones no está agotado), 503 si el balanceador debe sacarlo.
+    Los componentes saturados que no impiden atender se reportan como
+    'degradado' con 200.
+
+    Sin METRICAS_TOKEN solo se informa el estado de cada componente; con
+    él, también los contadores de los pools y el error de la BD.
+    """
+    resultado = await estado_readiness()
+    if not token_metricas_valido(token or (credenciales.credentials if credenciales else None)):
+        resultado = resumen_publico(resultado)
+    return JSONResponse(
+        status_code=200 if resultado["listo"] else 503,
+        content={"servicio": "PQExpress API", **resultado},
+        headers={"Cache-Control": "no-store"}
+    )
+
+
 @app.get("/health", tags=["Root"])
-async def health_check():
+async def health_check(
+    token: Optional[str] = Depends(security_metricas),
+    credenciales: Optional[HTTPAuthorizationCredentials] = Depends(security_metricas_bearer)
+):
     """
-    Endpoint de health check para verificar estado del servicio.
+    Endpoint de health check (compatibilidad): igual que /health/ready.
     """
-    return {
-        "estado": "saludable",
-        "servicio": "PQExpress API",
-        "base_datos": "conectada"
-    }
+    return await health_ready(token, credenciales)
+
+
+@app.get(
+    "/metrics",
+    tags=["Root"],
+    response_class=PlainTextResponse,
+    dependencies=[Depends(verificar_token_metricas)]
+)
+async def metrics():
+    """
+    Métricas de este proceso en formato de texto de Prometheus:
+    latencia por ruta, códigos de estado, solicitudes en curso,
+    consultas SQL por solicitud y estado de los pools de conexiones.
+
+    Exige METRICAS_TOKEN; en Prometheus:
+    `authorization: {credentials: <METRICAS_TOKEN>}` en el scrape_config.
+    """
+    lineas = metricas_http.exportar() + lineas_pools([
+        metricas_pool_async.estadisticas(async_engine.sync_engine),
+        metricas_pool_sync.estadisticas(engine),
+    ])
+    return PlainTextResponse("\n".join(lineas) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/api", tags=["Root"])
@@ -169,7 +259,8 @@ async def api_info():
         "version": "1.0.0",
         "endpoints": {
             "autenticacion": "/api/auth",
-            "envios": "/api/envios"
+            "envios": "/api/envios",
+            "rastreo": "/api/rastreo"
         },
         "documentacion": "/docs"
     }
@@ -184,6 +275,11 @@ async def startup_event():
     """
     Evento que se ejecuta al iniciar la aplicación.
     """
+    if EVIDENCIAS_REINTENTAR_AL_INICIAR:
+        # En segundo plano: no retrasa el arranque
+        app.state.tarea_evidencias = asyncio.create_task(reintentar_evidencias_pendientes())
+    # Borra las fotos reemplazadas que siguen sin referencias tras la gracia
+    app.state.tarea_recolector = asyncio.create_task(recolector_evidencias.ejecutar())
     print("=" * 60)
     print("🚀 PQExpress API iniciada")
     print("=" * 60)
@@ -197,6 +293,15 @@ async def shutdown_event():
     """
     Evento que se ejecuta al cerrar la aplicación.
     """
+    for nombre in ("tarea_evidencias", "tarea_recolector"):
+        tarea = getattr(app.state, nombre, None)
+        if tarea is not None and not tarea.done():
+            tarea.cancel()
+    pool_hash.cerrar()
+    pool_imagenes.cerrar()
+    pool_rutas.cerrar()
+    await buffer_rastreo.detener()
+    await broker_eventos.cerrar()
     print("=" * 60)
     print("👋 PQExpress API cerrada")
     print("=" * 60)
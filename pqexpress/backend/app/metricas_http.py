@@ -0,0 +1,271 @@
+# ============================================================
+# PQEXPRESS - Métricas HTTP y de Consultas
+# Latencia por ruta, códigos de estado y consultas SQL por solicitud
+# (formato de texto de Prometheus en GET /metrics)
+# ============================================================
+
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import threading
+import time
+
+# Límites de los histogramas
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS_SQL = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+BUCKETS_CONSULTAS_POR_SOLICITUD = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Etiqueta de las solicitudes que no coinciden con ninguna ruta (404):
+# usar la URL real dispararía la cardinalidad
+RUTA_DESCONOCIDA = "sin_ruta"
+
+# [consultas, segundos] de la solicitud en curso. Las sesiones asíncronas
+# ejecutan en greenlets que heredan el contexto, así que los eventos del
+# cursor ven el mismo objeto que creó el middleware.
+_consultas_solicitud: ContextVar[Optional[List[float]]] = ContextVar("consultas_solicitud", default=None)
+
+
+class Histograma:
+    """Histograma acumulativo con límites fijos (sin lock: lo protege MetricasHTTP)."""
+
+    __slots__ = ("limites", "conteos", "suma", "total")
+
+    def __init__(self, limites: Sequence[float]):
+        self.limites = limites
+        self.conteos = [0] * len(limites)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float) -> None:
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.conteos[i] += 1
+                break
+        self.suma += valor
+        self.total += 1
+
+    def lineas(self, nombre: str, etiquetas: str) -> List[str]:
+        separador = "," if etiquetas else ""
+        lineas = []
+        acumulado = 0
+        for limite, conteo in zip(self.limites, self.conteos):
+            acumulado += conteo
+            lineas.append(f'{nombre}_bucket{{{etiquetas}{separador}le="{_numero(limite)}"}} {acumulado}')
+        lineas.append(f'{nombre}_bucket{{{etiquetas}{separador}le="+Inf"}} {self.total}')
+        lineas.append(f"{nombre}_sum{{{etiquetas}}} {_numero(self.suma)}" if etiquetas else f"{nombre}_sum {_numero(self.suma)}")
+        lineas.append(f"{nombre}_count{{{etiquetas}}} {self.total}" if etiquetas else f"{nombre}_count {self.total}")
+        return lineas
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(**pares: Any) -> str:
+    return ",".join(f'{nombre}="{_escapar(str(valor))}"' for nombre, valor in pares.items())
+
+
+class MetricasHTTP:
+    """Contadores de solicitudes HTTP y consultas SQL de este proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.en_curso = 0
+        self._respuestas: Dict[Tuple[str, str, int], int] = {}
+        self._duracion: Dict[Tuple[str, str], Histograma] = {}
+        self._consultas_por_solicitud: Dict[Tuple[str, str], Histograma] = {}
+        self._consultas_segundos: Dict[Tuple[str, str], float] = {}
+        self._consulta_sql = Histograma(BUCKETS_CONSULTAS_SQL)
+        self._consultas_fuera_de_solicitud = 0
+
+    # Registro (middleware y eventos del cursor)
+
+    def registrar_solicitud(
+        self, metodo: str, ruta: str, codigo: int, segundos: float, consultas: int, segundos_bd: float
+    ) -> None:
+        clave = (metodo, ruta)
+        with self._lock:
+            self._respuestas[(metodo, ruta, codigo)] = self._respuestas.get((metodo, ruta, codigo), 0) + 1
+            if clave not in self._duracion:
+                self._duracion[clave] = Histograma(BUCKETS_SEGUNDOS)
+                self._consultas_por_solicitud[clave] = Histograma(BUCKETS_CONSULTAS_POR_SOLICITUD)
+            self._duracion[clave].observar(segundos)
+            self._consultas_por_solicitud[clave].observar(consultas)
+            self._consultas_segundos[clave] = self._consultas_segundos.get(clave, 0.0) + segundos_bd
+
+    def registrar_consulta(self, segundos: float) -> None:
+        en_solicitud = _consultas_solicitud.get()
+        if en_solicitud is not None:
+            en_solicitud[0] += 1
+            en_solicitud[1] += segundos
+        with self._lock:
+            self._consulta_sql.observar(segundos)
+            if en_solicitud is None:
+                self._consultas_fuera_de_solicitud += 1
+
+    def cambiar_en_curso(self, delta: int) -> None:
+        with self._lock:
+            self.en_curso += delta
+
+    # Exportación
+
+    def exportar(self) -> List[str]:
+        """Líneas en formato de texto de Prometheus."""
+        with self._lock:
+            lineas = [
+                "# HELP pqexpress_http_solicitudes_total Solicitudes HTTP atendidas.",
+                "# TYPE pqexpress_http_solicitudes_total counter",
+            ]
+            for (metodo, ruta, codigo), total in sorted(self._respuestas.items()):
+                lineas.append(
+                    f"pqexpress_http_solicitudes_total{{{_etiquetas(metodo=metodo, ruta=ruta, codigo=codigo)}}} {total}"
+                )
+
+            lineas += [
+                "# HELP pqexpress_http_duracion_segundos Latencia de las solicitudes HTTP hasta el último byte.",
+                "# TYPE pqexpress_http_duracion_segundos histogram",
+            ]
+            for (metodo, ruta), histograma in sorted(self._duracion.items()):
+                lineas += histograma.lineas("pqexpress_http_duracion_segundos", _etiquetas(metodo=metodo, ruta=ruta))
+
+            lineas += [
+                "# HELP pqexpress_http_en_curso Solicitudes HTTP en proceso (incluye conexiones de /stream).",
+                "# TYPE pqexpress_http_en_curso gauge",
+                f"pqexpress_http_en_curso {self.en_curso}",
+                "# HELP pqexpress_db_consultas_por_solicitud Consultas SQL ejecutadas por solicitud.",
+                "# TYPE pqexpress_db_consultas_por_solicitud histogram",
+            ]
+            for (metodo, ruta), histograma in sorted(self._consultas_por_solicitud.items()):
+                lineas += histograma.lineas("pqexpress_db_consultas_por_solicitud", _etiquetas(metodo=metodo, ruta=ruta))
+
+            lineas += [
+                "# HELP pqexpress_db_consultas_segundos_total Tiempo en consultas SQL por ruta.",
+                "# TYPE pqexpress_db_consultas_segundos_total counter",
+            ]
+            for (metodo, ruta), segundos in sorted(self._consultas_segundos.items()):
+                lineas.append(
+                    f"pqexpress_db_consultas_segundos_total{{{_etiquetas(metodo=metodo, ruta=ruta)}}} {_numero(segundos)}"
+                )
+
+            lineas += [
+                "# HELP pqexpress_db_consulta_duracion_segundos Duración de cada consulta SQL (todas las rutas).",
+                "# TYPE pqexpress_db_consulta_duracion_segundos histogram",
+            ]
+            lineas += self._consulta_sql.lineas("pqexpress_db_consulta_duracion_segundos", "")
+            lineas += [
+                "# HELP pqexpress_db_consultas_fuera_de_solicitud_total Consultas de tareas de fondo y herramientas.",
+                "# TYPE pqexpress_db_consultas_fuera_de_solicitud_total counter",
+                f"pqexpress_db_consultas_fuera_de_solicitud_total {self._consultas_fuera_de_solicitud}",
+            ]
+        return lineas
+
+
+# Instancia global usada por el middleware, los eventos del cursor y GET /metrics
+metricas_http = MetricasHTTP()
+
+
+def lineas_pools(estadisticas: Sequence[Dict[str, Any]]) -> List[str]:
+    """
+    Métricas de los pools de conexiones a partir de MetricasPool.estadisticas().
+    """
+    gauges = {
+        "prestadas": "Conexiones prestadas en este momento.",
+        "disponibles": "Conexiones inactivas en el pool.",
+        "overflow": "Conexiones de overflow abiertas.",
+    }
+    contadores = {
+        "checkouts": "Conexiones obtenidas del pool.",
+        "timeouts": "Esperas de conexión que agotaron DB_POOL_TIMEOUT.",
+    }
+    lineas = []
+    for campo, ayuda in gauges.items():
+        lineas += [f"# HELP pqexpress_db_pool_{campo} {ayuda}", f"# TYPE pqexpress_db_pool_{campo} gauge"]
+        lineas += [
+            f'pqexpress_db_pool_{campo}{{pool="{pool["nombre"]}"}} {pool[campo]}'
+            for pool in estadisticas if campo in pool
+        ]
+    for campo, ayuda in contadores.items():
+        lineas += [f"# HELP pqexpress_db_pool_{campo}_total {ayuda}", f"# TYPE pqexpress_db_pool_{campo}_total counter"]
+        lineas += [f'pqexpress_db_pool_{campo}_total{{pool="{pool["nombre"]}"}} {pool[campo]}' for pool in estadisticas]
+    return lineas
+
+
+def instrumentar_consultas(engine: Engine) -> None:
+    """
+    Mide cada consulta SQL con before/after_cursor_execute.
+
+    Args:
+        engine: Motor síncrono (para motores asíncronos usar async_engine.sync_engine).
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conexion, cursor, sentencia, parametros, contexto, executemany):
+        conexion.info.setdefault("pq_inicio_consulta", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conexion, cursor, sentencia, parametros, contexto, executemany):
+        inicio = conexion.info["pq_inicio_consulta"].pop()
+        metricas_http.registrar_consulta(time.perf_counter() - inicio)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(contexto_excepcion):
+        conexion = contexto_excepcion.connection
+        if conexion is not None and conexion.info.get("pq_inicio_consulta"):
+            inicio = conexion.info["pq_inicio_consulta"].pop()
+            metricas_http.registrar_consulta(time.perf_counter() - inicio)
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI puro (sin BaseHTTPMiddleware, que copia cada respuesta
+    por una cola interna). Registra cada solicitud al enviarse el último
+    fragmento del cuerpo, antes de las BackgroundTasks.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        consultas = [0, 0.0]
+        token = _consultas_solicitud.set(consultas)
+        estado = {"codigo": None, "registrada": False}
+        metricas_http.cambiar_en_curso(1)
+
+        def registrar(codigo: int) -> None:
+            if estado["registrada"]:
+                return
+            estado["registrada"] = True
+            ruta = scope.get("route")
+            metricas_http.registrar_solicitud(
+                scope["method"],
+                getattr(ruta, "path_format", None) or getattr(ruta, "path", None) or RUTA_DESCONOCIDA,
+                codigo,
+                time.perf_counter() - inicio,
+                int(consultas[0]),
+                consultas[1],
+            )
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+            elif mensaje["type"] == "http.response.body" and not mensaje.get("more_body", False):
+                registrar(estado["codigo"] or 500)
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            # Excepción no controlada o cliente desconectado antes del final
+            registrar(500 if estado["codigo"] is None else estado["codigo"])
+            metricas_http.cambiar_en_curso(-1)
+            _consultas_solicitud.reset(token)
@@ -0,0 +1,189 @@
+# ============================================================
+# PQEXPRESS - Métricas del Pool de Conexiones
+# Espera de checkout, overflow y rotación de conexiones
+# ============================================================
+
+from typing import Any, Dict, Type
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+import threading
+import time
+
+
+class MetricasPool:
+    """
+    Contadores de un pool de conexiones de SQLAlchemy.
+
+    Distingue entre:
+    - espera: tiempo bloqueado obteniendo una conexión del pool
+      (cola llena o creación de una conexión nueva).
+    - latencia de checkout: tiempo total de pool.connect(), que además
+      incluye el pre-ping y los eventos de checkout.
+    - uso: tiempo que una conexión permanece prestada (checkout → checkin).
+    """
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.conexiones_creadas = 0
+        self.conexiones_cerradas = 0
+        self.conexiones_invalidadas = 0
+        self.checkouts_con_overflow = 0
+        self.max_overflow_observado = 0
+        self.max_prestadas_observado = 0
+        self.espera_total_segundos = 0.0
+        self.espera_max_segundos = 0.0
+        self.latencia_total_segundos = 0.0
+        self.latencia_max_segundos = 0.0
+        self.uso_total_segundos = 0.0
+        self.uso_max_segundos = 0.0
+
+    # Registro (llamado desde el pool y los eventos)
+
+    def registrar_espera(self, segundos: float, overflow: int, prestadas: int) -> None:
+        with self._lock:
+            self.espera_total_segundos += segundos
+            self.espera_max_segundos = max(self.espera_max_segundos, segundos)
+            if overflow > 0:
+                self.checkouts_con_overflow += 1
+            self.max_overflow_observado = max(self.max_overflow_observado, overflow)
+            self.max_prestadas_observado = max(self.max_prestadas_observado, prestadas)
+
+    def registrar_latencia(self, segundos: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.latencia_total_segundos += segundos
+            self.latencia_max_segundos = max(self.latencia_max_segundos, segundos)
+
+    def registrar_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def registrar_uso(self, segundos: float) -> None:
+        with self._lock:
+            self.checkins += 1
+            self.uso_total_segundos += segundos
+            self.uso_max_segundos = max(self.uso_max_segundos, segundos)
+
+    def registrar_evento(self, contador: str) -> None:
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    # Consulta
+
+    def estadisticas(self, engine: Engine) -> Dict[str, Any]:
+        """
+        Retorna contadores acumulados y el estado actual del pool.
+
+        Args:
+            engine: Motor síncrono dueño del pool (para leer su estado actual).
+        """
+        pool = engine.pool
+        estado: Dict[str, Any] = {"clase_pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            capacidad = pool.size() + max(pool._max_overflow, 0)
+            estado.update({
+                "tamano": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "timeout_segundos": pool.timeout(),
+                "prestadas": pool.checkedout(),
+                "disponibles": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "saturacion": round(pool.checkedout() / capacidad, 4) if capacidad else 0.0,
+            })
+
+        with self._lock:
+            checkouts = self.checkouts
+            checkins = self.checkins
+            return {
+                "nombre": self.nombre,
+                **estado,
+                "checkouts": checkouts,
+                "checkins": checkins,
+                "timeouts": self.timeouts,
+                "conexiones_creadas": self.conexiones_creadas,
+                "conexiones_cerradas": self.conexiones_cerradas,
+                "conexiones_invalidadas": self.conexiones_invalidadas,
+                "checkouts_con_overflow": self.checkouts_con_overflow,
+                "max_overflow_observado": self.max_overflow_observado,
+                "max_prestadas_observado": self.max_prestadas_observado,
+                "espera_promedio_ms": round(self.espera_total_segundos / checkouts * 1000, 3) if checkouts else 0.0,
+                "espera_max_ms": round(self.espera_max_segundos * 1000, 3),
+                "latencia_checkout_promedio_ms": round(self.latencia_total_segundos / checkouts * 1000, 3) if checkouts else 0.0,
+                "latencia_checkout_max_ms": round(self.latencia_max_segundos * 1000, 3),
+                "uso_promedio_ms": round(self.uso_total_segundos / checkins * 1000, 3) if checkins else 0.0,
+                "uso_max_ms": round(self.uso_max_segundos * 1000, 3),
+            }
+
+
+def clase_pool_instrumentada(base: Type[QueuePool], metricas: MetricasPool) -> Type[QueuePool]:
+    """
+    Crea una subclase de QueuePool (o AsyncAdaptedQueuePool) que mide el
+    tiempo de espera al obtener conexiones.
+
+    SQLAlchemy no emite un evento antes del checkout, por lo que la espera
+    se mide envolviendo _do_get(); la clase se conserva al recrear el pool.
+
+    Args:
+        base: Clase de pool a extender.
+        metricas: Contadores donde registrar.
+    """
+
+    class PoolInstrumentado(base):
+        def connect(self):
+            inicio = time.perf_counter()
+            conexion = super().connect()
+            metricas.registrar_latencia(time.perf_counter() - inicio)
+            return conexion
+
+        def _do_get(self):
+            inicio = time.perf_counter()
+            try:
+                registro = super()._do_get()
+            except exc.TimeoutError:
+                metricas.registrar_timeout()
+                raise
+            metricas.registrar_espera(
+                time.perf_counter() - inicio, self.overflow(), self.checkedout()
+            )
+            return registro
+
+    PoolInstrumentado.__name__ = f"{base.__name__}Instrumentado"
+    PoolInstrumentado.__qualname__ = PoolInstrumentado.__name__
+    return PoolInstrumentado
+
+
+def instrumentar_engine(engine: Engine, metricas: MetricasPool) -> None:
+    """
+    Registra los eventos del pool que miden rotación de conexiones y tiempo de uso.
+
+    Args:
+        engine: Motor síncrono (para motores asíncronos usar async_engine.sync_engine).
+        metricas: Contadores donde registrar.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _al_conectar(conexion_dbapi, registro):
+        metricas.registrar_evento("conexiones_creadas")
+
+    @event.listens_for(engine, "close")
+    def _al_cerrar(conexion_dbapi, registro):
+        metricas.registrar_evento("conexiones_cerradas")
+
+    @event.listens_for(engine, "invalidate")
+    def _al_invalidar(conexion_dbapi, registro, excepcion):
+        metricas.registrar_evento("conexiones_invalidadas")
+
+    @event.listens_for(engine, "checkout")
+    def _al_prestar(conexion_dbapi, registro, proxy):
+        registro.info["pq_prestada_en"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _al_devolver(conexion_dbapi, registro):
+        prestada_en = registro.info.pop("pq_prestada_en", None)
+        if prestada_en is not None:
+            metricas.registrar_uso(time.perf_counter() - prestada_en)
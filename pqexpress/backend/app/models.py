@@ -3,10 +3,11 @@
 # Define la estructura de las tablas de la base de datos
 # ============================================================
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, DECIMAL, Enum, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Boolean, DateTime, Text, DECIMAL, Enum, ForeignKey, Index, DDL, event, inspect
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
+from .geo import codificar_geohash
 import enum
 
 
@@ -61,6 +62,7 @@ class TokenSesion(Base):
     id_token = Column(Integer, primary_key=True, index=True, autoincrement=True)
     id_repartidor = Column(Integer, ForeignKey("repartidores.id_repartidor", ondelete="CASCADE"), nullable=False)
     jwt_token = Column(Text, nullable=False)
+    token_hash = Column(String(64), unique=True, nullable=False, index=True)  # SHA-256 del JWT
     info_dispositivo = Column(String(300))
     direccion_ip = Column(String(50))
     creado_en = Column(DateTime, server_default=func.now())
@@ -74,6 +76,32 @@ class TokenSesion(Base):
         return f"<TokenSesion(id={self.id_token}, repartidor_id={self.id_repartidor}, activo={self.token_activo})>"
 
 
+def _geohash_por_defecto(contexto):
+    """Default de INSERT (ORM y Core): geohash de las coordenadas de la fila."""
+    parametros = contexto.get_current_parameters()
+    lat, lng = parametros.get("lat_destino"), parametros.get("lng_destino")
+    if lat is None or lng is None:
+        return None
+    return codificar_geohash(float(lat), float(lng))
+
+
+def formatear_direccion(calle, numero_exterior, colonia, municipio_ciudad, codigo_postal) -> str:
+    """
+    Dirección completa de un envío. Función aparte de Envio.direccion_completa
+    para poder usarla con filas de Core (ver app/serializacion.py).
+    """
+    partes = [calle]
+    if numero_exterior:
+        partes.append(f"#{numero_exterior}")
+    if colonia:
+        partes.append(f", {colonia}")
+    if municipio_ciudad:
+        partes.append(f", {municipio_ciudad}")
+    if codigo_postal:
+        partes.append(f", CP {codigo_postal}")
+    return " ".join(partes)
+
+
 class Envio(Base):
     """
     Modelo para la tabla 'envios'.
@@ -94,6 +122,7 @@ class Envio(Base):
     referencias_adicionales = Column(Text)
     lat_destino = Column(DECIMAL(10, 8))
     lng_destino = Column(DECIMAL(11, 8))
+    geohash_destino = Column(String(12), default=_geohash_por_defecto)  # Ver app/geo.py
     estatus_envio = Column(
         Enum('asignado', 'en_camino', 'completado', 'fallido', name='estatus_envio_enum'),
         default='asignado',
@@ -105,6 +134,23 @@ class Envio(Base):
     creado_en = Column(DateTime, server_default=func.now())
     modificado_en = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
+    # Índices compuestos para las consultas de routers/envios.py
+    # (igualdad en id_repartidor/estatus_envio + orden por fecha, sin filesort)
+    __table_args__ = (
+        # /mis-envios sin filtro de estado
+        Index("idx_envios_rep_creado", "id_repartidor", "creado_en", "id_envio"),
+        # /mis-envios?estatus=...
+        Index("idx_envios_rep_estatus_creado", "id_repartidor", "estatus_envio", "creado_en", "id_envio"),
+        # /pendientes y /en-ruta
+        Index("idx_envios_rep_estatus_asignacion", "id_repartidor", "estatus_envio", "fecha_asignacion"),
+        # /historial (estatus al final para filtrar dentro del índice)
+        Index("idx_envios_rep_completado", "id_repartidor", "fecha_completado", "id_envio", "estatus_envio"),
+        # /sync (cambios desde el último token)
+        Index("idx_envios_rep_modificado", "id_repartidor", "modificado_en", "id_envio"),
+        # /cercanos (rangos de prefijo geohash)
+        Index("idx_envios_rep_geohash", "id_repartidor", "geohash_destino"),
+    )
+    
     # Relaciones
     repartidor = relationship("Repartidor", back_populates="envios")
     confirmacion = relationship("ConfirmacionEntrega", back_populates="envio", uselist=False)
@@ -112,21 +158,27 @@ class Envio(Base):
     @property
     def direccion_completa(self):
         """Retorna la dirección formateada completa."""
-        partes = [self.calle]
-        if self.numero_exterior:
-            partes.append(f"#{self.numero_exterior}")
-        if self.colonia:
-            partes.append(f", {self.colonia}")
-        if self.municipio_ciudad:
-            partes.append(f", {self.municipio_ciudad}")
-        if self.codigo_postal:
-            partes.append(f", CP {self.codigo_postal}")
-        return " ".join(partes)
+        return formatear_direccion(
+            self.calle, self.numero_exterior, self.colonia, self.municipio_ciudad, self.codigo_postal
+        )
     
     def __repr__(self):
         return f"<Envio(id={self.id_envio}, guia='{self.numero_guia}', estado='{self.estatus_envio}')>"
 
 
+@event.listens_for(Envio, "before_update")
+def _actualizar_geohash(mapper, connection, envio):
+    """Recalcula el geohash si cambiaron las coordenadas (en MySQL también lo hace un trigger)."""
+    historial_lat = inspect(envio).attrs.lat_destino.history
+    historial_lng = inspect(envio).attrs.lng_destino.history
+    if not (historial_lat.has_changes() or historial_lng.has_changes()):
+        return
+    if envio.lat_destino is None or envio.lng_destino is None:
+        envio.geohash_destino = None
+    else:
+        envio.geohash_destino = codificar_geohash(float(envio.lat_destino), float(envio.lng_destino))
+
+
 class ConfirmacionEntrega(Base):
     """
     Modelo para la tabla 'confirmaciones_entrega'.
@@ -140,7 +192,12 @@ class ConfirmacionEntrega(Base):
     lat_confirmacion = Column(DECIMAL(10, 8), nullable=False)
     lng_confirmacion = Column(DECIMAL(11, 8), nullable=False)
     precision_metros = Column(DECIMAL(10, 2))
-    imagen_evidencia = Column(Text)  # Base64 de la imagen
+    imagen_evidencia = Column(Text)  # Base64 heredado pendiente de mover al almacén (evidencias.procesar_evidencia)
+    evidencia_sha256 = Column(String(64), index=True)  # Clave en el almacén de evidencias
+    evidencia_bytes = Column(Integer)
+    evidencia_mime = Column(String(50))
+    miniatura_sha256 = Column(String(64))  # Miniatura JPEG (imagenes.procesar_imagen)
+    miniatura_bytes = Column(Integer)
     nombre_receptor = Column(String(120))
     resultado_entrega = Column(
         Enum('exitosa', 'rechazada', 'parcial', name='resultado_entrega_enum'),
@@ -157,3 +214,95 @@ class ConfirmacionEntrega(Base):
     
     def __repr__(self):
         return f"<ConfirmacionEntrega(id={self.id_confirmacion}, envio_id={self.id_envio}, resultado='{self.resultado_entrega}')>"
+
+
+class EnvioBaja(Base):
+    """
+    Modelo para la tabla 'envios_bajas'.
+    Marcas (tombstones) de envíos que dejaron de pertenecer a un repartidor,
+    por reasignación o eliminación. Las escriben triggers sobre 'envios' y
+    las consume GET /envios/sync para que la app borre su copia local.
+    """
+    __tablename__ = "envios_bajas"
+    
+    id_baja = Column(Integer, primary_key=True, autoincrement=True)
+    id_envio = Column(Integer, nullable=False)  # Sin FK: la marca sobrevive al envío
+    id_repartidor = Column(Integer, nullable=False)  # Repartidor que lo tenía
+    motivo = Column(Enum('reasignado', 'eliminado', name='motivo_baja_enum'), nullable=False)
+    registrado_en = Column(DateTime, server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("idx_bajas_rep_registrado", "id_repartidor", "registrado_en"),
+    )
+    
+    def __repr__(self):
+        return f"<EnvioBaja(envio_id={self.id_envio}, repartidor_id={self.id_repartidor}, motivo='{self.motivo}')>"
+
+
+class ClaveIdempotencia(Base):
+    """
+    Modelo para la tabla 'claves_idempotencia'.
+    Respuestas guardadas por encabezado Idempotency-Key cuando
+    IDEMPOTENCIA_BACKEND=bd (ver app/idempotencia.py).
+    """
+    __tablename__ = "claves_idempotencia"
+    
+    clave = Column(String(64), primary_key=True)  # SHA-256 de repartidor + endpoint + Idempotency-Key
+    huella = Column(String(64), nullable=False)  # SHA-256 del cuerpo de la solicitud
+    estado = Column(Enum('en_proceso', 'completada', name='estado_idempotencia_enum'), nullable=False)
+    codigo_estado = Column(Integer)
+    cuerpo = Column(Text)
+    expira_en = Column(DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<ClaveIdempotencia(clave='{self.clave[:12]}', estado='{self.estado}')>"
+
+
+class PuntoRastreo(Base):
+    """
+    Modelo para la tabla 'puntos_rastreo'.
+    Recorrido GPS de los repartidores. Solo se agregan filas, en lotes
+    desde app/rastreo.py; sin llaves foráneas para abaratar la inserción.
+    """
+    __tablename__ = "puntos_rastreo"
+    
+    id_punto = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    id_repartidor = Column(Integer, nullable=False)
+    lat = Column(DECIMAL(10, 8), nullable=False)
+    lng = Column(DECIMAL(11, 8), nullable=False)
+    precision_metros = Column(SmallInteger)  # Redondeada a metros
+    velocidad = Column(DECIMAL(5, 2))  # m/s
+    capturado_en = Column(DateTime, nullable=False)  # Hora del dispositivo (UTC)
+    
+    __table_args__ = (
+        Index("idx_rastreo_rep_capturado", "id_repartidor", "capturado_en"),
+    )
+    
+    def __repr__(self):
+        return f"<PuntoRastreo(id={self.id_punto}, repartidor_id={self.id_repartidor}, capturado_en={self.capturado_en})>"
+
+
+# Triggers que escriben envios_bajas (mismos que database/schema.sql).
+# Solo aplican a create_all (SQLite de benchmarks); en MySQL usar schema.sql.
+_TRIGGERS_BAJAS_SQLITE = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_envios_baja_reasignado
+    AFTER UPDATE OF id_repartidor ON envios
+    WHEN OLD.id_repartidor IS NOT NULL AND NEW.id_repartidor IS NOT OLD.id_repartidor
+    BEGIN
+        INSERT INTO envios_bajas (id_envio, id_repartidor, motivo, registrado_en)
+        VALUES (OLD.id_envio, OLD.id_repartidor, 'reasignado', CURRENT_TIMESTAMP);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_envios_baja_eliminado
+    AFTER DELETE ON envios
+    WHEN OLD.id_repartidor IS NOT NULL
+    BEGIN
+        INSERT INTO envios_bajas (id_envio, id_repartidor, motivo, registrado_en)
+        VALUES (OLD.id_envio, OLD.id_repartidor, 'eliminado', CURRENT_TIMESTAMP);
+    END
+    """,
+]
+for _trigger in _TRIGGERS_BAJAS_SQLITE:
+    event.listen(Base.metadata, "after_create", DDL(_trigger).execute_if(dialect="sqlite"))
@@ -0,0 +1,124 @@
+# ============================================================
+# PQEXPRESS - Paginación por Cursor (Keyset)
+# Cursores opacos sobre (fecha, id) para listas ordenadas descendente
+# ============================================================
+
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+import base64
+import json
+
+
+def _codificar(datos: list) -> str:
+    """Serializa una lista a Base64 URL-safe sin relleno."""
+    crudo = json.dumps(datos, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def _decodificar(valor: str) -> list:
+    """Inverso de _codificar. Lanza ValueError/TypeError si no es válido."""
+    relleno = "=" * (-len(valor) % 4)
+    datos = json.loads(base64.urlsafe_b64decode(valor + relleno))
+    if not isinstance(datos, list):
+        raise ValueError("Se esperaba una lista")
+    return datos
+
+
+def _fecha(valor: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(valor) if valor else None
+
+
+def codificar_cursor(fecha: Optional[datetime], id_registro: int) -> str:
+    """
+    Genera un cursor opaco a partir de la última fila de una página.
+
+    Args:
+        fecha: Valor de la columna de orden de la última fila (puede ser None).
+        id_registro: ID de la última fila (desempate).
+
+    Returns:
+        str: Cursor en Base64 URL-safe.
+    """
+    return _codificar([fecha.isoformat() if fecha else None, id_registro])
+
+
+def decodificar_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """
+    Decodifica un cursor generado por codificar_cursor.
+
+    Returns:
+        tuple: (fecha, id_registro)
+
+    Raises:
+        HTTPException: 400 si el cursor no es válido.
+    """
+    try:
+        fecha, id_registro = _decodificar(cursor)
+        return _fecha(fecha), int(id_registro)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        )
+
+
+def filtro_despues_de(columna_fecha, columna_id, fecha: Optional[datetime], id_registro: int):
+    """
+    Construye la condición keyset para continuar después de (fecha, id_registro)
+    en un orden `columna_fecha DESC, columna_id DESC`.
+
+    MySQL (y SQLite) ordenan los NULL al final en orden descendente, por lo
+    que las filas sin fecha van después de todas las que sí la tienen.
+    """
+    if fecha is None:
+        return and_(columna_fecha.is_(None), columna_id < id_registro)
+    return or_(
+        columna_fecha < fecha,
+        and_(columna_fecha == fecha, columna_id < id_registro),
+        columna_fecha.is_(None)
+    )
+
+
+def filtro_posterior_a(columna_fecha, columna_id, fecha: datetime, id_registro: int):
+    """
+    Condición keyset para continuar después de (fecha, id_registro) en un
+    orden `columna_fecha ASC, columna_id ASC` (columna_fecha NOT NULL).
+    """
+    return or_(
+        columna_fecha > fecha,
+        and_(columna_fecha == fecha, columna_id > id_registro)
+    )
+
+
+def codificar_token_sync(fecha: datetime, id_registro: int, fecha_bajas: datetime) -> str:
+    """
+    Genera el token de sincronización incremental.
+
+    Args:
+        fecha: modificado_en de la última fila entregada.
+        id_registro: ID de la última fila entregada (desempate).
+        fecha_bajas: Desde cuándo buscar bajas (se mantiene entre páginas).
+    """
+    return _codificar([fecha.isoformat(), id_registro, fecha_bajas.isoformat()])
+
+
+def decodificar_token_sync(token: str) -> Tuple[datetime, int, datetime]:
+    """
+    Decodifica un token generado por codificar_token_sync.
+
+    Returns:
+        tuple: (fecha, id_registro, fecha_bajas)
+
+    Raises:
+        HTTPException: 400 si el token no es válido.
+    """
+    try:
+        fecha, id_registro, fecha_bajas = _decodificar(token)
+        return datetime.fromisoformat(fecha), int(id_registro), datetime.fromisoformat(fecha_bajas)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token de sincronización inválido; sincronizar de nuevo sin 'since'"
+        )
@@ -0,0 +1,226 @@
+# ============================================================
+# PQEXPRESS - Perfilador de Consultas SQL
+# Sentencias, tiempos y filas por solicitud; detección de N+1
+# ============================================================
+"""
+Opcional (PERFIL_SQL_HABILITADO=true); sin él no se registran eventos ni
+middleware y no agrega costo.
+
+Para cada solicitud HTTP guarda las sentencias ejecutadas con su tiempo
+y filas, y marca las que se repiten dentro de la misma solicitud:
+- n+1: misma sentencia con parámetros distintos (consulta dentro de un ciclo)
+- duplicada: misma sentencia con los mismos parámetros (trabajo repetido)
+
+El resumen sale en el encabezado X-Perfil-SQL, en una línea del logger
+app.perfil_sql (INFO; las repeticiones en WARNING) y en los últimos
+PERFIL_SQL_HISTORIAL perfiles de GET /api/metricas/perfil-sql.
+
+Las filas son el rowcount que informa el driver: pymysql lo da también
+para SELECT, sqlite3 solo para INSERT/UPDATE/DELETE (None en los demás).
+"""
+
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import logging
+import os
+import threading
+import time
+
+# Cargar variables de entorno
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+PERFIL_SQL_HABILITADO = os.getenv("PERFIL_SQL_HABILITADO", "False").lower() == "true"
+# Veces que una sentencia puede ejecutarse en una solicitud antes de marcarse
+PERFIL_SQL_UMBRAL_REPETICIONES = int(os.getenv("PERFIL_SQL_UMBRAL_REPETICIONES", "2"))
+# Perfiles completos que se conservan para /metricas/perfil-sql
+PERFIL_SQL_HISTORIAL = int(os.getenv("PERFIL_SQL_HISTORIAL", "100"))
+
+ENCABEZADO_PERFIL = "X-Perfil-SQL"
+# Largo máximo de cada sentencia en el historial y en el log
+_LARGO_SENTENCIA = 500
+
+
+class PerfilSolicitud:
+    """Sentencias ejecutadas durante una solicitud."""
+
+    __slots__ = ("sentencias",)
+
+    def __init__(self):
+        # (sentencia, huella de parámetros, segundos, filas)
+        self.sentencias: List[Tuple[str, Optional[str], float, Optional[int]]] = []
+
+    def agregar(self, sentencia: str, parametros: Any, segundos: float, filas: Optional[int], executemany: bool) -> None:
+        # Los parámetros solo se usan para distinguir n+1 de duplicadas; no se guardan.
+        # Un executemany cuenta como una sentencia con parámetros propios.
+        huella = None if executemany else repr(parametros)
+        self.sentencias.append((sentencia, huella, segundos, filas))
+
+    def repetidas(self) -> List[Dict[str, Any]]:
+        """Sentencias ejecutadas PERFIL_SQL_UMBRAL_REPETICIONES veces o más."""
+        grupos: Dict[str, List[Optional[str]]] = {}
+        for sentencia, huella, _, _ in self.sentencias:
+            grupos.setdefault(sentencia, []).append(huella)
+        resultado = []
+        for sentencia, huellas in grupos.items():
+            if len(huellas) < PERFIL_SQL_UMBRAL_REPETICIONES:
+                continue
+            distintas = len(set(huellas)) if None not in huellas else len(huellas)
+            resultado.append({
+                "tipo": "n+1" if distintas > 1 else "duplicada",
+                "veces": len(huellas),
+                "parametros_distintos": distintas,
+                "sentencia": sentencia[:_LARGO_SENTENCIA],
+            })
+        return resultado
+
+    def resumen(self) -> Dict[str, Any]:
+        filas = [f for _, _, _, f in self.sentencias if f is not None]
+        return {
+            "consultas": len(self.sentencias),
+            "tiempo_ms": round(sum(s for _, _, s, _ in self.sentencias) * 1000, 3),
+            "filas": sum(filas) if filas else None,
+        }
+
+
+_perfil_solicitud: ContextVar[Optional[PerfilSolicitud]] = ContextVar("perfil_solicitud", default=None)
+
+
+class HistorialPerfiles:
+    """Últimos perfiles completos de este proceso."""
+
+    def __init__(self, maximo: int):
+        self._lock = threading.Lock()
+        self._perfiles: Deque[Dict[str, Any]] = deque(maxlen=maximo)
+        self.solicitudes = 0
+        self.solicitudes_con_repetidas = 0
+
+    def agregar(self, perfil: Dict[str, Any]) -> None:
+        with self._lock:
+            self._perfiles.append(perfil)
+            self.solicitudes += 1
+            if perfil["repetidas"]:
+                self.solicitudes_con_repetidas += 1
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores y perfiles recientes (el más nuevo primero) para /metricas/perfil-sql."""
+        with self._lock:
+            return {
+                "habilitado": PERFIL_SQL_HABILITADO,
+                "umbral_repeticiones": PERFIL_SQL_UMBRAL_REPETICIONES,
+                "solicitudes": self.solicitudes,
+                "solicitudes_con_repetidas": self.solicitudes_con_repetidas,
+                "perfiles": list(reversed(self._perfiles)),
+            }
+
+
+# Instancia global usada por el middleware y routers/metricas.py
+historial_perfiles = HistorialPerfiles(PERFIL_SQL_HISTORIAL)
+
+
+def instrumentar_perfil_sql(engine: Engine) -> None:
+    """
+    Registra cada sentencia en el perfil de la solicitud en curso.
+
+    Args:
+        engine: Motor síncrono (para motores asíncronos usar async_engine.sync_engine).
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conexion, cursor, sentencia, parametros, contexto, executemany):
+        if _perfil_solicitud.get() is not None:
+            conexion.info.setdefault("pq_inicio_perfil", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conexion, cursor, sentencia, parametros, contexto, executemany):
+        perfil = _perfil_solicitud.get()
+        inicios = conexion.info.get("pq_inicio_perfil")
+        if perfil is None or not inicios:
+            return
+        segundos = time.perf_counter() - inicios.pop()
+        filas = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+        perfil.agregar(sentencia, parametros, segundos, filas, executemany)
+
+
+class MiddlewarePerfilSQL:
+    """
+    Middleware ASGI que abre un perfil por solicitud y agrega el resumen
+    como encabezado X-Perfil-SQL. Las sentencias que se ejecuten después
+    de iniciar la respuesta (streaming, BackgroundTasks) cuentan en el log
+    y el historial pero no en el encabezado.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        perfil = PerfilSolicitud()
+        token = _perfil_solicitud.set(perfil)
+        inicio = time.perf_counter()
+        estado = {"codigo": 500}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+                resumen = perfil.resumen()
+                valor = f"consultas={resumen['consultas']}; tiempo_ms={resumen['tiempo_ms']}"
+                if resumen["filas"] is not None:
+                    valor += f"; filas={resumen['filas']}"
+                repetidas = perfil.repetidas()
+                if repetidas:
+                    valor += f"; repetidas={len(repetidas)}"
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [
+                    (ENCABEZADO_PERFIL.lower().encode("latin-1"), valor.encode("latin-1"))
+                ]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _perfil_solicitud.reset(token)
+            _registrar(scope, estado["codigo"], perfil, time.perf_counter() - inicio)
+
+
+def _registrar(scope, codigo: int, perfil: PerfilSolicitud, segundos: float) -> None:
+    ruta = scope.get("route")
+    ruta = getattr(ruta, "path_format", None) or scope["path"]
+    resumen = perfil.resumen()
+    repetidas = perfil.repetidas()
+
+    logger.info(
+        "%s %s %d: %d consultas, %.2f ms en BD, %s filas, %.2f ms total",
+        scope["method"], ruta, codigo, resumen["consultas"], resumen["tiempo_ms"],
+        resumen["filas"] if resumen["filas"] is not None else "?", segundos * 1000
+    )
+    for repetida in repetidas:
+        logger.warning(
+            "%s %s: sentencia %s ejecutada %d veces (%d parámetros distintos): %s",
+            scope["method"], ruta, repetida["tipo"], repetida["veces"],
+            repetida["parametros_distintos"], repetida["sentencia"]
+        )
+
+    historial_perfiles.agregar({
+        "metodo": scope["method"],
+        "ruta": ruta,
+        "codigo": codigo,
+        "duracion_ms": round(segundos * 1000, 3),
+        **resumen,
+        "repetidas": repetidas,
+        "sentencias": [
+            {"sentencia": sentencia[:_LARGO_SENTENCIA], "tiempo_ms": round(s * 1000, 3), "filas": filas}
+            for sentencia, _, s, filas in perfil.sentencias
+        ],
+    })
@@ -0,0 +1,147 @@
+# ============================================================
+# PQEXPRESS - Pool de Hash de Contraseñas
+# Ejecuta bcrypt fuera del event loop con concurrencia limitada
+# ============================================================
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from dotenv import load_dotenv
+import asyncio
+import threading
+import time
+import os
+
+# Cargar variables de entorno
+load_dotenv()
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+# Hilos dedicados a bcrypt (bcrypt libera el GIL, por lo que los hilos sí corren en paralelo)
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Máximo de operaciones en espera antes de rechazar nuevas solicitudes
+HASH_POOL_MAX_COLA = int(os.getenv("HASH_POOL_MAX_COLA", "256"))
+
+
+class PoolSaturadoError(Exception):
+    """Se lanza cuando la cola del pool de hash alcanzó su límite."""
+    pass
+
+
+class PoolHash:
+    """
+    Pool de hilos de tamaño fijo para operaciones de bcrypt.
+
+    Limita cuántos hashes se calculan a la vez (max_workers) y cuántos
+    pueden esperar turno (max_cola). Mientras tanto el event loop sigue
+    atendiendo otros endpoints.
+
+    También se reutiliza para otras tareas de CPU que liberan el GIL
+    (ver imagenes.pool_imagenes).
+
+    Args:
+        max_workers: Hilos que ejecutan bcrypt en paralelo.
+        max_cola: Operaciones en espera permitidas antes de rechazar.
+        nombre: Identifica el pool en los hilos y mensajes de error.
+    """
+
+    def __init__(self, max_workers: int, max_cola: int, nombre: str = "hash"):
+        self.max_workers = max_workers
+        self.max_cola = max_cola
+        self.nombre = nombre
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f"pqexpress-{nombre}"
+        )
+        self._lock = threading.Lock()
+        self.en_cola = 0
+        self.en_ejecucion = 0
+        self.completadas = 0
+        self.rechazadas = 0
+        self.canceladas = 0
+        self.max_cola_observada = 0
+        self.espera_total_segundos = 0.0
+        self.espera_max_segundos = 0.0
+        self.ejecucion_total_segundos = 0.0
+
+    async def ejecutar(self, funcion: Callable[..., Any], *args: Any) -> Any:
+        """
+        Ejecuta una función en el pool y espera su resultado sin bloquear el event loop.
+
+        Raises:
+            PoolSaturadoError: Si ya hay max_cola operaciones esperando.
+        """
+        with self._lock:
+            if self.en_cola >= self.max_cola:
+                self.rechazadas += 1
+                raise PoolSaturadoError(f"Cola del pool '{self.nombre}' llena")
+            self.en_cola += 1
+            self.max_cola_observada = max(self.max_cola_observada, self.en_cola)
+
+        # Si quien espera se cancela (cliente desconectado, timeout) antes de
+        # que un hilo tome la operación, el hilo nunca corre: el lugar en la
+        # cola se libera aquí y la operación se marca para no ejecutarse.
+        operacion = {"iniciada": False, "cancelada": False}
+        encolado_en = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor, self._ejecutar_medido, operacion, encolado_en, funcion, args
+            )
+        finally:
+            with self._lock:
+                if not operacion["iniciada"]:
+                    operacion["cancelada"] = True
+                    self.en_cola -= 1
+                    self.canceladas += 1
+
+    def _ejecutar_medido(
+        self, operacion: Dict[str, bool], encolado_en: float, funcion: Callable[..., Any], args: tuple
+    ) -> Any:
+        """Corre dentro del hilo del pool y registra tiempos de espera y ejecución."""
+        inicio = time.perf_counter()
+        espera = inicio - encolado_en
+        with self._lock:
+            if operacion["cancelada"]:
+                return None
+            operacion["iniciada"] = True
+            self.en_cola -= 1
+            self.en_ejecucion += 1
+            self.espera_total_segundos += espera
+            self.espera_max_segundos = max(self.espera_max_segundos, espera)
+        try:
+            return funcion(*args)
+        finally:
+            with self._lock:
+                self.en_ejecucion -= 1
+                self.completadas += 1
+                self.ejecucion_total_segundos += time.perf_counter() - inicio
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """
+        Retorna métricas del pool: profundidad de cola, operaciones activas y tiempos.
+        """
+        with self._lock:
+            completadas = self.completadas
+            return {
+                "max_workers": self.max_workers,
+                "max_cola": self.max_cola,
+                "en_cola": self.en_cola,
+                "en_ejecucion": self.en_ejecucion,
+                "max_cola_observada": self.max_cola_observada,
+                "completadas": completadas,
+                "rechazadas": self.rechazadas,
+                "canceladas": self.canceladas,
+                "espera_promedio_ms": round(self.espera_total_segundos / completadas * 1000, 2) if completadas else 0.0,
+                "espera_max_ms": round(self.espera_max_segundos * 1000, 2),
+                "ejecucion_promedio_ms": round(self.ejecucion_total_segundos / completadas * 1000, 2) if completadas else 0.0,
+            }
+
+    def cerrar(self) -> None:
+        """Detiene el pool esperando las operaciones en curso."""
+        self._executor.shutdown(wait=True)
+
+
+# Instancia global usada por security.hashear_clave_async / verificar_clave_async
+pool_hash = PoolHash(max_workers=HASH_POOL_WORKERS, max_cola=HASH_POOL_MAX_COLA)
@@ -0,0 +1,263 @@
+# ============================================================
+# PQEXPRESS - Ingesta de Rastreo GPS
+# Buffer en memoria de puntos GPS con escritura por lotes
+# ============================================================
+"""
+Los puntos que envía la app se acumulan en memoria y una tarea de fondo
+los escribe en puntos_rastreo con un INSERT de varias filas cuando se
+junta RASTREO_LOTE_MAX o pasa RASTREO_INTERVALO_MS, lo que ocurra
+primero. Así una ráfaga de miles de puntos cuesta unas pocas
+transacciones en lugar de una por punto.
+
+Un lote que falla vuelve al frente de la cola. Si falla
+RASTREO_REINTENTOS_MAX veces seguidas se escribe por mitades para aislar
+las filas que la BD rechaza; esas se descartan (contador `invalidos` y
+log de error) y las demás se escriben, así un punto malo no bloquea a
+todos los repartidores. Si no entra ninguna fila (BD caída) el lote
+vuelve completo a la cola.
+
+Los puntos pendientes se pierden si el proceso muere sin pasar por el
+shutdown (a lo sumo RASTREO_INTERVALO_MS de recorrido); es aceptable
+para un rastro de posiciones, no para datos de entrega.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import time
+
+from .models import PuntoRastreo
+
+# Cargar variables de entorno
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+# Puntos por INSERT (y umbral que adelanta la escritura)
+RASTREO_LOTE_MAX = int(os.getenv("RASTREO_LOTE_MAX", "2000"))
+# Tiempo máximo que un punto espera en memoria
+RASTREO_INTERVALO_MS = int(os.getenv("RASTREO_INTERVALO_MS", "1000"))
+# Puntos pendientes máximos; por encima se rechazan lotes (la BD no da abasto)
+RASTREO_PENDIENTES_MAX = int(os.getenv("RASTREO_PENDIENTES_MAX", "100000"))
+# Fallos seguidos del mismo lote antes de aislar las filas que lo hacen fallar
+RASTREO_REINTENTOS_MAX = int(os.getenv("RASTREO_REINTENTOS_MAX", "3"))
+
+# Escrituras máximas al aislar un lote (acota el costo si en realidad la BD está caída)
+_AISLAMIENTO_MAX_ESCRITURAS = 64
+
+
+def _utc_sin_zona(fecha: datetime) -> datetime:
+    """Convierte a UTC sin tzinfo (DATETIME de MySQL). Las fechas sin zona se asumen UTC."""
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+class BufferRastreo:
+    """
+    Acumula filas de puntos_rastreo y las escribe por lotes desde una
+    tarea de fondo, que se inicia con el primer punto recibido.
+
+    Todos los métodos se llaman desde el event loop, por lo que la lista
+    de pendientes no necesita lock.
+    """
+
+    def __init__(self, lote_max: int, intervalo_ms: int, pendientes_max: int):
+        self.lote_max = lote_max
+        self.intervalo = intervalo_ms / 1000
+        self.pendientes_max = pendientes_max
+        self._pendientes: List[Dict] = []
+        self._hay_lote = asyncio.Event()
+        self._tarea: Optional[asyncio.Task] = None
+        self._deteniendo = False
+        # Métricas
+        self.recibidos = 0
+        self.escritos = 0
+        self.rechazados = 0
+        self.descartados = 0
+        self.invalidos = 0
+        self._fallos_seguidos = 0
+        self.lotes = 0
+        self.errores = 0
+        self.ultimo_lote_ms = 0.0
+        self.max_pendientes_observado = 0
+
+    def agregar(self, id_repartidor: int, puntos: List) -> bool:
+        """
+        Encola los puntos de un repartidor.
+
+        Returns:
+            bool: False si se rechazó el lote por exceder RASTREO_PENDIENTES_MAX.
+        """
+        if len(self._pendientes) + len(puntos) > self.pendientes_max:
+            self.rechazados += len(puntos)
+            return False
+
+        self._pendientes.extend(
+            {
+                "id_repartidor": id_repartidor,
+                "lat": punto.lat,
+                "lng": punto.lng,
+                "precision_metros": (
+                    min(round(punto.precision_metros), 32767) if punto.precision_metros is not None else None
+                ),
+                "velocidad": min(punto.velocidad, 999.99) if punto.velocidad is not None else None,
+                "capturado_en": _utc_sin_zona(punto.capturado_en),
+            }
+            for punto in puntos
+        )
+        self.recibidos += len(puntos)
+        self.max_pendientes_observado = max(self.max_pendientes_observado, len(self._pendientes))
+
+        loop = asyncio.get_running_loop()
+        if self._tarea is None or self._tarea.done() or self._tarea.get_loop() is not loop:
+            self._hay_lote = asyncio.Event()
+            self._tarea = loop.create_task(self._ciclo())
+        if len(self._pendientes) >= self.lote_max:
+            self._hay_lote.set()
+        return True
+
+    async def _ciclo(self) -> None:
+        """Escribe lo pendiente cada intervalo, o antes si se juntó un lote completo."""
+        while not self._deteniendo:
+            try:
+                await asyncio.wait_for(self._hay_lote.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._hay_lote.clear()
+            await self.escribir_pendientes()
+
+    async def escribir_pendientes(self) -> None:
+        """Escribe todos los puntos pendientes en lotes de lote_max filas."""
+        while self._pendientes:
+            lote = self._pendientes[:self.lote_max]
+            del self._pendientes[:self.lote_max]
+            inicio = time.perf_counter()
+            if self._fallos_seguidos >= RASTREO_REINTENTOS_MAX:
+                self._fallos_seguidos = 0
+                escritos, sin_escribir = await self._escribir_aislando(lote)
+                self.escritos += escritos
+                self.lotes += 1
+                self.ultimo_lote_ms = (time.perf_counter() - inicio) * 1000
+                if sin_escribir:
+                    self._reencolar(sin_escribir)
+                    return
+                continue
+            try:
+                await self._insertar(lote)
+            except Exception:
+                self.errores += 1
+                self._fallos_seguidos += 1
+                logger.exception("Error al escribir %d puntos de rastreo", len(lote))
+                self._reencolar(lote)
+                return
+            self._fallos_seguidos = 0
+            self.escritos += len(lote)
+            self.lotes += 1
+            self.ultimo_lote_ms = (time.perf_counter() - inicio) * 1000
+
+    async def _insertar(self, filas: List[Dict]) -> None:
+        from sqlalchemy import insert
+        from .database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(PuntoRastreo), filas)
+            await db.commit()
+
+    def _reencolar(self, filas: List[Dict]) -> None:
+        """Devuelve filas al frente de la cola si caben; se reintentan en el siguiente ciclo."""
+        if len(self._pendientes) + len(filas) <= self.pendientes_max:
+            self._pendientes[:0] = filas
+        else:
+            self.descartados += len(filas)
+
+    async def _escribir_aislando(self, lote: List[Dict]) -> Tuple[int, List[Dict]]:
+        """
+        Escribe un lote que ya falló varias veces dividiéndolo por mitades
+        hasta dejar solas las filas que la BD rechaza, que se descartan.
+
+        Si no se pudo escribir ninguna fila (BD caída, no una fila inválida)
+        no se descarta nada; tampoco las filas que quedaron sin intentar al
+        agotar _AISLAMIENTO_MAX_ESCRITURAS.
+
+        Returns:
+            Tuple[int, List[Dict]]: Filas escritas y filas a reencolar.
+        """
+        presupuesto = _AISLAMIENTO_MAX_ESCRITURAS
+        rechazadas: List[Dict] = []
+        sin_intentar: List[Dict] = []
+
+        async def escribir(filas: List[Dict]) -> int:
+            nonlocal presupuesto
+            if presupuesto <= 0:
+                sin_intentar.extend(filas)
+                return 0
+            presupuesto -= 1
+            try:
+                await self._insertar(filas)
+                return len(filas)
+            except Exception:
+                if len(filas) == 1:
+                    rechazadas.extend(filas)
+                    return 0
+                return await dividir(filas)
+
+        async def dividir(filas: List[Dict]) -> int:
+            mitad = len(filas) // 2
+            return await escribir(filas[:mitad]) + await escribir(filas[mitad:])
+
+        # El lote completo ya falló: empezar por sus mitades
+        escritos = await dividir(lote) if len(lote) > 1 else await escribir(lote)
+        if escritos == 0 and len(lote) > 1:
+            self.errores += 1
+            logger.error("No se pudo escribir ninguno de %d puntos de rastreo; se reintentan", len(lote))
+            return 0, lote
+        if rechazadas:
+            self.invalidos += len(rechazadas)
+            logger.error(
+                "Descartados %d de %d puntos de rastreo que la BD rechaza (ej. %r)",
+                len(rechazadas), len(lote), rechazadas[0]
+            )
+        return escritos, sin_intentar
+
+    async def detener(self) -> None:
+        """Detiene la tarea de fondo y escribe lo pendiente (shutdown)."""
+        self._deteniendo = True
+        if self._tarea is not None and self._tarea.get_loop() is asyncio.get_running_loop():
+            self._hay_lote.set()
+            await self._tarea
+        self._tarea = None
+        await self.escribir_pendientes()
+        self._deteniendo = False
+
+    def estadisticas(self) -> dict:
+        """Contadores del buffer para /metricas/rastreo."""
+        return {
+            "pendientes": len(self._pendientes),
+            "max_pendientes_observado": self.max_pendientes_observado,
+            "recibidos": self.recibidos,
+            "escritos": self.escritos,
+            "lotes": self.lotes,
+            "rechazados": self.rechazados,
+            "descartados": self.descartados,
+            "invalidos": self.invalidos,
+            "errores": self.errores,
+            "ultimo_lote_ms": round(self.ultimo_lote_ms, 2),
+            "lote_max": self.lote_max,
+            "intervalo_ms": int(self.intervalo * 1000),
+        }
+
+
+# Instancia global usada por routers/rastreo.py
+buffer_rastreo = BufferRastreo(
+    lote_max=RASTREO_LOTE_MAX,
+    intervalo_ms=RASTREO_INTERVALO_MS,
+    pendientes_max=RASTREO_PENDIENTES_MAX
+)
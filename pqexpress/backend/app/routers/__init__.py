@@ -7,5 +7,7 @@ Módulo que contiene los routers de la API.
 
 from .auth import router as auth_router
 from .envios import router as envios_router
+from .metricas import router as metricas_router
+from .rastreo import router as rastreo_router
 
-__all__ = ["auth_router", "envios_router"]
+__all__ = ["auth_router", "envios_router", "metricas_router", "rastreo_router"]
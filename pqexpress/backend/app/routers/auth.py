@@ -4,17 +4,18 @@
 # ============================================================
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models import Repartidor
 from ..schemas import (
     LoginRequest, LoginResponse, TokenValidationRequest, TokenValidationResponse,
     RepartidorResponse, MensajeResponse, ErrorResponse
 )
 from ..security import (
-    verificar_clave, crear_token_acceso, decodificar_token,
+    verificar_clave_async, crear_token_acceso, decodificar_token,
     invalidar_sesiones_anteriores, crear_sesion, validar_sesion_activa,
     cerrar_sesion, obtener_usuario_actual, obtener_token_actual
 )
@@ -39,7 +40,7 @@ router = APIRouter(
 async def login(
     datos_login: LoginRequest,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Endpoint para iniciar sesión.
@@ -55,9 +56,10 @@ async def login(
     - Contraseña: 123456
     """
     # Buscar usuario en la base de datos
-    usuario = db.query(Repartidor).filter(
-        Repartidor.usuario == datos_login.usuario
-    ).first()
+    resultado = await db.execute(
+        select(Repartidor).where(Repartidor.usuario == datos_login.usuario)
+    )
+    usuario = resultado.scalars().first()
     
     # Validar que el usuario existe
     if not usuario:
@@ -67,8 +69,8 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Validar contraseña con bcrypt
-    if not verificar_clave(datos_login.clave, usuario.clave_hash):
+    # Validar contraseña con bcrypt (en el pool de hash, fuera del event loop)
+    if not await verificar_clave_async(datos_login.clave, usuario.clave_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos",
@@ -83,7 +85,7 @@ async def login(
         )
     
     # Invalidar sesiones anteriores (solo una sesión activa por usuario)
-    invalidar_sesiones_anteriores(db, usuario.id_repartidor)
+    await invalidar_sesiones_anteriores(db, usuario.id_repartidor)
     
     # Crear nuevo token JWT
     datos_token = {
@@ -97,7 +99,7 @@ async def login(
     ip_cliente = request.client.host if request.client else None
     
     # Guardar sesión en la base de datos
-    crear_sesion(
+    await crear_sesion(
         db=db,
         id_repartidor=usuario.id_repartidor,
         token=token,
@@ -108,7 +110,7 @@ async def login(
     
     # Actualizar última conexión del usuario
     usuario.ultima_conexion = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     # Construir respuesta
     return LoginResponse(
@@ -128,7 +130,7 @@ async def login(
 )
 async def logout(
     token: str = Depends(obtener_token_actual),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Endpoint para cerrar sesión.
@@ -137,7 +139,7 @@ async def logout(
     - El token ya no será válido para futuras solicitudes
     """
     # Cerrar la sesión (invalidar token en BD)
-    sesion_cerrada = cerrar_sesion(db, token)
+    sesion_cerrada = await cerrar_sesion(db, token)
     
     if sesion_cerrada:
         return MensajeResponse(
@@ -176,7 +178,7 @@ async def obtener_perfil(
 )
 async def validar_token(
     datos: TokenValidationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Endpoint para validar un token JWT.
@@ -198,7 +200,7 @@ async def validar_token(
         )
     
     # Verificar sesión activa en BD
-    sesion = validar_sesion_activa(db, datos.token)
+    sesion = await validar_sesion_activa(db, datos.token)
     
     if sesion is None:
         return TokenValidationResponse(
@@ -208,9 +210,10 @@ async def validar_token(
         )
     
     # Obtener usuario
-    usuario = db.query(Repartidor).filter(
-        Repartidor.id_repartidor == sesion.id_repartidor
-    ).first()
+    resultado = await db.execute(
+        select(Repartidor).where(Repartidor.id_repartidor == sesion.id_repartidor)
+    )
+    usuario = resultado.scalars().first()
     
     if usuario is None or not usuario.esta_activo:
         return TokenValidationResponse(
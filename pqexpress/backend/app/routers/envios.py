@@ -3,20 +3,47 @@
 # Endpoints: listar, detalle, iniciar ruta, registrar entrega
 # ============================================================
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from datetime import datetime
-from typing import Optional, List
-
-from ..database import get_db
-from ..models import Repartidor, Envio, ConfirmacionEntrega
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy import select, insert, update, func, and_, or_, exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import Optional, List, Tuple, Union
+import asyncio
+import os
+
+from ..database import get_async_db
+from ..models import Repartidor, Envio, ConfirmacionEntrega, EnvioBaja
 from ..schemas import (
-    EnvioResponse, EnvioListResponse, IniciarRutaRequest, IniciarRutaResponse,
+    EnvioResponse, EnvioListResponse, EnvioResumenListResponse, VistaEnvioEnum, SyncEnviosResponse,
+    IniciarRutaRequest, IniciarRutaResponse,
     ConfirmacionEntregaRequest, ConfirmacionEntregaResponse, RegistrarEntregaResponse,
+    ConfirmacionLoteRequest, ConfirmacionLoteResponse, ResultadoLoteItem,
+    ParadaRuta, RutaOptimizadaResponse, EnvioCercano, EnviosCercanosResponse,
     MensajeResponse, ErrorResponse
 )
 from ..security import obtener_usuario_actual
+from ..paginacion import (
+    codificar_cursor, decodificar_cursor, filtro_despues_de,
+    filtro_posterior_a, codificar_token_sync, decodificar_token_sync
+)
+from ..etags import respuesta_condicional
+from ..eventos import (
+    broker_eventos, canal_repartidor, publicar_cambios_envios, formatear_sse,
+    EVENTOS_MAX_CONEXIONES
+)
+from ..idempotencia import ControlIdempotencia, control_idempotencia
+from ..evidencias import (
+    almacen_evidencias, AlmacenLocal, guardar_evidencia, liberar_evidencias, recibir_evidencia,
+    validar_evidencia_base64,
+    EVIDENCIAS_MAX_BYTES, EvidenciaInvalidaError, EvidenciaDemasiadoGrandeError
+)
+from ..imagenes import procesar_imagen, MIME_PROCESADO
+from ..geo import caja_para_radio, celdas_para_caja, rangos_para_celdas, distancia_metros
+from ..pool_hash import PoolSaturadoError
+from ..rutas import optimizar_ruta, pool_rutas, RUTAS_PRESUPUESTO_MS
+from ..serializacion import columnas_envio, filas_a_dicts, respuesta_rapida
 
 # Crear router con prefijo y tags
 router = APIRouter(
@@ -28,6 +55,17 @@ router = APIRouter(
     }
 )
 
+# Segundos que /sync vuelve a revisar en cada llamada: cubre transacciones
+# que confirman tarde y la resolución de 1 s de DATETIME en MySQL
+SYNC_MARGEN_SEGUNDOS = int(os.getenv("SYNC_MARGEN_SEGUNDOS", "5"))
+# Antigüedad máxima de un token: las bajas más viejas se pueden purgar
+SYNC_RETENCION_BAJAS_DIAS = int(os.getenv("SYNC_RETENCION_BAJAS_DIAS", "90"))
+# /stream: comentario de keep-alive para proxies y duración máxima de una
+# conexión (al reconectar se vuelve a validar el token)
+STREAM_HEARTBEAT_SEGUNDOS = int(os.getenv("STREAM_HEARTBEAT_SEGUNDOS", "15"))
+STREAM_DURACION_MAX_SEGUNDOS = int(os.getenv("STREAM_DURACION_MAX_SEGUNDOS", "3600"))
+STREAM_REINTENTO_MS = int(os.getenv("STREAM_REINTENTO_MS", "3000"))
+
 
 def convertir_envio_a_response(envio: Envio) -> EnvioResponse:
     """
@@ -58,31 +96,266 @@ def convertir_envio_a_response(envio: Envio) -> EnvioResponse:
     )
 
 
+def convertir_confirmacion_a_response(confirmacion: ConfirmacionEntrega) -> ConfirmacionEntregaResponse:
+    """
+    Convierte un objeto ConfirmacionEntrega de SQLAlchemy a su schema de respuesta.
+    Maneja la conversión de Decimal a float.
+    """
+    return ConfirmacionEntregaResponse(
+        id_confirmacion=confirmacion.id_confirmacion,
+        id_envio=confirmacion.id_envio,
+        id_repartidor=confirmacion.id_repartidor,
+        lat_confirmacion=float(confirmacion.lat_confirmacion),
+        lng_confirmacion=float(confirmacion.lng_confirmacion),
+        precision_metros=float(confirmacion.precision_metros) if confirmacion.precision_metros else None,
+        nombre_receptor=confirmacion.nombre_receptor,
+        resultado_entrega=confirmacion.resultado_entrega,
+        razon_fallo=confirmacion.razon_fallo,
+        comentarios=confirmacion.comentarios,
+        registrado_en=confirmacion.registrado_en,
+        evidencia_sha256=confirmacion.evidencia_sha256,
+        evidencia_bytes=confirmacion.evidencia_bytes,
+        evidencia_mime=confirmacion.evidencia_mime,
+        miniatura_sha256=confirmacion.miniatura_sha256,
+        miniatura_bytes=confirmacion.miniatura_bytes
+    )
+
+
+def columnas_evidencia(evidencia: Optional[Tuple[str, int, str]]) -> dict:
+    """
+    Columnas de ConfirmacionEntrega para una foto ya guardada en el almacén
+    (resultado de evidencias.guardar_evidencia); todas None si no hay foto.
+    """
+    sha256, tamano, mime = evidencia or (None, None, None)
+    return {"evidencia_sha256": sha256, "evidencia_bytes": tamano, "evidencia_mime": mime}
+
+
+# ============================================================
+# CONSULTAS
+# Cada endpoint de lectura construye su SELECT aquí; los índices
+# compuestos de models.Envio están diseñados para estas formas y
+# herramientas/asesor_indices.py verifica sus planes con EXPLAIN.
+# ============================================================
+
+def consulta_mis_envios(id_repartidor: int, estatus: Optional[str] = None):
+    """Envíos del repartidor, opcionalmente filtrados por estado."""
+    query = select(Envio).where(Envio.id_repartidor == id_repartidor)
+    if estatus:
+        query = query.where(Envio.estatus_envio == estatus)
+    return query
+
+
+def consulta_pendientes(id_repartidor: int):
+    """Envíos en estado 'asignado', más recientes primero."""
+    return select(Envio).where(
+        Envio.id_repartidor == id_repartidor,
+        Envio.estatus_envio == 'asignado'
+    ).order_by(Envio.fecha_asignacion.desc())
+
+
+def consulta_en_ruta(id_repartidor: int):
+    """Envíos en estado 'en_camino', más recientes primero."""
+    return select(Envio).where(
+        Envio.id_repartidor == id_repartidor,
+        Envio.estatus_envio == 'en_camino'
+    ).order_by(Envio.fecha_asignacion.desc())
+
+
+def consulta_historial(id_repartidor: int):
+    """Envíos completados o fallidos del repartidor."""
+    return select(Envio).where(
+        Envio.id_repartidor == id_repartidor,
+        or_(
+            Envio.estatus_envio == 'completado',
+            Envio.estatus_envio == 'fallido'
+        )
+    )
+
+
+def consulta_ruta(id_repartidor: int):
+    """Envíos activos ('asignado' o 'en_camino') del repartidor."""
+    return select(Envio).where(
+        Envio.id_repartidor == id_repartidor,
+        or_(
+            Envio.estatus_envio == 'asignado',
+            Envio.estatus_envio == 'en_camino'
+        )
+    )
+
+
+def consulta_cercanos(id_repartidor: int, rangos: List[tuple], caja: tuple, estatus: Optional[str] = None):
+    """
+    Envíos del repartidor dentro de la caja (lat_min, lng_min, lat_max, lng_max).
+    Los rangos de geohash acotan la búsqueda en el índice; la caja filtra exacto.
+    """
+    lat_min, lng_min, lat_max, lng_max = caja
+    condiciones_geohash = [
+        and_(Envio.geohash_destino >= inicio, Envio.geohash_destino < fin) if fin
+        else Envio.geohash_destino >= inicio
+        for inicio, fin in rangos
+    ]
+    query = select(Envio).where(
+        Envio.id_repartidor == id_repartidor,
+        or_(*condiciones_geohash),
+        Envio.lat_destino.between(lat_min, lat_max),
+        Envio.lng_destino.between(lng_min, lng_max)
+    )
+    if estatus:
+        query = query.where(Envio.estatus_envio == estatus)
+    return query
+
+
+def consulta_envio(id_envio: int, id_repartidor: int):
+    """Un envío por ID, solo si pertenece al repartidor."""
+    return select(Envio).where(
+        Envio.id_envio == id_envio,
+        Envio.id_repartidor == id_repartidor
+    )
+
+
+def consulta_sync(id_repartidor: int, posicion: Optional[tuple]):
+    """Envíos del repartidor modificados después de (modificado_en, id_envio), en orden ascendente."""
+    query = select(Envio).where(Envio.id_repartidor == id_repartidor)
+    if posicion is not None:
+        query = query.where(filtro_posterior_a(Envio.modificado_en, Envio.id_envio, *posicion))
+    return query.order_by(Envio.modificado_en.asc(), Envio.id_envio.asc())
+
+
+def consulta_bajas(id_repartidor: int, desde: datetime):
+    """IDs dados de baja para el repartidor desde `desde`, salvo los que volvió a recibir."""
+    return select(EnvioBaja.id_envio).where(
+        EnvioBaja.id_repartidor == id_repartidor,
+        EnvioBaja.registrado_en >= desde,
+        ~exists().where(
+            Envio.id_envio == EnvioBaja.id_envio,
+            Envio.id_repartidor == id_repartidor
+        )
+    )
+
+
+def consulta_estado_lote(ids_envio: List[int], id_repartidor: int):
+    """
+    Estado y confirmación existente de varios envíos del repartidor en una
+    sola consulta. Bloquea las filas hasta el commit (dos lotes del mismo
+    repartidor no se pisan).
+    """
+    return select(
+        Envio.id_envio, Envio.estatus_envio, ConfirmacionEntrega.id_confirmacion
+    ).outerjoin(
+        ConfirmacionEntrega, ConfirmacionEntrega.id_envio == Envio.id_envio
+    ).where(
+        Envio.id_envio.in_(ids_envio),
+        Envio.id_repartidor == id_repartidor
+    ).with_for_update()
+
+
+def construir_pagina(query, columna_fecha, posicion: Optional[tuple], limite: Optional[int]):
+    """
+    Agrega a una consulta el orden keyset (columna_fecha DESC, id_envio DESC),
+    la condición para continuar después de `posicion` y el límite de página.
+    
+    Args:
+        query: select(Envio) con los filtros del endpoint.
+        columna_fecha: Columna de orden.
+        posicion: (fecha, id_envio) decodificado del cursor, o None.
+        limite: Tamaño de página (se pide una fila extra para detectar otra página).
+    """
+    if posicion is not None:
+        query = query.where(filtro_despues_de(columna_fecha, Envio.id_envio, *posicion))
+    query = query.order_by(columna_fecha.desc(), Envio.id_envio.desc())
+    if limite is not None:
+        query = query.limit(limite + 1)
+    return query
+
+
+async def paginar_envios(
+    db: AsyncSession,
+    response: Response,
+    query,
+    columna_fecha,
+    cursor: Optional[str],
+    limite: Optional[int],
+    incluir_total: bool,
+    vista: str = VistaEnvioEnum.COMPLETA.value
+) -> Response:
+    """
+    Ejecuta una consulta de envíos con paginación keyset sobre (columna_fecha, id_envio).
+    
+    - El orden es columna_fecha DESC, id_envio DESC
+    - Cada página cuesta lo mismo sin importar su profundidad (no usa OFFSET)
+    - El conteo total (COUNT) solo se calcula si se solicita
+    - Responde con el camino rápido de app/serializacion.py (forma de
+      EnvioListResponse, o EnvioResumenListResponse con vista='resumen')
+    
+    Args:
+        db: Sesión asíncrona.
+        response: Response del endpoint (sus encabezados pasan a la respuesta).
+        query: select(Envio) con los filtros del endpoint.
+        columna_fecha: Columna de orden (ej. Envio.creado_en).
+        cursor: Cursor de la página anterior (None para la primera).
+        limite: Tamaño de página (None = sin límite).
+        incluir_total: Si se calcula total_general.
+        vista: 'completa' o 'resumen'.
+    """
+    total_general = None
+    if incluir_total:
+        consulta_total = query.with_only_columns(func.count(Envio.id_envio)).order_by(None)
+        total_general = (await db.execute(consulta_total)).scalar_one()
+    
+    posicion = decodificar_cursor(cursor) if cursor else None
+    query = columnas_envio(construir_pagina(query, columna_fecha, posicion, limite), vista)
+    
+    resultado = await db.execute(query)
+    filas = resultado.all()
+    
+    siguiente_cursor = None
+    if limite is not None and len(filas) > limite:
+        filas = filas[:limite]
+        ultimo = filas[-1]
+        siguiente_cursor = codificar_cursor(getattr(ultimo, columna_fecha.key), ultimo.id_envio)
+    
+    return respuesta_rapida({
+        "total": len(filas),
+        "envios": filas_a_dicts(filas, vista),
+        "siguiente_cursor": siguiente_cursor,
+        "total_general": total_general
+    }, response)
+
+
 @router.get(
     "/mis-envios",
-    response_model=EnvioListResponse,
+    response_model=Union[EnvioListResponse, EnvioResumenListResponse],
     summary="Listar mis envíos",
     description="Obtiene la lista de envíos asignados al repartidor actual."
 )
 async def listar_mis_envios(
+    request: Request,
+    response: Response,
     estatus: Optional[str] = Query(
         None, 
         description="Filtrar por estado: asignado, en_camino, completado, fallido"
     ),
+    limite: Optional[int] = Query(
+        None, ge=1, le=200,
+        description="Tamaño de página (sin límite si se omite y no hay cursor)"
+    ),
+    cursor: Optional[str] = Query(None, description="Cursor 'siguiente_cursor' de la página anterior"),
+    incluir_total: bool = Query(False, description="Calcular total_general (consulta COUNT adicional)"),
+    vista: VistaEnvioEnum = Query(
+        VistaEnvioEnum.COMPLETA,
+        description="'resumen': solo los campos de las pantallas de lista (detalle completo en /{id_envio})"
+    ),
     usuario_actual: Repartidor = Depends(obtener_usuario_actual),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Lista todos los envíos asignados al repartidor autenticado.
     
     - Puede filtrar por estado usando el parámetro 'estatus'
     - Ordena por fecha de creación (más recientes primero)
+    - Paginación por cursor con 'limite' y 'cursor' (página de 50 si solo se envía cursor)
+    - vista=resumen devuelve EnvioResumen (sin columnas TEXT)
     """
-    # Construir query base
-    query = db.query(Envio).filter(
-        Envio.id_repartidor == usuario_actual.id_repartidor
-    )
-    
     # Aplicar filtro de estado si se especificó
     if estatus:
         # Validar que sea un estado válido
@@ -92,102 +365,406 @@ async def listar_mis_envios(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Estado inválido. Estados válidos: {', '.join(estados_validos)}"
             )
-        query = query.filter(Envio.estatus_envio == estatus.lower())
+        estatus = estatus.lower()
     
-    # Ordenar por fecha de creación descendente
-    envios = query.order_by(Envio.creado_en.desc()).all()
+    no_modificado = await respuesta_condicional(request, response, db, usuario_actual.id_repartidor)
+    if no_modificado:
+        return no_modificado
     
-    # Convertir a response
-    envios_response = [convertir_envio_a_response(e) for e in envios]
+    query = consulta_mis_envios(usuario_actual.id_repartidor, estatus)
     
-    return EnvioListResponse(
-        total=len(envios_response),
-        envios=envios_response
-    )
+    if cursor and limite is None:
+        limite = 50
+    
+    # Ordenar por fecha de creación descendente
+    return await paginar_envios(db, response, query, Envio.creado_en, cursor, limite, incluir_total, vista.value)
 
 
 @router.get(
     "/pendientes",
-    response_model=EnvioListResponse,
+    response_model=Union[EnvioListResponse, EnvioResumenListResponse],
     summary="Listar envíos pendientes",
     description="Obtiene los envíos asignados que aún no se han iniciado."
 )
 async def listar_pendientes(
+    request: Request,
+    response: Response,
+    vista: VistaEnvioEnum = Query(
+        VistaEnvioEnum.COMPLETA,
+        description="'resumen': solo los campos de las pantallas de lista (detalle completo en /{id_envio})"
+    ),
     usuario_actual: Repartidor = Depends(obtener_usuario_actual),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Lista solo los envíos en estado 'asignado' (pendientes de iniciar ruta).
     """
-    envios = db.query(Envio).filter(
-        Envio.id_repartidor == usuario_actual.id_repartidor,
-        Envio.estatus_envio == 'asignado'
-    ).order_by(Envio.fecha_asignacion.desc()).all()
+    no_modificado = await respuesta_condicional(request, response, db, usuario_actual.id_repartidor)
+    if no_modificado:
+        return no_modificado
     
-    envios_response = [convertir_envio_a_response(e) for e in envios]
+    resultado = await db.execute(columnas_envio(consulta_pendientes(usuario_actual.id_repartidor), vista.value))
+    envios = filas_a_dicts(resultado.all(), vista.value)
     
-    return EnvioListResponse(
-        total=len(envios_response),
-        envios=envios_response
-    )
+    return respuesta_rapida({
+        "total": len(envios),
+        "envios": envios,
+        "siguiente_cursor": None,
+        "total_general": None
+    }, response)
 
 
 @router.get(
     "/en-ruta",
-    response_model=EnvioListResponse,
+    response_model=Union[EnvioListResponse, EnvioResumenListResponse],
     summary="Listar envíos en ruta",
     description="Obtiene los envíos que están actualmente en camino."
 )
 async def listar_en_ruta(
+    request: Request,
+    response: Response,
+    vista: VistaEnvioEnum = Query(
+        VistaEnvioEnum.COMPLETA,
+        description="'resumen': solo los campos de las pantallas de lista (detalle completo en /{id_envio})"
+    ),
     usuario_actual: Repartidor = Depends(obtener_usuario_actual),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Lista solo los envíos en estado 'en_camino' (ruta iniciada).
     """
-    envios = db.query(Envio).filter(
-        Envio.id_repartidor == usuario_actual.id_repartidor,
-        Envio.estatus_envio == 'en_camino'
-    ).order_by(Envio.fecha_asignacion.desc()).all()
+    no_modificado = await respuesta_condicional(request, response, db, usuario_actual.id_repartidor)
+    if no_modificado:
+        return no_modificado
     
-    envios_response = [convertir_envio_a_response(e) for e in envios]
+    resultado = await db.execute(columnas_envio(consulta_en_ruta(usuario_actual.id_repartidor), vista.value))
+    envios = filas_a_dicts(resultado.all(), vista.value)
     
-    return EnvioListResponse(
-        total=len(envios_response),
-        envios=envios_response
-    )
+    return respuesta_rapida({
+        "total": len(envios),
+        "envios": envios,
+        "siguiente_cursor": None,
+        "total_general": None
+    }, response)
 
 
 @router.get(
     "/historial",
-    response_model=EnvioListResponse,
+    response_model=Union[EnvioListResponse, EnvioResumenListResponse],
     summary="Historial de entregas",
     description="Obtiene el historial de envíos completados."
 )
 async def obtener_historial(
+    request: Request,
+    response: Response,
     limite: int = Query(50, ge=1, le=200, description="Límite de resultados"),
+    cursor: Optional[str] = Query(None, description="Cursor 'siguiente_cursor' de la página anterior"),
+    incluir_total: bool = Query(False, description="Calcular total_general (consulta COUNT adicional)"),
+    vista: VistaEnvioEnum = Query(
+        VistaEnvioEnum.COMPLETA,
+        description="'resumen': solo los campos de las pantallas de lista (detalle completo en /{id_envio})"
+    ),
     usuario_actual: Repartidor = Depends(obtener_usuario_actual),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Lista los envíos completados o fallidos (historial).
     
     - Ordena por fecha de completado (más recientes primero)
-    - Límite máximo de 200 resultados
+    - Límite máximo de 200 resultados por página
+    - Para la siguiente página enviar 'cursor' = siguiente_cursor
     """
-    envios = db.query(Envio).filter(
-        Envio.id_repartidor == usuario_actual.id_repartidor,
-        or_(
-            Envio.estatus_envio == 'completado',
-            Envio.estatus_envio == 'fallido'
+    no_modificado = await respuesta_condicional(request, response, db, usuario_actual.id_repartidor)
+    if no_modificado:
+        return no_modificado
+    
+    query = consulta_historial(usuario_actual.id_repartidor)
+    
+    return await paginar_envios(db, response, query, Envio.fecha_completado, cursor, limite, incluir_total, vista.value)
+
+
+@router.get(
+    "/sync",
+    response_model=SyncEnviosResponse,
+    summary="Sincronización incremental",
+    description="Obtiene solo los envíos que cambiaron desde la última sincronización."
+)
+async def sincronizar_envios(
+    since: Optional[str] = Query(None, description="'siguiente_token' de la sincronización anterior"),
+    limite: int = Query(200, ge=1, le=500, description="Máximo de envíos por respuesta"),
+    usuario_actual: Repartidor = Depends(obtener_usuario_actual),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Sincronización incremental de los envíos del repartidor.
+    
+    - Sin 'since': devuelve todos los envíos (completo=true, reemplazar datos locales)
+    - Con 'since': solo los creados, modificados o asignados desde ese token,
+      según modificado_en
+    - 'eliminados': IDs reasignados a otro repartidor o borrados (tabla envios_bajas);
+      aplicarlos antes de 'envios'
+    - Si hay_mas=true, llamar de nuevo de inmediato con siguiente_token
+    - Un token de más de SYNC_RETENCION_BAJAS_DIAS se trata como sincronización completa
+    
+    Los últimos SYNC_MARGEN_SEGUNDOS se revisan otra vez en la siguiente
+    llamada, por lo que un envío puede llegar repetido: la app debe
+    insertar o reemplazar por id_envio.
+    """
+    id_repartidor = usuario_actual.id_repartidor
+    ahora = (await db.execute(select(func.now()))).scalar_one()
+    corte = ahora - timedelta(seconds=SYNC_MARGEN_SEGUNDOS)
+    
+    posicion = None
+    desde_bajas = corte
+    if since:
+        fecha, id_envio, desde_bajas = decodificar_token_sync(since)
+        posicion = (fecha, id_envio)
+        if desde_bajas < ahora - timedelta(days=SYNC_RETENCION_BAJAS_DIAS):
+            posicion = None
+            desde_bajas = corte
+    completo = posicion is None
+    
+    resultado = await db.execute(columnas_envio(consulta_sync(id_repartidor, posicion)).limit(limite + 1))
+    envios = resultado.all()
+    
+    hay_mas = len(envios) > limite
+    if hay_mas:
+        envios = envios[:limite]
+        ultimo = envios[-1]
+        # Mientras haya páginas, las bajas se siguen buscando desde el token original
+        siguiente_token = codificar_token_sync(
+            ultimo.modificado_en or datetime.min, ultimo.id_envio, desde_bajas
         )
-    ).order_by(Envio.fecha_completado.desc()).limit(limite).all()
+    else:
+        if envios:
+            fecha, id_envio = envios[-1].modificado_en or datetime.min, envios[-1].id_envio
+        elif posicion is not None:
+            fecha, id_envio = posicion
+        else:
+            fecha, id_envio = corte, 0
+        # No avanzar más allá del corte: lo reciente se revisa otra vez
+        if fecha > corte:
+            fecha, id_envio = corte, 0
+        siguiente_token = codificar_token_sync(fecha, id_envio, corte)
     
-    envios_response = [convertir_envio_a_response(e) for e in envios]
+    eliminados = []
+    if not completo and not hay_mas:
+        resultado = await db.execute(consulta_bajas(id_repartidor, desde_bajas))
+        eliminados = sorted(set(resultado.scalars().all()))
     
-    return EnvioListResponse(
-        total=len(envios_response),
-        envios=envios_response
+    return respuesta_rapida({
+        "envios": filas_a_dicts(envios),
+        "eliminados": eliminados,
+        "siguiente_token": siguiente_token,
+        "hay_mas": hay_mas,
+        "completo": completo
+    })
+
+
+@router.get(
+    "/cercanos",
+    response_model=EnviosCercanosResponse,
+    summary="Envíos cercanos",
+    description="Obtiene los envíos del repartidor dentro de un radio o de una caja geográfica."
+)
+async def listar_cercanos(
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Latitud del punto de búsqueda"),
+    lng: Optional[float] = Query(None, ge=-180, le=180, description="Longitud del punto de búsqueda"),
+    radio_metros: float = Query(500, gt=0, le=50000, description="Radio alrededor de (lat, lng)"),
+    lat_min: Optional[float] = Query(None, ge=-90, le=90, description="Caja: latitud mínima"),
+    lng_min: Optional[float] = Query(None, ge=-180, le=180, description="Caja: longitud mínima"),
+    lat_max: Optional[float] = Query(None, ge=-90, le=90, description="Caja: latitud máxima"),
+    lng_max: Optional[float] = Query(None, ge=-180, le=180, description="Caja: longitud máxima"),
+    estatus: Optional[str] = Query(
+        None,
+        description="Filtrar por estado: asignado, en_camino, completado, fallido"
+    ),
+    limite: int = Query(50, ge=1, le=200, description="Límite de resultados"),
+    usuario_actual: Repartidor = Depends(obtener_usuario_actual),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Busca envíos por ubicación del destino usando el índice geohash.
+    
+    - Radio: enviar lat, lng y radio_metros (500 por defecto)
+    - Caja: enviar lat_min, lng_min, lat_max y lng_max; si además se envía
+      lat/lng, los resultados se ordenan por distancia a ese punto
+    - Los envíos sin coordenadas nunca aparecen
+    """
+    caja_completa = None not in (lat_min, lng_min, lat_max, lng_max)
+    centro = (lat, lng) if lat is not None and lng is not None else None
+    
+    if caja_completa:
+        if lat_min > lat_max or lng_min > lng_max:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Caja inválida: los mínimos deben ser menores o iguales a los máximos"
+            )
+        caja = (lat_min, lng_min, lat_max, lng_max)
+    elif centro is not None:
+        caja = caja_para_radio(lat, lng, radio_metros)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Enviar lat y lng, o la caja completa (lat_min, lng_min, lat_max, lng_max)"
+        )
+    
+    if estatus:
+        estados_validos = ['asignado', 'en_camino', 'completado', 'fallido']
+        if estatus.lower() not in estados_validos:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Estado inválido. Estados válidos: {', '.join(estados_validos)}"
+            )
+        estatus = estatus.lower()
+    
+    rangos = rangos_para_celdas(celdas_para_caja(caja))
+    resultado = await db.execute(consulta_cercanos(usuario_actual.id_repartidor, rangos, caja, estatus))
+    envios = resultado.scalars().all()
+    
+    if centro is None:
+        encontrados = [(None, e) for e in sorted(envios, key=lambda e: e.id_envio)]
+    else:
+        encontrados = sorted(
+            ((distancia_metros(lat, lng, float(e.lat_destino), float(e.lng_destino)), e) for e in envios),
+            key=lambda par: (par[0], par[1].id_envio)
+        )
+        if not caja_completa:
+            encontrados = [par for par in encontrados if par[0] <= radio_metros]
+    
+    pagina = encontrados[:limite]
+    return EnviosCercanosResponse(
+        total=len(pagina),
+        envios=[
+            EnvioCercano(
+                envio=convertir_envio_a_response(e),
+                distancia_metros=round(distancia, 1) if distancia is not None else None
+            )
+            for distancia, e in pagina
+        ],
+        hay_mas=len(encontrados) > limite
+    )
+
+
+@router.get(
+    "/ruta-optimizada",
+    response_model=RutaOptimizadaResponse,
+    summary="Ruta optimizada",
+    description="Sugiere el orden de visita de los envíos activos a partir de la posición actual.",
+    responses={503: {"model": ErrorResponse, "description": "Servidor ocupado calculando rutas"}}
+)
+async def obtener_ruta_optimizada(
+    lat: float = Query(..., ge=-90, le=90, description="Latitud actual del repartidor"),
+    lng: float = Query(..., ge=-180, le=180, description="Longitud actual del repartidor"),
+    presupuesto_ms: Optional[int] = Query(
+        None, ge=0, le=2000, description="Tiempo máximo de optimización (por defecto RUTAS_PRESUPUESTO_MS)"
+    ),
+    usuario_actual: Repartidor = Depends(obtener_usuario_actual),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Ordena los envíos 'asignado' y 'en_camino' del repartidor para
+    recorrerlos con la menor distancia.
+    
+    - Ruta abierta: parte de (lat, lng) y termina en la última parada
+    - Vecino más cercano + mejoras 2-opt / Or-opt hasta agotar presupuesto_ms
+    - Distancias en línea recta (haversine), no por calles
+    - Los envíos sin coordenadas se devuelven aparte en 'sin_coordenadas'
+    """
+    resultado = await db.execute(consulta_ruta(usuario_actual.id_repartidor))
+    envios = sorted(resultado.scalars().all(), key=lambda e: e.id_envio)
+    con_coordenadas = [e for e in envios if e.lat_destino is not None and e.lng_destino is not None]
+    sin_coordenadas = [
+        convertir_envio_a_response(e) for e in envios if e.lat_destino is None or e.lng_destino is None
+    ]
+    destinos = [(float(e.lat_destino), float(e.lng_destino)) for e in con_coordenadas]
+    respuestas = [convertir_envio_a_response(e) for e in con_coordenadas]
+    # El cálculo no necesita la BD: liberar la conexión antes de ocupar CPU
+    await db.close()
+    
+    try:
+        ruta = await pool_rutas.ejecutar(
+            optimizar_ruta, (lat, lng), destinos,
+            RUTAS_PRESUPUESTO_MS if presupuesto_ms is None else presupuesto_ms
+        )
+    except PoolSaturadoError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado calculando rutas. Intente nuevamente.",
+            headers={"Retry-After": "2"}
+        )
+    
+    paradas = []
+    acumulada = 0.0
+    for posicion, (indice, tramo) in enumerate(zip(ruta["orden"], ruta["tramos_metros"]), start=1):
+        acumulada += tramo
+        paradas.append(ParadaRuta(
+            orden=posicion,
+            envio=respuestas[indice],
+            distancia_tramo_metros=round(tramo, 1),
+            distancia_acumulada_metros=round(acumulada, 1)
+        ))
+    
+    return RutaOptimizadaResponse(
+        total=len(paradas),
+        paradas=paradas,
+        sin_coordenadas=sin_coordenadas,
+        distancia_total_metros=round(ruta["distancia_total_metros"], 1),
+        distancia_inicial_metros=round(ruta["distancia_inicial_metros"], 1),
+        tiempo_calculo_ms=round(ruta["tiempo_ms"], 2),
+        completa=ruta["completa"]
+    )
+
+
+@router.get(
+    "/stream",
+    response_class=StreamingResponse,
+    summary="Eventos de envíos en vivo",
+    description="Canal Server-Sent Events con los cambios de estado de los envíos del repartidor.",
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "Flujo de eventos"},
+        503: {"model": ErrorResponse, "description": "Límite de conexiones de este servidor"},
+    }
+)
+async def stream_envios(
+    usuario_actual: Repartidor = Depends(obtener_usuario_actual),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Abre un flujo text/event-stream que reemplaza el polling de /mis-envios.
+    
+    - 'envios_actualizados': {"envios": [{"id_envio", "estatus_envio"}]}
+    - 'resincronizar': se perdieron eventos (conexión lenta); llamar a /sync
+    - Comentarios ': ping' cada STREAM_HEARTBEAT_SEGUNDOS
+    - El servidor cierra la conexión tras STREAM_DURACION_MAX_SEGUNDOS; el
+      cliente debe reconectar y, como los eventos no se guardan, llamar
+      a /sync después de cada reconexión
+    """
+    if broker_eventos.conexiones >= EVENTOS_MAX_CONEXIONES:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiadas conexiones de eventos. Intente nuevamente.",
+            headers={"Retry-After": "10"}
+        )
+    canal = canal_repartidor(usuario_actual.id_repartidor)
+    # La conexión puede durar horas: no retener la sesión de BD de la autenticación
+    await db.close()
+    
+    async def generar_eventos():
+        suscripcion = broker_eventos.suscribir(canal)
+        try:
+            yield f"retry: {STREAM_REINTENTO_MS}\n\n"
+            limite = asyncio.get_running_loop().time() + STREAM_DURACION_MAX_SEGUNDOS
+            while asyncio.get_running_loop().time() < limite:
+                evento = await suscripcion.siguiente(STREAM_HEARTBEAT_SEGUNDOS)
+                yield formatear_sse(evento) if evento is not None else ": ping\n\n"
+        finally:
+            broker_eventos.cancelar(suscripcion)
+    
+    return StreamingResponse(
+        generar_eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
@@ -199,18 +776,22 @@ async def obtener_historial(
 )
 async def obtener_envio(
     id_envio: int,
+    request: Request,
+    response: Response,
     usuario_actual: Repartidor = Depends(obtener_usuario_actual),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtiene el detalle de un envío por su ID.
     
     - Solo puede ver envíos asignados al usuario actual
     """
-    envio = db.query(Envio).filter(
-        Envio.id_envio == id_envio,
-        Envio.id_repartidor == usuario_actual.id_repartidor
-    ).first()
+    no_modificado = await respuesta_condicional(request, response, db, usuario_actual.id_repartidor)
+    if no_modificado:
+        return no_modificado
+    
+    resultado = await db.execute(consulta_envio(id_envio, usuario_actual.id_repartidor))
+    envio = resultado.scalars().first()
     
     if not envio:
         raise HTTPException(
@@ -231,7 +812,8 @@ async def iniciar_ruta(
     id_envio: int,
     datos: Optional[IniciarRutaRequest] = None,
     usuario_actual: Repartidor = Depends(obtener_usuario_actual),
-    db: Session = Depends(get_db)
+    idempotencia: ControlIdempotencia = Depends(control_idempotencia),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Inicia la ruta de entrega de un envío.
@@ -239,12 +821,14 @@ async def iniciar_ruta(
     - Cambia el estado de 'asignado' a 'en_camino'
     - Solo funciona si el envío está en estado 'asignado'
     - Registra la fecha de inicio
+    - Acepta el encabezado Idempotency-Key para reintentos seguros
     """
+    if idempotencia.respuesta_previa:
+        return idempotencia.respuesta_previa
+    
     # Buscar el envío
-    envio = db.query(Envio).filter(
-        Envio.id_envio == id_envio,
-        Envio.id_repartidor == usuario_actual.id_repartidor
-    ).first()
+    resultado = await db.execute(consulta_envio(id_envio, usuario_actual.id_repartidor))
+    envio = resultado.scalars().first()
     
     if not envio:
         raise HTTPException(
@@ -264,13 +848,16 @@ async def iniciar_ruta(
     if datos and datos.observaciones:
         envio.observaciones = datos.observaciones
     
-    db.commit()
-    db.refresh(envio)
+    await db.commit()
+    await publicar_cambios_envios(usuario_actual.id_repartidor, [(id_envio, 'en_camino')])
+    await db.refresh(envio)
     
-    return IniciarRutaResponse(
+    respuesta = IniciarRutaResponse(
         mensaje="Ruta iniciada correctamente",
         envio=convertir_envio_a_response(envio)
     )
+    await idempotencia.completar(respuesta)
+    return respuesta
 
 
 @router.post(
@@ -282,8 +869,10 @@ async def iniciar_ruta(
 async def registrar_entrega(
     id_envio: int,
     datos: ConfirmacionEntregaRequest,
+    tareas: BackgroundTasks,
     usuario_actual: Repartidor = Depends(obtener_usuario_actual),
-    db: Session = Depends(get_db)
+    idempotencia: ControlIdempotencia = Depends(control_idempotencia),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Registra la confirmación de entrega de un paquete.
@@ -293,17 +882,34 @@ async def registrar_entrega(
     - Foto de evidencia (Base64)
     
     **Proceso:**
-    1. Valida que el envío exista y esté en ruta
-    2. Crea el registro de confirmación con GPS y foto
-    3. Actualiza el estado del envío a 'completado'
+    1. Valida la foto (Base64 inválido → 400) y que el envío exista y esté en ruta
+    2. Guarda la foto decodificada en el almacén de evidencias
+    3. Crea el registro de confirmación con GPS y el hash de la foto
+       (la fila nunca guarda el Base64)
+    4. Actualiza el estado del envío a 'completado'
+    5. Después de responder, optimiza la foto y genera su miniatura
+    
+    Con el encabezado Idempotency-Key, un reintento devuelve la respuesta
+    original sin volver a consultar los envíos.
     
     **IMPORTANTE:** Esta es la funcionalidad principal del sistema.
     """
+    if idempotencia.respuesta_previa:
+        return idempotencia.respuesta_previa
+    
+    # Validar la foto antes de registrar nada
+    foto = None
+    if datos.imagen_evidencia:
+        try:
+            foto = validar_evidencia_base64(datos.imagen_evidencia)
+        except EvidenciaDemasiadoGrandeError as e:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+        except EvidenciaInvalidaError as e:
+            raise HTTPException(status_code=e.codigo, detail=str(e))
+    
     # Buscar el envío
-    envio = db.query(Envio).filter(
-        Envio.id_envio == id_envio,
-        Envio.id_repartidor == usuario_actual.id_repartidor
-    ).first()
+    resultado = await db.execute(consulta_envio(id_envio, usuario_actual.id_repartidor))
+    envio = resultado.scalars().first()
     
     if not envio:
         raise HTTPException(
@@ -319,9 +925,10 @@ async def registrar_entrega(
         )
     
     # Verificar que no exista ya una confirmación
-    confirmacion_existente = db.query(ConfirmacionEntrega).filter(
-        ConfirmacionEntrega.id_envio == id_envio
-    ).first()
+    resultado = await db.execute(
+        select(ConfirmacionEntrega).where(ConfirmacionEntrega.id_envio == id_envio)
+    )
+    confirmacion_existente = resultado.scalars().first()
     
     if confirmacion_existente:
         raise HTTPException(
@@ -329,6 +936,9 @@ async def registrar_entrega(
             detail="Este envío ya tiene una confirmación de entrega registrada"
         )
     
+    # La foto va al almacén antes del commit: la fila solo guarda su hash
+    evidencia = await asyncio.to_thread(guardar_evidencia, foto) if foto else None
+    
     # Crear la confirmación de entrega
     confirmacion = ConfirmacionEntrega(
         id_envio=id_envio,
@@ -336,11 +946,11 @@ async def registrar_entrega(
         lat_confirmacion=datos.lat_confirmacion,
         lng_confirmacion=datos.lng_confirmacion,
         precision_metros=datos.precision_metros,
-        imagen_evidencia=datos.imagen_evidencia,
         nombre_receptor=datos.nombre_receptor,
         resultado_entrega=datos.resultado_entrega.value,
         razon_fallo=datos.razon_fallo,
-        comentarios=datos.comentarios
+        comentarios=datos.comentarios,
+        **columnas_evidencia(evidencia)
     )
     
     db.add(confirmacion)
@@ -353,30 +963,368 @@ async def registrar_entrega(
     
     envio.fecha_completado = datetime.utcnow()
     
-    db.commit()
-    db.refresh(confirmacion)
-    db.refresh(envio)
+    try:
+        await db.commit()
+    except Exception:
+        # Sin confirmación la foto guardada queda sin usar
+        if evidencia:
+            liberar_evidencias(evidencia[0])
+        raise
+    await publicar_cambios_envios(usuario_actual.id_repartidor, [(id_envio, envio.estatus_envio)])
+    await db.refresh(confirmacion)
+    await db.refresh(envio)
+    
+    # Optimizar la foto fuera del camino de la solicitud
+    if evidencia:
+        tareas.add_task(procesar_imagen, confirmacion.id_confirmacion, evidencia[0])
     
     # Construir respuesta
-    confirmacion_response = ConfirmacionEntregaResponse(
-        id_confirmacion=confirmacion.id_confirmacion,
-        id_envio=confirmacion.id_envio,
-        id_repartidor=confirmacion.id_repartidor,
-        lat_confirmacion=float(confirmacion.lat_confirmacion),
-        lng_confirmacion=float(confirmacion.lng_confirmacion),
-        precision_metros=float(confirmacion.precision_metros) if confirmacion.precision_metros else None,
-        nombre_receptor=confirmacion.nombre_receptor,
-        resultado_entrega=confirmacion.resultado_entrega,
-        razon_fallo=confirmacion.razon_fallo,
-        comentarios=confirmacion.comentarios,
-        registrado_en=confirmacion.registrado_en
-    )
+    confirmacion_response = convertir_confirmacion_a_response(confirmacion)
     
-    return RegistrarEntregaResponse(
+    respuesta = RegistrarEntregaResponse(
         mensaje="Entrega registrada exitosamente",
         confirmacion=confirmacion_response,
         envio=convertir_envio_a_response(envio)
     )
+    await idempotencia.completar(respuesta)
+    return respuesta
+
+
+@router.post(
+    "/{id_envio}/evidencia",
+    response_model=ConfirmacionEntregaResponse,
+    summary="Subir foto de evidencia",
+    description="Sube la foto de una entrega ya registrada como multipart/form-data o binario.",
+    responses={
+        409: {"model": ErrorResponse, "description": "La entrega aún no está registrada"},
+        413: {"model": ErrorResponse, "description": "Foto demasiado grande"},
+        415: {"model": ErrorResponse, "description": "Formato no soportado"},
+    }
+)
+async def subir_evidencia(
+    id_envio: int,
+    request: Request,
+    tareas: BackgroundTasks,
+    usuario_actual: Repartidor = Depends(obtener_usuario_actual),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Sube la foto de evidencia de una entrega.
+    
+    **Formatos aceptados:**
+    - multipart/form-data con el archivo en el campo 'imagen'
+    - Binario crudo con Content-Type image/* o application/octet-stream
+    
+    **Proceso:**
+    1. Valida que el envío tenga confirmación (registrada sin 'imagen_evidencia')
+    2. Escribe la foto a disco por bloques mientras llega, calculando su SHA-256
+    3. Asocia hash, tamaño y tipo MIME a la confirmación
+    4. Después de responder, optimiza la foto y genera su miniatura
+    
+    Reintentar con la misma foto es seguro: el almacén no la duplica. Si
+    reemplaza otra foto, la anterior y su miniatura se borran del almacén
+    cuando ya nadie las referencia.
+    """
+    resultado = await db.execute(
+        select(ConfirmacionEntrega.id_confirmacion).where(
+            ConfirmacionEntrega.id_envio == id_envio,
+            ConfirmacionEntrega.id_repartidor == usuario_actual.id_repartidor
+        )
+    )
+    id_confirmacion = resultado.scalar_one_or_none()
+    
+    if id_confirmacion is None:
+        resultado = await db.execute(consulta_envio(id_envio, usuario_actual.id_repartidor))
+        if resultado.scalars().first() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Envío no encontrado o no tienes acceso a él"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Primero registra la entrega con /confirmar-entrega"
+        )
+    
+    # Rechazar antes de leer el cuerpo si el tamaño declarado ya excede el límite
+    # (margen de 64 KB para los encabezados de multipart)
+    longitud = request.headers.get("content-length")
+    if longitud and longitud.isdigit() and int(longitud) > EVIDENCIAS_MAX_BYTES + 64 * 1024:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"La foto supera el máximo de {EVIDENCIAS_MAX_BYTES} bytes"
+        )
+    
+    # Liberar la conexión a la BD mientras llega la foto (en 3G puede tardar)
+    await db.close()
+    
+    try:
+        sha256, tamano, mime = await recibir_evidencia(
+            request.stream(), request.headers.get("content-type", "")
+        )
+    except EvidenciaDemasiadoGrandeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except EvidenciaInvalidaError as e:
+        raise HTTPException(status_code=e.codigo, detail=str(e))
+    
+    # Foto y miniatura anteriores, con la fila bloqueada hasta el commit
+    anteriores = (await db.execute(
+        select(ConfirmacionEntrega.evidencia_sha256, ConfirmacionEntrega.miniatura_sha256)
+        .where(ConfirmacionEntrega.id_confirmacion == id_confirmacion)
+        .with_for_update()
+    )).one()
+    await db.execute(
+        update(ConfirmacionEntrega)
+        .where(ConfirmacionEntrega.id_confirmacion == id_confirmacion)
+        .values(
+            evidencia_sha256=sha256,
+            evidencia_bytes=tamano,
+            evidencia_mime=mime,
+            miniatura_sha256=None,
+            miniatura_bytes=None,
+            imagen_evidencia=None
+        )
+    )
+    await db.commit()
+    liberar_evidencias(*anteriores)
+    
+    tareas.add_task(procesar_imagen, id_confirmacion, sha256)
+    
+    confirmacion = await db.get(ConfirmacionEntrega, id_confirmacion)
+    return convertir_confirmacion_a_response(confirmacion)
+
+
+@router.get(
+    "/{id_envio}/evidencia/miniatura",
+    summary="Miniatura de la evidencia",
+    description="Devuelve la miniatura JPEG de la foto de entrega.",
+    response_class=Response,
+    responses={200: {"content": {MIME_PROCESADO: {}}}}
+)
+async def obtener_miniatura(
+    id_envio: int,
+    usuario_actual: Repartidor = Depends(obtener_usuario_actual),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Sirve la miniatura de la foto de evidencia de un envío.
+    
+    - Pensada para el historial: pesa unos KB en lugar de la foto completa
+    - 404 si la entrega no tiene foto, la miniatura aún se está generando
+      o su archivo ya no está en el almacén
+    - El contenido no cambia para un mismo hash, así que se puede cachear
+    """
+    resultado = await db.execute(
+        select(ConfirmacionEntrega.miniatura_sha256).where(
+            ConfirmacionEntrega.id_envio == id_envio,
+            ConfirmacionEntrega.id_repartidor == usuario_actual.id_repartidor
+        )
+    )
+    sha256 = resultado.scalar_one_or_none()
+    
+    if not sha256:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Este envío no tiene miniatura de evidencia"
+        )
+    
+    encabezados = {
+        "ETag": f'"{sha256}"',
+        "Cache-Control": "private, max-age=31536000, immutable"
+    }
+    try:
+        if isinstance(almacen_evidencias, AlmacenLocal):
+            ruta = almacen_evidencias.ruta(sha256)
+            if not await asyncio.to_thread(os.path.isfile, ruta):
+                raise FileNotFoundError(ruta)
+            return FileResponse(ruta, media_type=MIME_PROCESADO, headers=encabezados)
+        contenido = await asyncio.to_thread(almacen_evidencias.leer, sha256)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="La miniatura de evidencia ya no está disponible"
+        )
+    return Response(content=contenido, media_type=MIME_PROCESADO, headers=encabezados)
+
+
+@router.post(
+    "/confirmar-entregas/lote",
+    response_model=ConfirmacionLoteResponse,
+    summary="Registrar entregas en lote",
+    description="Registra varias entregas acumuladas sin conexión en una sola transacción."
+)
+async def registrar_entregas_lote(
+    datos: ConfirmacionLoteRequest,
+    tareas: BackgroundTasks,
+    usuario_actual: Repartidor = Depends(obtener_usuario_actual),
+    idempotencia: ControlIdempotencia = Depends(control_idempotencia),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Registra hasta 100 entregas de una vez (reenvío de la cola offline).
+    
+    **Proceso:**
+    1. Valida todos los envíos con una sola consulta IN (bloqueando sus filas)
+    2. Inserta las confirmaciones válidas en bloque
+    3. Actualiza el estado de los envíos con un UPDATE por resultado
+    4. Confirma todo en una sola transacción
+    
+    Cada entrega tiene su propio resultado: las inválidas (incluida una
+    foto Base64 inválida, codigo=400) no impiden registrar las demás. Las
+    fotos de las entregas válidas se guardan en el almacén antes del commit
+    (las filas solo llevan el hash) y se optimizan después de responder.
+    Una entrega ya registrada responde codigo=409
+    junto con la confirmación existente, así que reenviar un lote es seguro.
+    Con Idempotency-Key el reenvío devuelve la respuesta original directamente.
+    """
+    if idempotencia.respuesta_previa:
+        return idempotencia.respuesta_previa
+    
+    id_repartidor = usuario_actual.id_repartidor
+    items = datos.confirmaciones
+    
+    # Fotos decodificadas por índice; las inválidas rechazan solo su entrega
+    fotos = {}
+    fotos_invalidas = {}
+    for indice, item in enumerate(items):
+        if item.imagen_evidencia:
+            try:
+                fotos[indice] = validar_evidencia_base64(item.imagen_evidencia)
+            except (EvidenciaInvalidaError, EvidenciaDemasiadoGrandeError) as e:
+                fotos_invalidas[indice] = str(e)
+    
+    # Fotos ya guardadas en el almacén por índice: (sha256, bytes, mime)
+    guardadas = {}
+    
+    # Un registro concurrente del mismo envío puede ganar la carrera entre la
+    # validación y el INSERT (id_envio es UNIQUE): en ese caso se valida otra vez
+    for intento in range(2):
+        resultado = await db.execute(
+            consulta_estado_lote([item.id_envio for item in items], id_repartidor)
+        )
+        estados = {fila.id_envio: fila for fila in resultado.all()}
+        
+        resultados = {}
+        validos = []
+        vistos = set()
+        for indice, item in enumerate(items):
+            estado = estados.get(item.id_envio)
+            if item.id_envio in vistos:
+                resultados[indice] = (400, "Envío repetido en el lote")
+            elif estado is None:
+                resultados[indice] = (404, "Envío no encontrado o no tienes acceso a él")
+            elif estado.id_confirmacion is not None:
+                resultados[indice] = (409, "Este envío ya tiene una confirmación de entrega registrada")
+            elif estado.estatus_envio not in ['en_camino', 'asignado']:
+                resultados[indice] = (400, f"No se puede registrar entrega. Estado actual: {estado.estatus_envio}")
+            elif indice in fotos_invalidas:
+                resultados[indice] = (400, fotos_invalidas[indice])
+            else:
+                resultados[indice] = (201, None)
+                validos.append((indice, item))
+            vistos.add(item.id_envio)
+        
+        if not validos:
+            break
+        
+        # Al almacén antes del commit: las filas solo guardan el hash
+        for indice, _ in validos:
+            if indice in fotos and indice not in guardadas:
+                guardadas[indice] = await asyncio.to_thread(guardar_evidencia, fotos[indice])
+        
+        ahora = datetime.utcnow()
+        try:
+            await db.execute(insert(ConfirmacionEntrega), [
+                {
+                    "id_envio": item.id_envio,
+                    "id_repartidor": id_repartidor,
+                    "lat_confirmacion": item.lat_confirmacion,
+                    "lng_confirmacion": item.lng_confirmacion,
+                    "precision_metros": item.precision_metros,
+                    "nombre_receptor": item.nombre_receptor,
+                    "resultado_entrega": item.resultado_entrega.value,
+                    "razon_fallo": item.razon_fallo,
+                    "comentarios": item.comentarios,
+                    **columnas_evidencia(guardadas.get(indice)),
+                }
+                for indice, item in validos
+            ])
+            for estatus, exitosa in (('completado', True), ('fallido', False)):
+                ids = [
+                    item.id_envio for _, item in validos
+                    if (item.resultado_entrega.value == 'exitosa') == exitosa
+                ]
+                if ids:
+                    await db.execute(
+                        update(Envio)
+                        .where(Envio.id_envio.in_(ids))
+                        .values(estatus_envio=estatus, fecha_completado=ahora)
+                    )
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            if intento == 1:
+                liberar_evidencias(*[sha256 for sha256, _, _ in guardadas.values()])
+                raise
+            continue
+        except Exception:
+            liberar_evidencias(*[sha256 for sha256, _, _ in guardadas.values()])
+            raise
+        
+        await publicar_cambios_envios(id_repartidor, [
+            (item.id_envio, 'completado' if item.resultado_entrega.value == 'exitosa' else 'fallido')
+            for _, item in validos
+        ])
+        break
+    
+    # Confirmaciones creadas y existentes (para los 409), en una consulta
+    ids_respuesta = [
+        item.id_envio for indice, item in enumerate(items)
+        if resultados[indice][0] in (201, 409)
+    ]
+    confirmaciones = {}
+    if ids_respuesta:
+        resultado = await db.execute(
+            select(ConfirmacionEntrega).where(ConfirmacionEntrega.id_envio.in_(ids_respuesta))
+        )
+        confirmaciones = {c.id_envio: c for c in resultado.scalars().all()}
+    
+    # Fotos guardadas de entregas que al reintentar dejaron de ser válidas
+    indices_validos = {indice for indice, _ in validos}
+    liberar_evidencias(*[
+        sha256 for indice, (sha256, _, _) in guardadas.items() if indice not in indices_validos
+    ])
+    
+    # Optimizar las fotos fuera del camino de la solicitud
+    for indice, item in validos:
+        if indice in guardadas and item.id_envio in confirmaciones:
+            tareas.add_task(
+                procesar_imagen,
+                confirmaciones[item.id_envio].id_confirmacion,
+                guardadas[indice][0]
+            )
+    
+    respuesta = []
+    for indice, item in enumerate(items):
+        codigo, detalle = resultados[indice]
+        confirmacion = confirmaciones.get(item.id_envio) if codigo in (201, 409) else None
+        respuesta.append(ResultadoLoteItem(
+            id_envio=item.id_envio,
+            exito=codigo == 201,
+            codigo=codigo,
+            detalle=detalle,
+            confirmacion=convertir_confirmacion_a_response(confirmacion) if confirmacion else None
+        ))
+    
+    exitosas = sum(1 for r in respuesta if r.exito)
+    respuesta_lote = ConfirmacionLoteResponse(
+        mensaje=f"{exitosas} de {len(respuesta)} entregas registradas",
+        total=len(respuesta),
+        exitosas=exitosas,
+        fallidas=len(respuesta) - exitosas,
+        resultados=respuesta
+    )
+    await idempotencia.completar(respuesta_lote)
+    return respuesta_lote
 
 
 @router.get(
@@ -388,7 +1336,7 @@ async def registrar_entrega(
 async def obtener_confirmacion(
     id_envio: int,
     usuario_actual: Repartidor = Depends(obtener_usuario_actual),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtiene la confirmación de entrega de un envío.
@@ -396,10 +1344,8 @@ async def obtener_confirmacion(
     Útil para ver los detalles de entregas anteriores.
     """
     # Verificar acceso al envío
-    envio = db.query(Envio).filter(
-        Envio.id_envio == id_envio,
-        Envio.id_repartidor == usuario_actual.id_repartidor
-    ).first()
+    resultado = await db.execute(consulta_envio(id_envio, usuario_actual.id_repartidor))
+    envio = resultado.scalars().first()
     
     if not envio:
         raise HTTPException(
@@ -408,9 +1354,10 @@ async def obtener_confirmacion(
         )
     
     # Buscar confirmación
-    confirmacion = db.query(ConfirmacionEntrega).filter(
-        ConfirmacionEntrega.id_envio == id_envio
-    ).first()
+    resultado = await db.execute(
+        select(ConfirmacionEntrega).where(ConfirmacionEntrega.id_envio == id_envio)
+    )
+    confirmacion = resultado.scalars().first()
     
     if not confirmacion:
         raise HTTPException(
@@ -418,16 +1365,4 @@ async def obtener_confirmacion(
             detail="Este envío no tiene confirmación de entrega"
         )
     
-    return ConfirmacionEntregaResponse(
-        id_confirmacion=confirmacion.id_confirmacion,
-        id_envio=confirmacion.id_envio,
-        id_repartidor=confirmacion.id_repartidor,
-        lat_confirmacion=float(confirmacion.lat_confirmacion),
-        lng_confirmacion=float(confirmacion.lng_confirmacion),
-        precision_metros=float(confirmacion.precision_metros) if confirmacion.precision_metros else None,
-        nombre_receptor=confirmacion.nombre_receptor,
-        resultado_entrega=confirmacion.resultado_entrega,
-        razon_fallo=confirmacion.razon_fallo,
-        comentarios=confirmacion.comentarios,
-        registrado_en=confirmacion.registrado_en
-    )
+    return convertir_confirmacion_a_response(confirmacion)
@@ -0,0 +1,145 @@
+# ============================================================
+# PQEXPRESS - Router de Métricas
+# Endpoints: estadísticas internas del servicio
+# ============================================================
+"""
+Todos los endpoints exigen el encabezado X-Metricas-Token (METRICAS_TOKEN,
+ver app/security.py); sin configurarlo responden 403.
+"""
+
+from fastapi import APIRouter, Depends
+
+from ..cache import cache_sesiones
+from ..compresion import metricas_compresion
+from ..database import engine, async_engine, metricas_pool_sync, metricas_pool_async
+from ..eventos import broker_eventos
+from ..imagenes import pool_imagenes
+from ..perfil_sql import historial_perfiles
+from ..pool_hash import pool_hash
+from ..rastreo import buffer_rastreo
+from ..rutas import pool_rutas
+from ..security import verificar_token_metricas
+
+# Crear router con prefijo y tags
+router = APIRouter(
+    prefix="/metricas",
+    tags=["Métricas"],
+    dependencies=[Depends(verificar_token_metricas)]
+)
+
+
+@router.get(
+    "/sesiones",
+    summary="Métricas de caché de sesiones",
+    description="Aciertos, fallos y ocupación de la caché de sesiones autenticadas."
+)
+async def metricas_sesiones():
+    """
+    Retorna los contadores de la caché de sesiones de este proceso.
+    """
+    return cache_sesiones.estadisticas()
+
+
+@router.get(
+    "/hash",
+    summary="Métricas del pool de hash",
+    description="Profundidad de cola, operaciones en curso y tiempos del pool de bcrypt."
+)
+async def metricas_hash():
+    """
+    Retorna el estado del pool que ejecuta bcrypt para login.
+    """
+    return pool_hash.estadisticas()
+
+
+@router.get(
+    "/imagenes",
+    summary="Métricas del pool de imágenes",
+    description="Profundidad de cola y tiempos del pool que optimiza fotos de evidencia."
+)
+async def metricas_imagenes():
+    """
+    Retorna el estado del pool que recomprime fotos y genera miniaturas.
+    """
+    return pool_imagenes.estadisticas()
+
+
+@router.get(
+    "/rutas",
+    summary="Métricas del pool de rutas",
+    description="Profundidad de cola y tiempos del pool que calcula rutas optimizadas."
+)
+async def metricas_rutas():
+    """
+    Retorna el estado del pool que ejecuta la optimización de rutas.
+    """
+    return pool_rutas.estadisticas()
+
+
+@router.get(
+    "/rastreo",
+    summary="Métricas de ingesta de rastreo",
+    description="Puntos GPS pendientes, escritos, rechazados y duración del último lote."
+)
+async def metricas_rastreo():
+    """
+    Retorna los contadores del buffer de puntos GPS de este proceso.
+    """
+    return buffer_rastreo.estadisticas()
+
+
+@router.get(
+    "/eventos",
+    summary="Métricas de eventos en vivo",
+    description="Conexiones abiertas de /envios/stream, eventos publicados, entregados y desbordes."
+)
+async def metricas_eventos():
+    """
+    Retorna los contadores del broker de eventos de este proceso.
+    """
+    return broker_eventos.estadisticas()
+
+
+@router.get(
+    "/perfil-sql",
+    summary="Perfiles de consultas SQL",
+    description="Sentencias, tiempos y repeticiones (N+1) de las últimas solicitudes. Requiere PERFIL_SQL_HABILITADO=true."
+)
+async def metricas_perfil_sql():
+    """
+    Retorna los perfiles SQL recientes de este proceso (vacío si el perfilador está deshabilitado).
+    """
+    return historial_perfiles.estadisticas()
+
+
+@router.get(
+    "/compresion",
+    summary="Métricas de compresión de respuestas",
+    description="Respuestas comprimidas por codificación, bytes ahorrados, tiempo de CPU y caché de cuerpos comprimidos."
+)
+async def metricas_compresion_respuestas():
+    """
+    Retorna los contadores de compresión de este proceso.
+    
+    Una proporción cercana a 1 o un tiempo promedio alto indican que
+    conviene subir COMPRESION_MIN_BYTES o bajar el nivel.
+    """
+    return metricas_compresion.estadisticas()
+
+
+@router.get(
+    "/pool",
+    summary="Métricas del pool de conexiones",
+    description="Espera y latencia de checkout, overflow y rotación de conexiones de cada motor."
+)
+async def metricas_pool():
+    """
+    Retorna las métricas de los pools de conexiones síncrono y asíncrono.
+    
+    Una espera alta con saturación cercana a 1 indica falta de conexiones
+    en el pool; una latencia alta con espera baja apunta a MySQL.
+    """
+    return {
+        "async": metricas_pool_async.estadisticas(async_engine.sync_engine),
+        "sync": metricas_pool_sync.estadisticas(engine),
+    }
@@ -0,0 +1,48 @@
+# ============================================================
+# PQEXPRESS - Router de Rastreo GPS
+# Endpoints: ingesta de puntos GPS por lotes
+# ============================================================
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from ..models import Repartidor
+from ..rastreo import buffer_rastreo
+from ..schemas import LotePuntosRequest, LotePuntosResponse, ErrorResponse
+from ..security import obtener_usuario_actual
+
+# Crear router con prefijo y tags
+router = APIRouter(
+    prefix="/rastreo",
+    tags=["Rastreo"],
+    responses={
+        401: {"model": ErrorResponse, "description": "No autorizado"},
+    }
+)
+
+
+@router.post(
+    "/puntos",
+    response_model=LotePuntosResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Enviar puntos GPS",
+    description="Recibe un lote de posiciones del repartidor; se guardan en segundo plano.",
+    responses={503: {"model": ErrorResponse, "description": "Demasiados puntos pendientes de escribir"}}
+)
+async def recibir_puntos(
+    lote: LotePuntosRequest,
+    usuario_actual: Repartidor = Depends(obtener_usuario_actual)
+):
+    """
+    Encola los puntos GPS del repartidor autenticado.
+    
+    - Máximo 500 puntos por solicitud; la app debe acumularlos y enviarlos juntos
+    - 202: los puntos se escriben por lotes (RASTREO_LOTE_MAX / RASTREO_INTERVALO_MS)
+    - 503: la escritura va atrasada; reintentar el mismo lote más tarde
+    """
+    if not buffer_rastreo.agregar(usuario_actual.id_repartidor, lote.puntos):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado guardando rastreo. Intente nuevamente.",
+            headers={"Retry-After": "5"}
+        )
+    return LotePuntosResponse(aceptados=len(lote.puntos))
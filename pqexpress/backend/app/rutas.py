@@ -0,0 +1,220 @@
+# ============================================================
+# PQEXPRESS - Optimización de Rutas
+# Orden de visita de varias paradas: vecino más cercano + 2-opt / Or-opt
+# ============================================================
+"""
+Heurística para el problema del viajante con ruta abierta: el repartidor
+sale de su posición actual y no necesita volver. Las distancias son de
+círculo máximo (haversine), suficientes para decidir el orden; la ruta
+vial de cada tramo la sigue calculando la app.
+
+Para tratar la ruta abierta como un ciclo se agrega un nodo "fin" a
+distancia 0 de todos: la ruta siempre es [origen, ..., fin] y las
+mejoras nunca mueven esos dos extremos.
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+import os
+import time
+
+import numpy as np
+
+from .geo import RADIO_TIERRA_METROS
+from .pool_hash import PoolHash
+
+# Cargar variables de entorno
+load_dotenv()
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+# Tiempo máximo de mejora por solicitud (la respuesta siempre incluye al menos el vecino más cercano)
+RUTAS_PRESUPUESTO_MS = int(os.getenv("RUTAS_PRESUPUESTO_MS", "200"))
+# Hilos para optimizar rutas (NumPy libera el GIL en las operaciones de arreglos)
+RUTAS_POOL_WORKERS = int(os.getenv("RUTAS_POOL_WORKERS", "2"))
+RUTAS_POOL_MAX_COLA = int(os.getenv("RUTAS_POOL_MAX_COLA", "32"))
+
+# Mejoras menores a esto se ignoran (evita ciclos por redondeo)
+_EPSILON_METROS = 1e-6
+
+
+def matriz_haversine(lat: Sequence[float], lng: Sequence[float]) -> np.ndarray:
+    """
+    Distancias de círculo máximo entre todos los pares de puntos.
+
+    Returns:
+        np.ndarray: Matriz n x n en metros.
+    """
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    lng_rad = np.radians(np.asarray(lng, dtype=np.float64))
+    dlat = lat_rad[:, None] - lat_rad[None, :]
+    dlng = lng_rad[:, None] - lng_rad[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_rad)[:, None] * np.cos(lat_rad)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * RADIO_TIERRA_METROS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def longitud_ruta(ruta: np.ndarray, dist: np.ndarray) -> float:
+    """Suma de las distancias de los tramos consecutivos de la ruta."""
+    return float(dist[ruta[:-1], ruta[1:]].sum())
+
+
+def vecino_mas_cercano(dist: np.ndarray) -> np.ndarray:
+    """
+    Ruta inicial: desde el origen (nodo 0), ir siempre a la parada más
+    cercana no visitada. El último nodo de `dist` es el nodo fin.
+    """
+    n = dist.shape[0]
+    fin = n - 1
+    visitado = np.zeros(n, dtype=bool)
+    visitado[0] = visitado[fin] = True
+    ruta = [0]
+    actual = 0
+    for _ in range(n - 2):
+        candidatos = np.where(visitado, np.inf, dist[actual])
+        actual = int(np.argmin(candidatos))
+        visitado[actual] = True
+        ruta.append(actual)
+    ruta.append(fin)
+    return np.asarray(ruta, dtype=np.int64)
+
+
+def mejorar_dos_opt(ruta: np.ndarray, dist: np.ndarray, limite: float) -> Tuple[np.ndarray, int]:
+    """
+    2-opt con mejor mejora: invierte el tramo que más acorta la ruta,
+    evaluando todos los pares de aristas a la vez con NumPy.
+
+    Returns:
+        tuple: (ruta mejorada, movimientos aplicados)
+    """
+    movimientos = 0
+    m = len(ruta) - 1  # número de aristas
+    if m < 3:
+        return ruta, 0
+    # Pares de aristas (i, j) con j >= i + 2
+    validos = np.triu(np.ones((m, m), dtype=bool), k=2)
+    while time.perf_counter() < limite:
+        a, b = ruta[:-1], ruta[1:]
+        actual = dist[a, b]
+        delta = (
+            dist[a[:, None], a[None, :]] + dist[b[:, None], b[None, :]]
+            - actual[:, None] - actual[None, :]
+        )
+        delta = np.where(validos, delta, 0.0)
+        mejor = int(np.argmin(delta))
+        i, j = divmod(mejor, m)
+        if delta[i, j] >= -_EPSILON_METROS:
+            break
+        ruta = np.concatenate([ruta[:i + 1], ruta[i + 1:j + 1][::-1], ruta[j + 1:]])
+        movimientos += 1
+    return ruta, movimientos
+
+
+def mejorar_or_opt(ruta: np.ndarray, dist: np.ndarray, limite: float) -> Tuple[np.ndarray, int]:
+    """
+    Or-opt: mueve tramos de 1 a 3 paradas (opcionalmente invertidos) a la
+    posición donde más acortan la ruta. Para cada tramo se evalúan todas
+    las posiciones de inserción a la vez.
+
+    Returns:
+        tuple: (ruta mejorada, movimientos aplicados)
+    """
+    movimientos = 0
+    mejoro = True
+    while mejoro and time.perf_counter() < limite:
+        mejoro = False
+        for largo in (1, 2, 3):
+            inicio = 1
+            # Las paradas van de la posición 1 a len-2 (0 es el origen, la última el fin)
+            while inicio + largo <= len(ruta) - 1:
+                if time.perf_counter() >= limite:
+                    return ruta, movimientos
+                tramo = ruta[inicio:inicio + largo]
+                previo, siguiente = ruta[inicio - 1], ruta[inicio + largo]
+                ganancia = (
+                    dist[previo, tramo[0]] + dist[tramo[-1], siguiente] - dist[previo, siguiente]
+                )
+                resto = np.concatenate([ruta[:inicio], ruta[inicio + largo:]])
+                x, y = resto[:-1], resto[1:]
+                base = dist[x, y]
+                costo_directo = dist[x, tramo[0]] + dist[tramo[-1], y] - base
+                costo_invertido = dist[x, tramo[-1]] + dist[tramo[0], y] - base
+                costos = np.minimum(costo_directo, costo_invertido)
+                posicion = int(np.argmin(costos))
+                if costos[posicion] < ganancia - _EPSILON_METROS:
+                    if costo_invertido[posicion] < costo_directo[posicion]:
+                        tramo = tramo[::-1]
+                    ruta = np.concatenate([resto[:posicion + 1], tramo, resto[posicion + 1:]])
+                    movimientos += 1
+                    mejoro = True
+                else:
+                    inicio += 1
+    return ruta, movimientos
+
+
+def optimizar_ruta(
+    origen: Tuple[float, float],
+    destinos: Sequence[Tuple[float, float]],
+    presupuesto_ms: Optional[int] = None
+) -> Dict:
+    """
+    Calcula el orden de visita de los destinos partiendo del origen.
+
+    Args:
+        origen: (lat, lng) del repartidor.
+        destinos: Lista de (lat, lng).
+        presupuesto_ms: Tiempo máximo para las mejoras 2-opt / Or-opt.
+
+    Returns:
+        dict: orden (índices de `destinos`), tramos_metros, distancia_total_metros,
+        distancia_inicial_metros (vecino más cercano), movimientos, tiempo_ms
+        y completa (False si se agotó el presupuesto antes de converger).
+    """
+    inicio = time.perf_counter()
+    if presupuesto_ms is None:
+        presupuesto_ms = RUTAS_PRESUPUESTO_MS
+    limite = inicio + presupuesto_ms / 1000
+    n = len(destinos)
+    if n == 0:
+        return {
+            "orden": [], "tramos_metros": [], "distancia_total_metros": 0.0,
+            "distancia_inicial_metros": 0.0, "movimientos": 0, "tiempo_ms": 0.0, "completa": True,
+        }
+
+    puntos = np.asarray([origen, *destinos], dtype=np.float64)
+    dist = np.zeros((n + 2, n + 2))
+    dist[:n + 1, :n + 1] = matriz_haversine(puntos[:, 0], puntos[:, 1])
+
+    ruta = vecino_mas_cercano(dist)
+    distancia_inicial = longitud_ruta(ruta, dist)
+
+    movimientos = 0
+    completa = False
+    while time.perf_counter() < limite:
+        ruta, hechos_2opt = mejorar_dos_opt(ruta, dist, limite)
+        ruta, hechos_oropt = mejorar_or_opt(ruta, dist, limite)
+        movimientos += hechos_2opt + hechos_oropt
+        if hechos_oropt == 0 and time.perf_counter() < limite:
+            completa = True
+            break
+
+    paradas = ruta[1:-1]
+    tramos = dist[ruta[:-2], ruta[1:-1]]
+    return {
+        "orden": [int(nodo) - 1 for nodo in paradas],
+        "tramos_metros": [float(t) for t in tramos],
+        "distancia_total_metros": longitud_ruta(ruta, dist),
+        "distancia_inicial_metros": distancia_inicial,
+        "movimientos": movimientos,
+        "tiempo_ms": (time.perf_counter() - inicio) * 1000,
+        "completa": completa,
+    }
+
+
+# Pool compartido por las solicitudes de /envios/ruta-optimizada
+pool_rutas = PoolHash(
+    max_workers=RUTAS_POOL_WORKERS,
+    max_cola=RUTAS_POOL_MAX_COLA,
+    nombre="rutas"
+)
@@ -0,0 +1,204 @@
+# ============================================================
+# PQEXPRESS - Verificaciones de Salud
+# Liveness y readiness para el balanceador (GET /health/live y /health/ready)
+# ============================================================
+"""
+- live: el proceso y su event loop responden. No toca la BD; si falla,
+  el orquestador debe reiniciar el worker.
+- ready: el worker puede atender tráfico. Falla (503) si la BD no
+  responde a tiempo o si el pool de conexiones asíncrono está agotado,
+  para que el balanceador deje de enviarle solicitudes que solo harían
+  cola esperando DB_POOL_TIMEOUT.
+
+El ping a la BD se cachea SALUD_CACHE_SEGUNDOS y las verificaciones
+simultáneas comparten el mismo ping, así que sondear con frecuencia no
+agrega carga a la BD. El estado de los pools se lee en cada llamada
+(es solo leer contadores).
+"""
+
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from sqlalchemy import text
+import asyncio
+import os
+import time
+
+from .database import async_engine, engine, metricas_pool_async, metricas_pool_sync
+from .eventos import EVENTOS_MAX_CONEXIONES, broker_eventos
+from .imagenes import pool_imagenes
+from .pool_hash import pool_hash
+from .rastreo import buffer_rastreo
+from .rutas import pool_rutas
+
+# Cargar variables de entorno
+load_dotenv()
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+
+# Segundos que se reutiliza el resultado del ping a la BD
+SALUD_CACHE_SEGUNDOS = float(os.getenv("SALUD_CACHE_SEGUNDOS", "2"))
+# Tiempo máximo del ping (por debajo del timeout del sondeo del balanceador)
+SALUD_TIMEOUT_BD_SEGUNDOS = float(os.getenv("SALUD_TIMEOUT_BD_SEGUNDOS", "1"))
+# Fracción de conexiones prestadas a partir de la cual el worker deja de estar listo
+SALUD_SATURACION_MAX = float(os.getenv("SALUD_SATURACION_MAX", "1.0"))
+
+OK = "ok"
+DEGRADADO = "degradado"
+ERROR = "error"
+
+
+class VerificadorBD:
+    """
+    Ping a la BD con caché y acotado en tiempo. Las llamadas que llegan
+    mientras hay un ping en curso esperan ese mismo ping.
+    """
+
+    def __init__(self, cache_segundos: float, timeout_segundos: float):
+        self.cache_segundos = cache_segundos
+        self.timeout_segundos = timeout_segundos
+        self._resultado: Optional[Dict[str, Any]] = None
+        self._verificado_en = 0.0
+        self._en_curso: Optional[asyncio.Task] = None
+
+    async def verificar(self) -> Dict[str, Any]:
+        """
+        Returns:
+            dict: estado ('ok' o 'error'), latencia_ms, error (si falló)
+            y edad_segundos del resultado.
+        """
+        ahora = time.monotonic()
+        if self._resultado is not None and ahora - self._verificado_en < self.cache_segundos:
+            return {**self._resultado, "edad_segundos": round(ahora - self._verificado_en, 3)}
+
+        loop = asyncio.get_running_loop()
+        if self._en_curso is None or self._en_curso.done() or self._en_curso.get_loop() is not loop:
+            self._en_curso = loop.create_task(self._ping())
+        # shield: si el sondeo se cancela, el ping compartido sigue para los demás
+        resultado = await asyncio.shield(self._en_curso)
+        return {**resultado, "edad_segundos": 0.0}
+
+    async def _ping(self) -> Dict[str, Any]:
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._consultar(), timeout=self.timeout_segundos)
+            resultado = {"estado": OK, "latencia_ms": round((time.perf_counter() - inicio) * 1000, 2)}
+        except asyncio.TimeoutError:
+            resultado = {"estado": ERROR, "error": f"sin respuesta en {self.timeout_segundos:g} s"}
+        except Exception as e:
+            resultado = {"estado": ERROR, "error": type(e).__name__}
+        self._resultado = resultado
+        self._verificado_en = time.monotonic()
+        return resultado
+
+    @staticmethod
+    async def _consultar() -> None:
+        async with async_engine.connect() as conexion:
+            await conexion.execute(text("SELECT 1"))
+
+
+# Instancia global usada por estado_readiness
+verificador_bd = VerificadorBD(SALUD_CACHE_SEGUNDOS, SALUD_TIMEOUT_BD_SEGUNDOS)
+
+
+def estado_pool_bd(estadisticas: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Resume la ocupación de un pool de conexiones a partir de MetricasPool.estadisticas().
+    """
+    if "prestadas" not in estadisticas:
+        # Pools sin límite (NullPool, StaticPool): nunca se agotan
+        return {"estado": OK, "clase_pool": estadisticas.get("clase_pool")}
+    sin_limite = estadisticas["max_overflow"] < 0
+    capacidad = estadisticas["tamano"] + max(estadisticas["max_overflow"], 0)
+    agotado = not sin_limite and capacidad > 0 and estadisticas["prestadas"] >= capacidad * SALUD_SATURACION_MAX
+    return {
+        "estado": ERROR if agotado else OK,
+        "prestadas": estadisticas["prestadas"],
+        "capacidad": None if sin_limite else capacidad,
+        "saturacion": estadisticas["saturacion"],
+        "timeouts": estadisticas["timeouts"],
+    }
+
+
+def _estado_pool_hilos(estadisticas: Dict[str, Any]) -> Dict[str, Any]:
+    lleno = estadisticas["en_cola"] >= estadisticas["max_cola"]
+    return {
+        "estado": DEGRADADO if lleno else OK,
+        "en_cola": estadisticas["en_cola"],
+        "max_cola": estadisticas["max_cola"],
+    }
+
+
+def estado_dependencias() -> Dict[str, Dict[str, Any]]:
+    """
+    Estado de los componentes que, saturados, hacen fallar solo algunos
+    endpoints (con 503 propio). Se reportan como degradados sin sacar al
+    worker del balanceador.
+    """
+    rastreo = buffer_rastreo.estadisticas()
+    eventos = broker_eventos.estadisticas()
+    return {
+        "pool_bd_sync": estado_pool_bd(metricas_pool_sync.estadisticas(engine)),
+        "pool_hash": _estado_pool_hilos(pool_hash.estadisticas()),
+        "pool_imagenes": _estado_pool_hilos(pool_imagenes.estadisticas()),
+        "pool_rutas": _estado_pool_hilos(pool_rutas.estadisticas()),
+        "buffer_rastreo": {
+            "estado": DEGRADADO if rastreo["pendientes"] >= buffer_rastreo.pendientes_max else OK,
+            "pendientes": rastreo["pendientes"],
+            "errores": rastreo["errores"],
+        },
+        "eventos": {
+            "estado": DEGRADADO if eventos["conexiones"] >= EVENTOS_MAX_CONEXIONES else OK,
+            "backend": eventos["backend"],
+            "conexiones": eventos["conexiones"],
+        },
+    }
+
+
+async def estado_readiness() -> Dict[str, Any]:
+    """
+    Evalúa si el worker puede recibir tráfico.
+
+    Returns:
+        dict: listo (bool), estado ('listo', 'degradado' o 'no_listo'),
+        base_datos, pool_bd y dependencias.
+    """
+    pool_bd = estado_pool_bd(metricas_pool_async.estadisticas(async_engine.sync_engine))
+    if pool_bd["estado"] == ERROR:
+        # Con el pool agotado el ping también haría cola: no se intenta
+        base_datos = {"estado": ERROR, "error": "pool de conexiones agotado"}
+    else:
+        base_datos = await verificador_bd.verificar()
+
+    dependencias = estado_dependencias()
+    listo = base_datos["estado"] == OK and pool_bd["estado"] == OK
+    if not listo:
+        estado = "no_listo"
+    elif any(dependencia["estado"] != OK for dependencia in dependencias.values()):
+        estado = "degradado"
+    else:
+        estado = "listo"
+    return {
+        "listo": listo,
+        "estado": estado,
+        "base_datos": base_datos,
+        "pool_bd": pool_bd,
+        "dependencias": dependencias,
+    }
+
+
+def resumen_publico(resultado: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Versión de estado_readiness() para quien sondea sin METRICAS_TOKEN:
+    solo el estado de cada componente, sin contadores de pools ni errores.
+    """
+    return {
+        "listo": resultado["listo"],
+        "estado": resultado["estado"],
+        "componentes": {
+            "base_datos": resultado["base_datos"]["estado"],
+            "pool_bd": resultado["pool_bd"]["estado"],
+            **{nombre: dependencia["estado"] for nombre, dependencia in resultado["dependencias"].items()},
+        },
+    }
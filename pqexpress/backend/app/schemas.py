@@ -5,7 +5,7 @@
 
 from pydantic import BaseModel, Field, EmailStr, validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 
 
@@ -21,6 +21,12 @@ class EstatusEnvioEnum(str, Enum):
     FALLIDO = "fallido"
 
 
+class VistaEnvioEnum(str, Enum):
+    """Representación de los envíos en los listados."""
+    COMPLETA = "completa"
+    RESUMEN = "resumen"
+
+
 class ResultadoEntregaEnum(str, Enum):
     """Resultados posibles de una entrega."""
     EXITOSA = "exitosa"
@@ -176,8 +182,60 @@ class EnvioResponse(BaseModel):
 
 class EnvioListResponse(BaseModel):
     """Schema para lista de envíos."""
-    total: int = Field(..., description="Total de envíos")
+    total: int = Field(..., description="Total de envíos en esta respuesta")
     envios: List[EnvioResponse] = Field(..., description="Lista de envíos")
+    siguiente_cursor: Optional[str] = Field(None, description="Cursor opaco para la siguiente página (None si no hay más)")
+    total_general: Optional[int] = Field(None, description="Total de envíos que cumplen el filtro (solo con incluir_total=true)")
+
+
+class EnvioResumen(BaseModel):
+    """
+    Schema reducido de envío para listados (vista=resumen).
+    Sin teléfono, referencias ni observaciones: el detalle completo
+    está en GET /envios/{id_envio}.
+    """
+    id_envio: int
+    numero_guia: str
+    receptor_nombre: str
+    calle: str
+    direccion_completa: str
+    lat_destino: Optional[float] = None
+    lng_destino: Optional[float] = None
+    estatus_envio: str
+    fecha_asignacion: Optional[datetime] = None
+    fecha_completado: Optional[datetime] = None
+    creado_en: Optional[datetime] = None
+    modificado_en: Optional[datetime] = None
+
+
+class EnvioResumenListResponse(BaseModel):
+    """Schema para lista de envíos con vista=resumen."""
+    total: int = Field(..., description="Total de envíos en esta respuesta")
+    envios: List[EnvioResumen] = Field(..., description="Lista de envíos (representación reducida)")
+    siguiente_cursor: Optional[str] = Field(None, description="Cursor opaco para la siguiente página (None si no hay más)")
+    total_general: Optional[int] = Field(None, description="Total de envíos que cumplen el filtro (solo con incluir_total=true)")
+
+
+class EnvioCercano(BaseModel):
+    """Schema de un envío encontrado por cercanía."""
+    envio: EnvioResponse
+    distancia_metros: Optional[float] = Field(None, description="Distancia en línea recta al punto de búsqueda (si se envió lat/lng)")
+
+
+class EnviosCercanosResponse(BaseModel):
+    """Schema para envíos dentro de un radio o caja."""
+    total: int = Field(..., description="Total de envíos en esta respuesta")
+    envios: List[EnvioCercano] = Field(..., description="Más cercanos primero (o por ID si no hay punto de búsqueda)")
+    hay_mas: bool = Field(..., description="True si había más envíos en la zona que 'limite'")
+
+
+class SyncEnviosResponse(BaseModel):
+    """Schema para sincronización incremental de envíos."""
+    envios: List[EnvioResponse] = Field(..., description="Envíos creados, modificados o asignados desde el token")
+    eliminados: List[int] = Field(..., description="IDs de envíos que ya no pertenecen al repartidor")
+    siguiente_token: str = Field(..., description="Enviar como 'since' en la próxima sincronización")
+    hay_mas: bool = Field(..., description="Si es true, volver a llamar de inmediato con siguiente_token")
+    completo: bool = Field(..., description="True si fue sincronización completa (reemplazar datos locales)")
 
 
 class IniciarRutaRequest(BaseModel):
@@ -191,6 +249,25 @@ class IniciarRutaResponse(BaseModel):
     envio: EnvioResponse
 
 
+class ParadaRuta(BaseModel):
+    """Schema de una parada de la ruta optimizada."""
+    orden: int = Field(..., description="Posición de visita, empezando en 1")
+    envio: EnvioResponse
+    distancia_tramo_metros: float = Field(..., description="Distancia en línea recta desde la parada anterior")
+    distancia_acumulada_metros: float = Field(..., description="Distancia en línea recta desde el origen")
+
+
+class RutaOptimizadaResponse(BaseModel):
+    """Schema para el orden de visita sugerido de los envíos activos."""
+    total: int = Field(..., description="Número de paradas con coordenadas")
+    paradas: List[ParadaRuta]
+    sin_coordenadas: List[EnvioResponse] = Field(..., description="Envíos activos sin lat/lng de destino (no ordenados)")
+    distancia_total_metros: float
+    distancia_inicial_metros: float = Field(..., description="Distancia con el orden de vecino más cercano, antes de mejorar")
+    tiempo_calculo_ms: float
+    completa: bool = Field(..., description="False si la mejora se detuvo por el límite de tiempo")
+
+
 # ============================================================
 # SCHEMAS DE CONFIRMACIÓN DE ENTREGA
 # ============================================================
@@ -200,7 +277,7 @@ class ConfirmacionEntregaRequest(BaseModel):
     lat_confirmacion: float = Field(..., ge=-90, le=90, description="Latitud GPS de la entrega")
     lng_confirmacion: float = Field(..., ge=-180, le=180, description="Longitud GPS de la entrega")
     precision_metros: Optional[float] = Field(None, ge=0, description="Precisión del GPS en metros")
-    imagen_evidencia: Optional[str] = Field(None, description="Foto de evidencia en Base64")
+    imagen_evidencia: Optional[str] = Field(None, description="Foto de evidencia en Base64 (preferir POST /envios/{id}/evidencia)")
     nombre_receptor: Optional[str] = Field(None, max_length=120, description="Nombre de quien recibió")
     resultado_entrega: ResultadoEntregaEnum = Field(
         default=ResultadoEntregaEnum.EXITOSA, 
@@ -236,6 +313,11 @@ class ConfirmacionEntregaResponse(BaseModel):
     razon_fallo: Optional[str] = None
     comentarios: Optional[str] = None
     registrado_en: Optional[datetime] = None
+    evidencia_sha256: Optional[str] = Field(None, description="SHA-256 de la foto (None mientras se procesa)")
+    evidencia_bytes: Optional[int] = None
+    evidencia_mime: Optional[str] = None
+    miniatura_sha256: Optional[str] = Field(None, description="Disponible en GET /envios/{id}/evidencia/miniatura")
+    miniatura_bytes: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -255,6 +337,87 @@ class RegistrarEntregaResponse(BaseModel):
     envio: EnvioResponse
 
 
+class ConfirmacionLoteItem(ConfirmacionEntregaRequest):
+    """Schema para una entrega dentro de un lote (incluye el envío)."""
+    id_envio: int = Field(..., description="Envío que se confirma")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "id_envio": 12,
+                "lat_confirmacion": 19.4326,
+                "lng_confirmacion": -99.1332,
+                "nombre_receptor": "Juan Pérez",
+                "resultado_entrega": "exitosa"
+            }
+        }
+
+
+class ConfirmacionLoteRequest(BaseModel):
+    """Schema para registrar varias entregas acumuladas sin conexión."""
+    confirmaciones: List[ConfirmacionLoteItem] = Field(
+        ..., min_length=1, max_length=100,
+        description="Entregas a registrar (máximo 100)"
+    )
+
+
+class ResultadoLoteItem(BaseModel):
+    """Resultado de una entrega del lote."""
+    id_envio: int
+    exito: bool = Field(..., description="True si la entrega quedó registrada en este lote")
+    codigo: int = Field(..., description="Código HTTP equivalente: 201, 400, 404 o 409 (ya registrada)")
+    detalle: Optional[str] = None
+    confirmacion: Optional[ConfirmacionEntregaResponse] = Field(
+        None, description="Confirmación creada, o la existente si ya estaba registrada"
+    )
+
+
+class ConfirmacionLoteResponse(BaseModel):
+    """Schema para respuesta de registro de entregas en lote."""
+    mensaje: str
+    total: int
+    exitosas: int
+    fallidas: int
+    resultados: List[ResultadoLoteItem] = Field(..., description="Un resultado por entrega, en el orden recibido")
+
+
+# ============================================================
+# SCHEMAS DE RASTREO GPS
+# ============================================================
+
+# Puntos guardados sin conexión hasta una semana; un reloj adelantado, pocos minutos
+RASTREO_ANTIGUEDAD_MAXIMA = timedelta(days=7)
+RASTREO_ADELANTO_MAXIMO = timedelta(minutes=10)
+
+
+class PuntoRastreoItem(BaseModel):
+    """Schema de un punto GPS capturado por la app."""
+    lat: float = Field(..., ge=-90, le=90)
+    lng: float = Field(..., ge=-180, le=180)
+    precision_metros: Optional[float] = Field(None, ge=0, description="Precisión del GPS en metros")
+    velocidad: Optional[float] = Field(None, ge=0, description="Velocidad en m/s")
+    capturado_en: datetime = Field(..., description="Hora del dispositivo al obtener la posición")
+    
+    @validator('capturado_en')
+    def validar_capturado_en(cls, v):
+        """Rechaza fechas absurdas (reloj del dispositivo mal configurado) antes de llegar a la BD."""
+        fecha = v.astimezone(timezone.utc).replace(tzinfo=None) if v.tzinfo is not None else v
+        ahora = datetime.utcnow()
+        if not ahora - RASTREO_ANTIGUEDAD_MAXIMA <= fecha <= ahora + RASTREO_ADELANTO_MAXIMO:
+            raise ValueError("capturado_en fuera de rango (máximo 7 días atrás y 10 minutos adelante)")
+        return v
+
+
+class LotePuntosRequest(BaseModel):
+    """Schema para enviar varios puntos GPS en una sola solicitud."""
+    puntos: List[PuntoRastreoItem] = Field(..., min_length=1, max_length=500)
+
+
+class LotePuntosResponse(BaseModel):
+    """Schema para respuesta de ingesta de puntos GPS."""
+    aceptados: int = Field(..., description="Puntos recibidos; se escriben en segundo plano")
+
+
 # ============================================================
 # SCHEMAS DE ERROR
 # ============================================================
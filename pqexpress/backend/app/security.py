@@ -2,18 +2,31 @@
 # PQEXPRESS - Módulo de Seguridad
 # Manejo de JWT, bcrypt y validación de sesiones
 # ============================================================
+"""
+Las sesiones validadas se guardan en cache_sesiones (app/cache.py).
+Logout, un nuevo login y desactivar_repartidor invalidan la caché de
+inmediato, pero solo en el proceso que los atiende: con varios workers
+de uvicorn, los demás siguen aceptando el token revocado hasta que
+expire su entrada (SESSION_CACHE_TTL_SEGUNDOS, 60 s por defecto).
+"""
 
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from fastapi.security import APIKeyHeader, HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
+import hashlib
+import hmac
+import uuid
 import os
 
-from .database import get_db
+from .cache import cache_sesiones
+from .pool_hash import pool_hash, PoolSaturadoError
+from .database import get_async_db
 from .models import Repartidor, TokenSesion
 
 # Cargar variables de entorno
@@ -28,9 +41,17 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "clave_secreta_por_defecto_cambiar"
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_EXPIRATION_MINUTES = int(os.getenv("JWT_EXPIRATION_MINUTES", "480"))  # 8 horas
 
+# Token de operación para /metrics y /api/metricas/* (encabezado
+# X-Metricas-Token o Authorization: Bearer). Sin configurar, las métricas no se exponen.
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN", "")
+
 # Esquema de seguridad HTTP Bearer para JWT
 security = HTTPBearer()
 
+# Esquemas del token de métricas (Prometheus solo sabe enviar Authorization)
+security_metricas = APIKeyHeader(name="X-Metricas-Token", auto_error=False)
+security_metricas_bearer = HTTPBearer(auto_error=False)
+
 
 # ============================================================
 # FUNCIONES DE HASH DE CONTRASEÑAS
@@ -80,6 +101,41 @@ def verificar_clave(clave_plana: str, clave_hash: str) -> bool:
         return False
 
 
+async def _ejecutar_en_pool_hash(funcion, *args):
+    """
+    Ejecuta una operación bcrypt en el pool dedicado.
+    Si la cola está llena responde 503 para que el cliente reintente.
+    """
+    try:
+        return await pool_hash.ejecutar(funcion, *args)
+    except PoolSaturadoError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado procesando inicios de sesión. Intente nuevamente.",
+            headers={"Retry-After": "2"},
+        )
+
+
+async def hashear_clave_async(clave: str) -> str:
+    """
+    Versión asíncrona de hashear_clave.
+    Calcula el hash en el pool de hash sin bloquear el event loop.
+    """
+    return await _ejecutar_en_pool_hash(hashear_clave, clave)
+
+
+async def verificar_clave_async(clave_plana: str, clave_hash: str) -> bool:
+    """
+    Versión asíncrona de verificar_clave.
+    bcrypt tarda ~250ms con 12 rondas; ejecutarlo en el pool evita que un
+    pico de inicios de sesión detenga al resto de la API.
+    
+    Raises:
+        HTTPException: 503 si la cola del pool de hash está llena.
+    """
+    return await _ejecutar_en_pool_hash(verificar_clave, clave_plana, clave_hash)
+
+
 # ============================================================
 # FUNCIONES DE JWT
 # ============================================================
@@ -106,8 +162,9 @@ def crear_token_acceso(datos: dict, minutos_expiracion: Optional[int] = None) ->
         minutos_expiracion = JWT_EXPIRATION_MINUTES
     expiracion = datetime.utcnow() + timedelta(minutes=minutos_expiracion)
     
-    # Agregar claim de expiración
-    a_codificar.update({"exp": expiracion})
+    # Agregar claim de expiración e identificador único (jti)
+    # El jti garantiza que dos tokens emitidos en el mismo segundo sean distintos
+    a_codificar.update({"exp": expiracion, "jti": uuid.uuid4().hex})
     
     # Generar token
     token_jwt = jwt.encode(a_codificar, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
@@ -138,11 +195,26 @@ def decodificar_token(token: str) -> Optional[dict]:
         return None
 
 
+def calcular_hash_token(token: str) -> str:
+    """
+    Calcula el hash SHA-256 (hexadecimal) de un token JWT.
+    Se guarda en tokens_sesion.token_hash (índice único) y se usa como
+    clave de la caché de sesiones.
+    
+    Args:
+        token: Token JWT.
+        
+    Returns:
+        str: Hash de 64 caracteres hexadecimales.
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
 # ============================================================
 # FUNCIONES DE SESIÓN
 # ============================================================
 
-def invalidar_sesiones_anteriores(db: Session, id_repartidor: int) -> int:
+async def invalidar_sesiones_anteriores(db: AsyncSession, id_repartidor: int) -> int:
     """
     Invalida todas las sesiones activas anteriores de un repartidor.
     Esto garantiza que solo haya una sesión activa por usuario.
@@ -154,16 +226,21 @@ def invalidar_sesiones_anteriores(db: Session, id_repartidor: int) -> int:
     Returns:
         int: Número de sesiones invalidadas.
     """
-    resultado = db.query(TokenSesion).filter(
-        TokenSesion.id_repartidor == id_repartidor,
-        TokenSesion.token_activo == True
-    ).update({"token_activo": False})
-    db.commit()
-    return resultado
+    resultado = await db.execute(
+        update(TokenSesion)
+        .where(
+            TokenSesion.id_repartidor == id_repartidor,
+            TokenSesion.token_activo == True
+        )
+        .values(token_activo=False)
+    )
+    await db.commit()
+    cache_sesiones.invalidar_repartidor(id_repartidor)
+    return resultado.rowcount
 
 
-def crear_sesion(
-    db: Session, 
+async def crear_sesion(
+    db: AsyncSession, 
     id_repartidor: int, 
     token: str, 
     expiracion: datetime,
@@ -187,18 +264,19 @@ def crear_sesion(
     nueva_sesion = TokenSesion(
         id_repartidor=id_repartidor,
         jwt_token=token,
+        token_hash=calcular_hash_token(token),
         info_dispositivo=dispositivo,
         direccion_ip=ip,
         expira_en=expiracion,
         token_activo=True
     )
     db.add(nueva_sesion)
-    db.commit()
-    db.refresh(nueva_sesion)
+    await db.commit()
+    await db.refresh(nueva_sesion)
     return nueva_sesion
 
 
-def validar_sesion_activa(db: Session, token: str) -> Optional[TokenSesion]:
+async def validar_sesion_activa(db: AsyncSession, token: str) -> Optional[TokenSesion]:
     """
     Verifica que un token tenga una sesión activa en la base de datos.
     
@@ -209,15 +287,17 @@ def validar_sesion_activa(db: Session, token: str) -> Optional[TokenSesion]:
     Returns:
         TokenSesion: Objeto de sesión si está activa, None en caso contrario.
     """
-    sesion = db.query(TokenSesion).filter(
-        TokenSesion.jwt_token == token,
-        TokenSesion.token_activo == True,
-        TokenSesion.expira_en > datetime.utcnow()
-    ).first()
-    return sesion
+    resultado = await db.execute(
+        select(TokenSesion).where(
+            TokenSesion.token_hash == calcular_hash_token(token),
+            TokenSesion.token_activo == True,
+            TokenSesion.expira_en > datetime.utcnow()
+        )
+    )
+    return resultado.scalars().first()
 
 
-def cerrar_sesion(db: Session, token: str) -> bool:
+async def cerrar_sesion(db: AsyncSession, token: str) -> bool:
     """
     Cierra una sesión invalidando el token.
     
@@ -228,11 +308,69 @@ def cerrar_sesion(db: Session, token: str) -> bool:
     Returns:
         bool: True si se cerró la sesión, False si no existía.
     """
-    resultado = db.query(TokenSesion).filter(
-        TokenSesion.jwt_token == token
-    ).update({"token_activo": False})
-    db.commit()
-    return resultado > 0
+    hash_token = calcular_hash_token(token)
+    resultado = await db.execute(
+        update(TokenSesion)
+        .where(TokenSesion.token_hash == hash_token)
+        .values(token_activo=False)
+    )
+    await db.commit()
+    payload = decodificar_token(token)
+    id_repartidor = payload.get("sub") if payload else None
+    cache_sesiones.invalidar_sesion(hash_token, int(id_repartidor) if id_repartidor else None)
+    return resultado.rowcount > 0
+
+
+async def desactivar_repartidor(db: AsyncSession, id_repartidor: int) -> bool:
+    """
+    Desactiva un repartidor e invalida todas sus sesiones, en la BD y en
+    la caché de sesiones de este proceso (ver el docstring del módulo).
+    
+    Args:
+        db: Sesión de base de datos.
+        id_repartidor: ID del repartidor.
+        
+    Returns:
+        bool: True si el repartidor existía, False en caso contrario.
+    """
+    resultado = await db.execute(
+        update(Repartidor)
+        .where(Repartidor.id_repartidor == id_repartidor)
+        .values(esta_activo=False)
+    )
+    await db.execute(
+        update(TokenSesion)
+        .where(
+            TokenSesion.id_repartidor == id_repartidor,
+            TokenSesion.token_activo == True
+        )
+        .values(token_activo=False)
+    )
+    await db.commit()
+    cache_sesiones.invalidar_repartidor(id_repartidor)
+    return resultado.rowcount > 0
+
+
+# ============================================================
+# CACHÉ DE USUARIOS AUTENTICADOS
+# ============================================================
+
+# Columnas del repartidor que se copian a la caché de sesiones
+_COLUMNAS_REPARTIDOR = [columna.key for columna in Repartidor.__table__.columns]
+
+
+def _datos_repartidor(usuario: Repartidor) -> dict:
+    """Copia las columnas de un repartidor a un diccionario para la caché."""
+    return {columna: getattr(usuario, columna) for columna in _COLUMNAS_REPARTIDOR}
+
+
+def _repartidor_desde_cache(datos: dict) -> Repartidor:
+    """
+    Reconstruye un Repartidor (no asociado a ninguna sesión de BD) a partir
+    de los datos en caché. Se crea una instancia nueva por solicitud para
+    que ningún endpoint comparta el mismo objeto.
+    """
+    return Repartidor(**datos)
 
 
 # ============================================================
@@ -241,11 +379,14 @@ def cerrar_sesion(db: Session, token: str) -> bool:
 
 async def obtener_usuario_actual(
     credenciales: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Repartidor:
     """
     Dependencia de FastAPI para obtener el usuario autenticado.
     Valida el token JWT y verifica que la sesión esté activa en BD.
+    Las sesiones validadas se guardan en cache_sesiones, por lo que las
+    solicitudes siguientes con el mismo token no consultan la BD hasta que
+    la entrada expire o se invalide (logout, nuevo login o desactivar_repartidor).
     
     Args:
         credenciales: Credenciales HTTP Bearer (token).
@@ -281,8 +422,18 @@ async def obtener_usuario_actual(
     if id_usuario is None:
         raise excepcion_credenciales
     
+    # Consultar la caché de sesiones antes de ir a la BD
+    hash_token = calcular_hash_token(token)
+    datos_cache = cache_sesiones.obtener(hash_token)
+    if datos_cache is not None and str(datos_cache["id_repartidor"]) == str(id_usuario):
+        return _repartidor_desde_cache(datos_cache)
+    
+    # Leída antes de consultar la BD: si un logout o login invalida las
+    # sesiones del repartidor mientras tanto, el resultado no se guarda
+    generacion = cache_sesiones.generacion(int(id_usuario))
+    
     # Verificar que la sesión esté activa en BD
-    sesion = validar_sesion_activa(db, token)
+    sesion = await validar_sesion_activa(db, token)
     if sesion is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -291,9 +442,10 @@ async def obtener_usuario_actual(
         )
     
     # Obtener usuario de la base de datos
-    usuario = db.query(Repartidor).filter(
-        Repartidor.id_repartidor == int(id_usuario)
-    ).first()
+    resultado = await db.execute(
+        select(Repartidor).where(Repartidor.id_repartidor == int(id_usuario))
+    )
+    usuario = resultado.scalars().first()
     
     if usuario is None:
         raise excepcion_credenciales
@@ -304,6 +456,9 @@ async def obtener_usuario_actual(
             detail="Usuario desactivado. Contacte al administrador."
         )
     
+    # Guardar en caché (nunca más allá de la expiración de la sesión)
+    cache_sesiones.guardar_sesion(hash_token, _datos_repartidor(usuario), sesion.expira_en, generacion)
+    
     return usuario
 
 
@@ -321,3 +476,30 @@ async def obtener_token_actual(
         str: Token JWT.
     """
     return credenciales.credentials
+
+
+def token_metricas_valido(token: Optional[str]) -> bool:
+    """Compara en tiempo constante con METRICAS_TOKEN (False si no está configurado)."""
+    if not METRICAS_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), METRICAS_TOKEN.encode())
+
+
+async def verificar_token_metricas(
+    token: Optional[str] = Depends(security_metricas),
+    credenciales: Optional[HTTPAuthorizationCredentials] = Depends(security_metricas_bearer)
+) -> None:
+    """
+    Dependencia de los endpoints de métricas: exige METRICAS_TOKEN en el
+    encabezado X-Metricas-Token o como Authorization: Bearer. Las métricas
+    exponen estado interno (sentencias SQL, pools, colas), no son para
+    los repartidores.
+    
+    Raises:
+        HTTPException: 403 si el token falta, no coincide o no está configurado.
+    """
+    if not token_metricas_valido(token or (credenciales.credentials if credenciales else None)):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Token de métricas inválido o no configurado"
+        )
@@ -0,0 +1,203 @@
+# ============================================================
+# PQEXPRESS - Serialización Rápida de Envíos
+# Filas de Core → dict → bytes JSON (orjson), sin modelos Pydantic
+# ============================================================
+"""
+Las listas de envíos (/mis-envios, /pendientes, /en-ruta, /historial,
+/sync) pueden traer cientos de filas. El camino con Pydantic hidrata un
+objeto ORM por fila, construye un EnvioResponse (con sus validators),
+y FastAPI vuelve a validar y serializar toda la respuesta con
+response_model.
+
+Aquí se seleccionan solo las columnas de la respuesta (tuplas de Core,
+sin identity map), se arma cada envío como dict con las mismas claves y
+formato que EnvioResponse, y se devuelve una RespuestaJSONRapida: al
+retornar un Response, FastAPI no vuelve a validar. El response_model de
+cada endpoint se conserva para la documentación de OpenAPI.
+
+Con vista=resumen (EnvioResumen) ni siquiera se leen las columnas TEXT
+ni las que la pantalla de lista no muestra.
+
+benchmarks/bench_serializacion.py compara ambos caminos y verifica que
+produzcan el mismo JSON.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+from fastapi import Response
+from fastapi.responses import JSONResponse
+import json
+
+from .models import Envio, formatear_direccion
+
+try:
+    import orjson
+    ORJSON_DISPONIBLE = True
+except ImportError:  # Sin orjson se usa json de la biblioteca estándar (más lento)
+    orjson = None
+    ORJSON_DISPONIBLE = False
+
+# Columnas de envios que forman EnvioResponse (direccion_completa se calcula)
+COLUMNAS_ENVIO = (
+    Envio.id_envio,
+    Envio.numero_guia,
+    Envio.id_repartidor,
+    Envio.receptor_nombre,
+    Envio.receptor_telefono,
+    Envio.calle,
+    Envio.numero_exterior,
+    Envio.colonia,
+    Envio.municipio_ciudad,
+    Envio.codigo_postal,
+    Envio.referencias_adicionales,
+    Envio.lat_destino,
+    Envio.lng_destino,
+    Envio.estatus_envio,
+    Envio.fecha_asignacion,
+    Envio.fecha_completado,
+    Envio.observaciones,
+    Envio.creado_en,
+    Envio.modificado_en,
+)
+
+
+# Columnas de EnvioResumen (las de la dirección solo para direccion_completa)
+COLUMNAS_RESUMEN = (
+    Envio.id_envio,
+    Envio.numero_guia,
+    Envio.receptor_nombre,
+    Envio.calle,
+    Envio.numero_exterior,
+    Envio.colonia,
+    Envio.municipio_ciudad,
+    Envio.codigo_postal,
+    Envio.lat_destino,
+    Envio.lng_destino,
+    Envio.estatus_envio,
+    Envio.fecha_asignacion,
+    Envio.fecha_completado,
+    Envio.creado_en,
+    Envio.modificado_en,
+)
+
+
+def columnas_envio(query, vista: str = "completa"):
+    """
+    Reemplaza las columnas de un select(Envio) por las de la vista
+    (conserva filtros y orden).
+
+    Args:
+        vista: 'completa' (EnvioResponse) o 'resumen' (EnvioResumen).
+    """
+    return query.with_only_columns(*(COLUMNAS_RESUMEN if vista == "resumen" else COLUMNAS_ENVIO))
+
+
+def fila_a_dict(fila) -> Dict[str, Any]:
+    """
+    Convierte una fila de COLUMNAS_ENVIO al dict de EnvioResponse
+    (mismas claves, mismo orden y misma conversión que convertir_envio_a_response).
+    """
+    # Desempacar por posición: el acceso por nombre a Row cuesta varias veces más
+    (id_envio, numero_guia, id_repartidor, receptor_nombre, receptor_telefono, calle, numero_exterior,
+     colonia, municipio_ciudad, codigo_postal, referencias_adicionales, lat_destino, lng_destino,
+     estatus_envio, fecha_asignacion, fecha_completado, observaciones, creado_en, modificado_en) = fila
+    return {
+        "id_envio": id_envio,
+        "numero_guia": numero_guia,
+        "id_repartidor": id_repartidor,
+        "receptor_nombre": receptor_nombre,
+        "receptor_telefono": receptor_telefono,
+        "calle": calle,
+        "numero_exterior": numero_exterior,
+        "colonia": colonia,
+        "municipio_ciudad": municipio_ciudad,
+        "codigo_postal": codigo_postal,
+        "direccion_completa": formatear_direccion(calle, numero_exterior, colonia, municipio_ciudad, codigo_postal),
+        "referencias_adicionales": referencias_adicionales,
+        "lat_destino": float(lat_destino) if lat_destino else None,
+        "lng_destino": float(lng_destino) if lng_destino else None,
+        "estatus_envio": estatus_envio,
+        "fecha_asignacion": fecha_asignacion,
+        "fecha_completado": fecha_completado,
+        "observaciones": observaciones,
+        "creado_en": creado_en,
+        "modificado_en": modificado_en,
+    }
+
+
+def fila_a_resumen(fila) -> Dict[str, Any]:
+    """Convierte una fila de COLUMNAS_RESUMEN al dict de EnvioResumen."""
+    (id_envio, numero_guia, receptor_nombre, calle, numero_exterior, colonia, municipio_ciudad,
+     codigo_postal, lat_destino, lng_destino, estatus_envio, fecha_asignacion, fecha_completado,
+     creado_en, modificado_en) = fila
+    return {
+        "id_envio": id_envio,
+        "numero_guia": numero_guia,
+        "receptor_nombre": receptor_nombre,
+        "calle": calle,
+        "direccion_completa": formatear_direccion(calle, numero_exterior, colonia, municipio_ciudad, codigo_postal),
+        "lat_destino": float(lat_destino) if lat_destino else None,
+        "lng_destino": float(lng_destino) if lng_destino else None,
+        "estatus_envio": estatus_envio,
+        "fecha_asignacion": fecha_asignacion,
+        "fecha_completado": fecha_completado,
+        "creado_en": creado_en,
+        "modificado_en": modificado_en,
+    }
+
+
+def filas_a_dicts(filas: Iterable, vista: str = "completa") -> List[Dict[str, Any]]:
+    """Convierte las filas de columnas_envio(query, vista) a dicts."""
+    convertir = fila_a_resumen if vista == "resumen" else fila_a_dict
+    return [convertir(fila) for fila in filas]
+
+
+def _por_defecto(valor: Any) -> Any:
+    """Tipos que json (biblioteca estándar) no serializa solo."""
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def _decimal_orjson(valor: Any) -> Any:
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError
+
+
+def a_json(contenido: Any) -> bytes:
+    """
+    Serializa a bytes JSON compactos en UTF-8. Las fechas salen en
+    ISO 8601 igual que con Pydantic: las de la BD no tienen zona (son UTC
+    por convención) y se escriben sin sufijo; 'Z' solo aparece en un
+    datetime con tzinfo UTC.
+    """
+    if ORJSON_DISPONIBLE:
+        return orjson.dumps(contenido, default=_decimal_orjson, option=orjson.OPT_UTC_Z)
+    return json.dumps(
+        contenido, default=_por_defecto, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class RespuestaJSONRapida(JSONResponse):
+    """JSONResponse que serializa con orjson (o json si no está instalado)."""
+
+    def render(self, content: Any) -> bytes:
+        return a_json(content)
+
+
+def respuesta_rapida(contenido: Any, response: Optional[Response] = None) -> RespuestaJSONRapida:
+    """
+    Crea la respuesta conservando los encabezados que el endpoint ya
+    agregó al `response` inyectado (ETag, Cache-Control): FastAPI solo
+    los aplica cuando el endpoint no retorna un Response propio.
+    """
+    respuesta = RespuestaJSONRapida(contenido)
+    if response is not None:
+        for nombre, valor in response.headers.items():
+            if nombre not in ("content-length", "content-type"):
+                respuesta.headers[nombre] = valor
+    return respuesta
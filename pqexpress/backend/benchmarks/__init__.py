@@ -0,0 +1,8 @@
+# ============================================================
+# PQEXPRESS - Benchmarks del Backend
+# ============================================================
+"""
+Scripts de medición de rendimiento.
+Se ejecutan como módulos desde el directorio backend, ej:
+    python -m benchmarks.bench_db_async
+"""
@@ -0,0 +1,146 @@
+# ============================================================
+# PQEXPRESS - Benchmark de Compresión de Respuestas
+# CPU vs. bytes por codificación y nivel; costo con y sin caché por ETag
+# ============================================================
+"""
+Dos partes, sobre respuestas reales de /api/envios/mis-envios:
+
+- niveles: comprime cada cuerpo con gzip (1, 6, 9) y brotli (1, 4, 6, 11
+  si el paquete está instalado) y reporta bytes, proporción, p50 del
+  tiempo de compresión y MB/s. Sirve para elegir COMPRESION_NIVEL_*.
+- http: latencia p50/p95 de la solicitud completa en proceso sin
+  compresión (identity), comprimiendo en cada solicitud (caché de
+  comprimidos deshabilitada) y sirviendo desde la caché por ETag.
+  Se leen los bytes crudos (sin descomprimir en el cliente).
+
+Uso:
+    python -m benchmarks.bench_compresion --envios 500 --repeticiones 100
+"""
+
+import argparse
+import asyncio
+import gzip
+import os
+import tempfile
+import time
+
+from benchmarks.comun import (
+    cliente_api, configurar_sqlite, crear_esquema, iniciar_sesion, sembrar_datos, percentil, imprimir_resultado
+)
+
+CARGAS = {
+    "limite_50": {"limite": 50},
+    "completa": {},
+    "resumen": {"vista": "resumen"},
+}
+
+
+def _resumen(tiempos: list) -> dict:
+    return {
+        "p50_ms": round(percentil(tiempos, 50) * 1000, 3),
+        "p95_ms": round(percentil(tiempos, 95) * 1000, 3),
+    }
+
+
+def _compresores() -> dict:
+    from app.compresion import BROTLI_DISPONIBLE
+
+    compresores = {f"gzip-{nivel}": (lambda c, n=nivel: gzip.compress(c, compresslevel=n, mtime=0)) for nivel in (1, 6, 9)}
+    if BROTLI_DISPONIBLE:
+        import brotli
+        for nivel in (1, 4, 6, 11):
+            compresores[f"br-{nivel}"] = lambda c, n=nivel: brotli.compress(c, quality=n)
+    return compresores
+
+
+def medir_niveles(cuerpos: dict, repeticiones: int) -> list:
+    resultados = []
+    compresores = _compresores()
+    for carga, cuerpo in cuerpos.items():
+        escenario = {"carga": carga, "bytes": len(cuerpo), "codificaciones": {}}
+        for nombre, compresor in compresores.items():
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                comprimido = compresor(cuerpo)
+                tiempos.append(time.perf_counter() - inicio)
+            p50 = percentil(tiempos, 50)
+            escenario["codificaciones"][nombre] = {
+                "bytes": len(comprimido),
+                "proporcion": round(len(comprimido) / len(cuerpo), 4),
+                "p50_ms": round(p50 * 1000, 3),
+                "mb_por_segundo": round(len(cuerpo) / p50 / 1e6, 1) if p50 else None,
+            }
+        resultados.append(escenario)
+    return resultados
+
+
+async def _obtener(cliente, headers: dict, params: dict) -> tuple:
+    async with cliente.stream("GET", "/api/envios/mis-envios", headers=headers, params=params) as respuesta:
+        crudo = b"".join([fragmento async for fragmento in respuesta.aiter_raw()])
+        return respuesta, crudo
+
+
+async def ejecutar(args) -> dict:
+    from app.compresion import BROTLI_DISPONIBLE, CODIFICACIONES, cache_comprimidos, metricas_compresion
+
+    resultado = {
+        "configuracion": {**vars(args), "brotli": BROTLI_DISPONIBLE},
+        "niveles": [],
+        "http": [],
+    }
+    async with cliente_api() as cliente:
+        sesion = await iniciar_sesion(cliente, "bench1")
+        cuerpos = {}
+        for carga, params in CARGAS.items():
+            # httpx pide gzip por defecto; aquí se necesita el cuerpo sin comprimir
+            respuesta, crudo = await _obtener(cliente, {**sesion, "Accept-Encoding": "identity"}, params)
+            cuerpos[carga] = crudo
+        resultado["niveles"] = medir_niveles(cuerpos, args.repeticiones)
+
+        max_entradas = cache_comprimidos.max_entradas
+        modos = [("identity", "identity", max_entradas)]
+        for codificacion in CODIFICACIONES:
+            modos += [(f"{codificacion}_sin_cache", codificacion, 0), (f"{codificacion}_con_cache", codificacion, max_entradas)]
+
+        for carga, params in CARGAS.items():
+            escenario = {"carga": carga, "bytes_originales": len(cuerpos[carga]), "modos": {}}
+            for modo, codificacion, entradas in modos:
+                cache_comprimidos.max_entradas = entradas
+                cache_comprimidos.limpiar()
+                headers = {**sesion, "Accept-Encoding": codificacion}
+                # Calentamiento (llena la caché si está habilitada)
+                respuesta, crudo = await _obtener(cliente, headers, params)
+                tiempos = []
+                for _ in range(args.repeticiones):
+                    inicio = time.perf_counter()
+                    respuesta, crudo = await _obtener(cliente, headers, params)
+                    tiempos.append(time.perf_counter() - inicio)
+                escenario["modos"][modo] = {
+                    "content_encoding": respuesta.headers.get("content-encoding", "identity"),
+                    "bytes": len(crudo),
+                    **_resumen(tiempos),
+                }
+            resultado["http"].append(escenario)
+        cache_comprimidos.max_entradas = max_entradas
+
+    resultado["metricas"] = metricas_compresion.estadisticas()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de compresión de respuestas (CPU vs. bytes)")
+    parser.add_argument("--envios", type=int, default=500, help="Envíos del repartidor de prueba")
+    parser.add_argument("--repeticiones", type=int, default=100)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "pqexpress_bench_compresion.db"))
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    configurar_sqlite(args.db)
+    crear_esquema()
+    sembrar_datos(1, args.envios)
+    imprimir_resultado(asyncio.run(ejecutar(args)), args.salida)
+
+
+if __name__ == "__main__":
+    main()
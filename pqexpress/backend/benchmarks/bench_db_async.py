@@ -0,0 +1,87 @@
+# ============================================================
+# PQEXPRESS - Benchmark de la Capa Asíncrona de BD
+# Solicitudes por segundo bajo carga concurrente
+# ============================================================
+"""
+Mide throughput y latencia de los endpoints de lectura de envíos con
+distintos niveles de concurrencia.
+
+Por defecto levanta la app en proceso contra un archivo SQLite con datos
+sintéticos. Con --url se mide un servidor ya en ejecución (ej. uvicorn
+contra MySQL, previamente sembrado con los usuarios bench1..benchN).
+
+Uso:
+    python -m benchmarks.bench_db_async --repartidores 50 --envios 200 --concurrencia 1,10,50
+    python -m benchmarks.bench_db_async --url http://localhost:8000 --repartidores 50
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+
+from benchmarks.comun import (
+    configurar_sqlite, crear_esquema, sembrar_datos, cliente_api,
+    iniciar_sesion, carga_concurrente, imprimir_resultado
+)
+
+
+async def ejecutar(args) -> dict:
+    resultado = {"configuracion": vars(args), "escenarios": []}
+
+    async with cliente_api(args.url) as cliente:
+        # Un token por repartidor (las tareas se reparten entre ellos)
+        n_sesiones = min(args.repartidores, max(args.concurrencia))
+        sesiones = await asyncio.gather(*(
+            iniciar_sesion(cliente, f"bench{i + 1}") for i in range(n_sesiones)
+        ))
+
+        rutas = {
+            "pendientes": lambda numero: "/api/envios/pendientes",
+            "historial": lambda numero: "/api/envios/historial?limite=50",
+            # El envío i+1 pertenece al repartidor (i % repartidores) + 1
+            "detalle": lambda numero: (
+                f"/api/envios/{numero % n_sesiones + 1 + args.repartidores * random.randrange(args.envios)}"
+            ),
+        }
+
+        for nombre, construir_ruta in rutas.items():
+            for concurrencia in args.concurrencia:
+                async def operacion(numero: int, construir_ruta=construir_ruta) -> bool:
+                    respuesta = await cliente.get(
+                        construir_ruta(numero), headers=sesiones[numero % n_sesiones]
+                    )
+                    return respuesta.status_code == 200
+
+                resumen = await carga_concurrente(operacion, concurrencia, args.duracion)
+                resultado["escenarios"].append({
+                    "endpoint": nombre,
+                    "concurrencia": concurrencia,
+                    **resumen
+                })
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la capa asíncrona de BD")
+    parser.add_argument("--url", default=None, help="URL de un servidor en ejecución (omitir para app en proceso)")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "pqexpress_bench.db"))
+    parser.add_argument("--repartidores", type=int, default=50)
+    parser.add_argument("--envios", type=int, default=200, help="Envíos por repartidor")
+    parser.add_argument("--concurrencia", default="1,10,50",
+                        type=lambda texto: [int(n) for n in texto.split(",")])
+    parser.add_argument("--duracion", type=float, default=5.0, help="Segundos por escenario")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    if not args.url:
+        configurar_sqlite(args.db)
+        crear_esquema()
+        sembrar_datos(args.repartidores, args.envios)
+
+    imprimir_resultado(asyncio.run(ejecutar(args)), args.salida)
+
+
+if __name__ == "__main__":
+    main()
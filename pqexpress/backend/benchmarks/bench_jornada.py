@@ -0,0 +1,243 @@
+# ============================================================
+# PQEXPRESS - Prueba de Carga: Jornada de Repartidores
+# Login masivo, sondeo de pendientes, entregas con foto e historial
+# ============================================================
+"""
+Simula la jornada de N repartidores al mismo tiempo, como la usa la app:
+
+1. login: todos inician sesión a la vez (inicio de turno).
+2. jornada: cada repartidor consulta /pendientes y, por cada entrega,
+   vuelve a sondear /pendientes (con If-None-Match, como la app),
+   inicia ruta, registra la entrega y sube la foto de evidencia
+   (multipart). Al final consulta /historial.
+
+--concurrencia limita las solicitudes en vuelo (el tamaño del pool de
+conexiones del cliente). Reporta por endpoint y por fase solicitudes,
+errores, throughput (rps sobre la duración de la fase) y latencia
+media/p50/p95/p99/max en JSON, para comparar corridas con --salida.
+
+Por defecto levanta la app en proceso contra SQLite. Para bases grandes
+sembrar una vez con benchmarks/generar_datos.py y usar --sin-sembrar;
+cada corrida entrega envíos, así que los pendientes bajan poco a poco.
+Con --url se mide un servidor en ejecución (ej. uvicorn contra MySQL
+sembrada con generar_datos.py --database-url).
+
+Uso:
+    python -m benchmarks.bench_jornada --repartidores 200 --envios 100 --conductores 100
+    python -m benchmarks.generar_datos --repartidores 2000 --envios 500
+    python -m benchmarks.bench_jornada --sin-sembrar --repartidores 2000 --conductores 500 --concurrencia 100
+    python -m benchmarks.bench_jornada --url http://localhost:8000 --conductores 200
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from benchmarks.comun import (
+    LAT_CENTRO, LNG_CENTRO, CLAVE_PRUEBA, cliente_api, configurar_sqlite, crear_esquema, sembrar_datos,
+    resumir_latencias, imprimir_resultado
+)
+from benchmarks.generar_datos import DB_CARGA
+
+
+def generar_foto(kb: int, semilla: int) -> bytes:
+    """JPEG de ruido de ~kb KB (sin Pillow, bytes aleatorios con cabecera JPEG)."""
+    aleatorio = random.Random(semilla)
+    try:
+        from PIL import Image
+    except ImportError:
+        return b"\xff\xd8\xff\xe0" + aleatorio.randbytes(kb * 1024)
+    # El ruido comprime mal: ~1.5 bytes por pixel con calidad 85
+    lado = max(16, int((kb * 1024 / 1.5) ** 0.5))
+    imagen = Image.frombytes("RGB", (lado, lado), aleatorio.randbytes(lado * lado * 3))
+    salida = io.BytesIO()
+    imagen.save(salida, format="JPEG", quality=85)
+    return salida.getvalue()
+
+
+class Registro:
+    """Latencias y códigos de respuesta por endpoint de una fase."""
+
+    def __init__(self, concurrencia: int):
+        self._semaforo = asyncio.Semaphore(concurrencia)
+        self.latencias = defaultdict(list)
+        self.codigos = defaultdict(Counter)
+        self.errores = Counter()
+
+    async def medir(self, nombre: str, solicitud, validos=(200,)):
+        """Ejecuta la solicitud (una corrutina ya creada) y registra su latencia."""
+        async with self._semaforo:
+            inicio = time.perf_counter()
+            try:
+                respuesta = await solicitud
+            except Exception as e:  # Conexión rechazada, timeout, etc.
+                self.codigos[nombre][type(e).__name__] += 1
+                self.errores[nombre] += 1
+                return None
+            segundos = time.perf_counter() - inicio
+        self.codigos[nombre][str(respuesta.status_code)] += 1
+        if respuesta.status_code in validos:
+            self.latencias[nombre].append(segundos)
+        else:
+            self.errores[nombre] += 1
+        return respuesta
+
+    def resumen(self, duracion_segundos: float) -> dict:
+        endpoints = {
+            nombre: {
+                **resumir_latencias(self.latencias[nombre], duracion_segundos, self.errores[nombre]),
+                "codigos": dict(self.codigos[nombre]),
+            }
+            for nombre in sorted(self.codigos)
+        }
+        todas = [latencia for lista in self.latencias.values() for latencia in lista]
+        return {
+            "duracion_segundos": round(duracion_segundos, 2),
+            "total": resumir_latencias(todas, duracion_segundos, sum(self.errores.values())),
+            "endpoints": endpoints,
+        }
+
+
+async def fase_login(cliente, usuarios: list, concurrencia: int) -> tuple:
+    registro = Registro(concurrencia)
+
+    async def entrar(usuario: str):
+        respuesta = await registro.medir(
+            "POST /auth/login",
+            cliente.post("/api/auth/login", json={"usuario": usuario, "clave": CLAVE_PRUEBA})
+        )
+        if respuesta is None or respuesta.status_code != 200:
+            return None
+        return {"Authorization": f"Bearer {respuesta.json()['token']}"}
+
+    inicio = time.perf_counter()
+    sesiones = await asyncio.gather(*(entrar(usuario) for usuario in usuarios))
+    return [s for s in sesiones if s is not None], registro.resumen(time.perf_counter() - inicio)
+
+
+async def jornada(cliente, registro: Registro, sesion: dict, foto: bytes, args, aleatorio: random.Random) -> int:
+    """Jornada de un repartidor. Retorna las entregas completas (con foto)."""
+    etag = {}
+
+    async def sondear():
+        headers = {**sesion, **({"If-None-Match": etag["valor"]} if etag else {})}
+        respuesta = await registro.medir(
+            "GET /envios/pendientes",
+            cliente.get("/api/envios/pendientes", headers=headers, params={"vista": args.vista}),
+            validos=(200, 304)
+        )
+        if respuesta is not None and respuesta.status_code == 200:
+            if "etag" in respuesta.headers:
+                etag["valor"] = respuesta.headers["etag"]
+            return respuesta.json()["envios"]
+        return None
+
+    async def pausa():
+        if args.pausa_ms:
+            await asyncio.sleep(aleatorio.uniform(0.5, 1.5) * args.pausa_ms / 1000)
+
+    pendientes = await sondear() or []
+    asignados = [envio["id_envio"] for envio in pendientes if envio["estatus_envio"] == "asignado"]
+    completas = 0
+    for id_envio in asignados[:args.entregas]:
+        for _ in range(args.sondeos):
+            await sondear()
+            await pausa()
+
+        respuesta = await registro.medir(
+            "POST /envios/{id_envio}/iniciar-ruta",
+            cliente.post(f"/api/envios/{id_envio}/iniciar-ruta", headers=sesion)
+        )
+        if respuesta is None or respuesta.status_code != 200:
+            continue
+        await pausa()
+
+        respuesta = await registro.medir(
+            "POST /envios/{id_envio}/confirmar-entrega",
+            cliente.post(f"/api/envios/{id_envio}/confirmar-entrega", headers=sesion, json={
+                "lat_confirmacion": round(LAT_CENTRO + aleatorio.uniform(-0.15, 0.15), 6),
+                "lng_confirmacion": round(LNG_CENTRO + aleatorio.uniform(-0.15, 0.15), 6),
+                "precision_metros": round(aleatorio.uniform(3, 25), 1),
+                "nombre_receptor": "Prueba de carga",
+            })
+        )
+        if respuesta is None or respuesta.status_code != 200:
+            continue
+
+        respuesta = await registro.medir(
+            "POST /envios/{id_envio}/evidencia",
+            cliente.post(
+                f"/api/envios/{id_envio}/evidencia", headers=sesion,
+                files={"imagen": ("evidencia.jpg", foto, "image/jpeg")}
+            )
+        )
+        if respuesta is not None and respuesta.status_code == 200:
+            completas += 1
+        await pausa()
+
+    await registro.medir(
+        "GET /envios/historial",
+        cliente.get("/api/envios/historial", headers=sesion, params={"limite": 50, "vista": args.vista})
+    )
+    return completas
+
+
+async def ejecutar(args) -> dict:
+    foto = generar_foto(args.foto_kb, args.semilla)
+    resultado = {"configuracion": {**vars(args), "foto_bytes": len(foto)}, "fases": {}}
+    conductores = min(args.conductores, args.repartidores)
+    usuarios = [f"bench{i + 1}" for i in random.Random(args.semilla).sample(range(args.repartidores), conductores)]
+
+    async with cliente_api(args.url) as cliente:
+        sesiones, resultado["fases"]["login"] = await fase_login(cliente, usuarios, args.concurrencia)
+
+        registro = Registro(args.concurrencia)
+        inicio = time.perf_counter()
+        completas = await asyncio.gather(*(
+            jornada(cliente, registro, sesion, foto, args, random.Random(args.semilla + numero))
+            for numero, sesion in enumerate(sesiones)
+        ))
+        resultado["fases"]["jornada"] = {
+            "repartidores": len(sesiones),
+            "entregas_completas": sum(completas),
+            **registro.resumen(time.perf_counter() - inicio),
+        }
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga: jornada de repartidores")
+    parser.add_argument("--url", default=None, help="URL de un servidor en ejecución (omitir para app en proceso)")
+    parser.add_argument("--db", default=DB_CARGA)
+    parser.add_argument("--sin-sembrar", action="store_true", help="Reutilizar la base de generar_datos.py")
+    parser.add_argument("--repartidores", type=int, default=200, help="Repartidores sembrados (bench1..N)")
+    parser.add_argument("--envios", type=int, default=100, help="Envíos por repartidor al sembrar")
+    parser.add_argument("--conductores", type=int, default=100, help="Repartidores simulados a la vez")
+    parser.add_argument("--concurrencia", type=int, default=50, help="Solicitudes simultáneas como máximo")
+    parser.add_argument("--entregas", type=int, default=5, help="Entregas por repartidor")
+    parser.add_argument("--sondeos", type=int, default=2, help="Consultas a /pendientes antes de cada entrega")
+    parser.add_argument("--pausa-ms", type=float, default=0.0, help="Pausa media entre pasos de un repartidor")
+    parser.add_argument("--foto-kb", type=int, default=200, help="Tamaño aproximado de la foto de evidencia")
+    parser.add_argument("--vista", choices=("completa", "resumen"), default="completa")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    if not args.url:
+        # Las fotos de la prueba no deben ir al directorio de evidencias real
+        os.environ.setdefault("EVIDENCIAS_DIR", os.path.join(tempfile.gettempdir(), "pqexpress_carga_evidencias"))
+        configurar_sqlite(args.db)
+        if not args.sin_sembrar:
+            crear_esquema()
+            sembrar_datos(args.repartidores, args.envios, semilla=args.semilla)
+
+    imprimir_resultado(asyncio.run(ejecutar(args)), args.salida)
+
+
+if __name__ == "__main__":
+    main()
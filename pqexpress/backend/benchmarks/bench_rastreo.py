@@ -0,0 +1,114 @@
+# ============================================================
+# PQEXPRESS - Benchmark de Ingesta de Rastreo GPS
+# Puntos por segundo aceptados y escritos por un worker
+# ============================================================
+"""
+Envía lotes de puntos GPS a POST /api/rastreo/puntos desde varias tareas
+concurrentes y mide la latencia por solicitud y los puntos por segundo.
+
+En proceso (sin --url) también espera a que el buffer escriba todo y
+reporta los puntos escritos por segundo y los lotes usados.
+
+Uso:
+    python -m benchmarks.bench_rastreo --repartidores 20 --puntos-por-lote 50 --concurrencia 1,10,50
+    python -m benchmarks.bench_rastreo --url http://localhost:8000 --repartidores 20
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.comun import (
+    configurar_sqlite, crear_esquema, sembrar_datos, cliente_api,
+    iniciar_sesion, carga_concurrente, imprimir_resultado, LAT_CENTRO, LNG_CENTRO
+)
+
+
+def generar_lote(aleatorio: random.Random, cantidad: int) -> dict:
+    """Lote de puntos consecutivos (uno por segundo) alrededor del centro."""
+    inicio = datetime.utcnow() - timedelta(seconds=cantidad)
+    lat = LAT_CENTRO + aleatorio.uniform(-0.1, 0.1)
+    lng = LNG_CENTRO + aleatorio.uniform(-0.1, 0.1)
+    puntos = []
+    for i in range(cantidad):
+        lat += aleatorio.uniform(-0.0001, 0.0001)
+        lng += aleatorio.uniform(-0.0001, 0.0001)
+        puntos.append({
+            "lat": round(lat, 7),
+            "lng": round(lng, 7),
+            "precision_metros": round(aleatorio.uniform(3, 20), 1),
+            "velocidad": round(aleatorio.uniform(0, 15), 2),
+            "capturado_en": (inicio + timedelta(seconds=i)).isoformat() + "Z",
+        })
+    return {"puntos": puntos}
+
+
+async def ejecutar(args) -> dict:
+    resultado = {"configuracion": vars(args), "escenarios": []}
+    aleatorio = random.Random(42)
+    # Cuerpos pregenerados para no medir la generación
+    lotes = [generar_lote(aleatorio, args.puntos_por_lote) for _ in range(50)]
+
+    async with cliente_api(args.url) as cliente:
+        n_sesiones = min(args.repartidores, max(args.concurrencia))
+        sesiones = await asyncio.gather(*(
+            iniciar_sesion(cliente, f"bench{i + 1}") for i in range(n_sesiones)
+        ))
+
+        for concurrencia in args.concurrencia:
+            async def operacion(numero: int) -> bool:
+                respuesta = await cliente.post(
+                    "/api/rastreo/puntos",
+                    json=lotes[numero % len(lotes)],
+                    headers=sesiones[numero % n_sesiones]
+                )
+                return respuesta.status_code == 202
+
+            resumen = await carga_concurrente(operacion, concurrencia, args.duracion)
+            escenario = {
+                "concurrencia": concurrencia,
+                "puntos_por_segundo": round(resumen["rps"] * args.puntos_por_lote, 1),
+                **resumen
+            }
+
+            if not args.url:
+                # Esperar a que el buffer escriba todo lo aceptado
+                from app.rastreo import buffer_rastreo
+                escritos_antes, lotes_antes = buffer_rastreo.escritos, buffer_rastreo.lotes
+                inicio = time.perf_counter()
+                await buffer_rastreo.detener()
+                escenario["vaciado_final_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+                escenario["buffer"] = buffer_rastreo.estadisticas()
+                escenario["buffer"]["escritos_escenario"] = buffer_rastreo.escritos - escritos_antes
+                escenario["buffer"]["lotes_escenario"] = buffer_rastreo.lotes - lotes_antes
+
+            resultado["escenarios"].append(escenario)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta de rastreo GPS")
+    parser.add_argument("--url", default=None, help="URL de un servidor en ejecución (omitir para app en proceso)")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "pqexpress_bench_rastreo.db"))
+    parser.add_argument("--repartidores", type=int, default=20)
+    parser.add_argument("--puntos-por-lote", type=int, default=50)
+    parser.add_argument("--concurrencia", default="1,10,50",
+                        type=lambda texto: [int(n) for n in texto.split(",")])
+    parser.add_argument("--duracion", type=float, default=5.0, help="Segundos por escenario")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    if not args.url:
+        configurar_sqlite(args.db)
+        crear_esquema()
+        sembrar_datos(args.repartidores, 10)
+
+    imprimir_resultado(asyncio.run(ejecutar(args)), args.salida)
+
+
+if __name__ == "__main__":
+    main()
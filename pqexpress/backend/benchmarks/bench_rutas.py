@@ -0,0 +1,86 @@
+# ============================================================
+# PQEXPRESS - Benchmark de Optimización de Rutas
+# Tiempo de cálculo y calidad de la ruta según número de paradas
+# ============================================================
+"""
+Mide app.rutas.optimizar_ruta directamente (sin HTTP ni BD) con paradas
+aleatorias alrededor del centro de la CDMX.
+
+Para cada tamaño y presupuesto reporta el tiempo de cálculo (p50/p95/p99),
+la distancia del vecino más cercano, la distancia final y la mejora
+porcentual. Con presupuesto 0 solo se mide el vecino más cercano.
+
+Uso:
+    python -m benchmarks.bench_rutas --paradas 20,100,500 --presupuestos 0,50,200 --repeticiones 20
+"""
+
+import argparse
+import random
+import statistics
+
+from app.rutas import optimizar_ruta
+from benchmarks.comun import LAT_CENTRO, LNG_CENTRO, percentil, imprimir_resultado
+
+
+def generar_paradas(aleatorio: random.Random, cantidad: int, radio_grados: float):
+    """Origen y destinos uniformes en un cuadrado de ±radio_grados."""
+    def punto():
+        return (
+            LAT_CENTRO + aleatorio.uniform(-radio_grados, radio_grados),
+            LNG_CENTRO + aleatorio.uniform(-radio_grados, radio_grados),
+        )
+    return punto(), [punto() for _ in range(cantidad)]
+
+
+def ejecutar(args) -> dict:
+    resultado = {"configuracion": vars(args), "escenarios": []}
+    aleatorio = random.Random(args.semilla)
+
+    for cantidad in args.paradas:
+        # Las mismas instancias para todos los presupuestos
+        instancias = [
+            generar_paradas(aleatorio, cantidad, args.radio) for _ in range(args.repeticiones)
+        ]
+        for presupuesto in args.presupuestos:
+            tiempos, iniciales, finales, completas = [], [], [], 0
+            for origen, destinos in instancias:
+                ruta = optimizar_ruta(origen, destinos, presupuesto)
+                tiempos.append(ruta["tiempo_ms"])
+                iniciales.append(ruta["distancia_inicial_metros"])
+                finales.append(ruta["distancia_total_metros"])
+                completas += ruta["completa"]
+
+            inicial, final = statistics.fmean(iniciales), statistics.fmean(finales)
+            resultado["escenarios"].append({
+                "paradas": cantidad,
+                "presupuesto_ms": presupuesto,
+                "p50_ms": round(percentil(tiempos, 50), 2),
+                "p95_ms": round(percentil(tiempos, 95), 2),
+                "p99_ms": round(percentil(tiempos, 99), 2),
+                "max_ms": round(max(tiempos), 2),
+                "distancia_vecino_km": round(inicial / 1000, 2),
+                "distancia_final_km": round(final / 1000, 2),
+                "mejora_pct": round((1 - final / inicial) * 100, 2) if inicial else 0.0,
+                "convergidas": completas,
+            })
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de optimización de rutas")
+    parser.add_argument("--paradas", default="20,100,500",
+                        type=lambda texto: [int(n) for n in texto.split(",")])
+    parser.add_argument("--presupuestos", default="0,50,200",
+                        type=lambda texto: [int(n) for n in texto.split(",")],
+                        help="Presupuestos de mejora en ms")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Instancias por tamaño")
+    parser.add_argument("--radio", type=float, default=0.15, help="Radio de la zona en grados")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    imprimir_resultado(ejecutar(args), args.salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# ============================================================
+# PQEXPRESS - Benchmark de Serialización de Envíos
+# Camino Pydantic (ORM + EnvioResponse + response_model) vs. camino rápido
+# ============================================================
+"""
+Compara, para listas de distintos tamaños, el costo de producir los
+bytes de una EnvioListResponse:
+
+- pydantic: select(Envio) hidratando objetos ORM, convertir_envio_a_response
+  por fila, EnvioListResponse y la validación + serialización que FastAPI
+  aplica con response_model (TypeAdapter.validate_python + dump_json).
+- rapido: columnas de Core (app/serializacion.py), dicts y orjson.
+- resumen: igual que rapido con vista=resumen (EnvioResumen).
+
+Reporta p50/p95 del tiempo total (consulta incluida) y solo de la
+conversión a bytes y el tamaño de la respuesta, y verifica que pydantic
+y rapido produzcan el mismo JSON.
+
+Uso:
+    python -m benchmarks.bench_serializacion --tamanos 50,200,500 --repeticiones 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.comun import configurar_sqlite, crear_esquema, sembrar_datos, percentil, imprimir_resultado
+
+
+def _resumen(tiempos: list) -> dict:
+    return {
+        "p50_ms": round(percentil(tiempos, 50) * 1000, 3),
+        "p95_ms": round(percentil(tiempos, 95) * 1000, 3),
+    }
+
+
+async def ejecutar(args) -> dict:
+    from pydantic import TypeAdapter
+    from app.database import AsyncSessionLocal, async_engine
+    from app.models import Envio
+    from app.routers.envios import consulta_mis_envios, convertir_envio_a_response
+    from app.schemas import EnvioListResponse
+    from app.serializacion import ORJSON_DISPONIBLE, a_json, columnas_envio, filas_a_dicts
+
+    adaptador = TypeAdapter(EnvioListResponse)
+
+    def bytes_pydantic(envios) -> bytes:
+        modelo = EnvioListResponse(
+            total=len(envios), envios=[convertir_envio_a_response(e) for e in envios]
+        )
+        # Lo que hace FastAPI con response_model en serialize_response
+        return adaptador.dump_json(adaptador.validate_python(modelo), by_alias=True)
+
+    def bytes_rapido(filas, vista: str = "completa") -> bytes:
+        return a_json({
+            "total": len(filas), "envios": filas_a_dicts(filas, vista),
+            "siguiente_cursor": None, "total_general": None,
+        })
+
+    resultado = {"configuracion": {**vars(args), "orjson": ORJSON_DISPONIBLE}, "escenarios": []}
+    for tamano in args.tamanos:
+        query = consulta_mis_envios(1).order_by(Envio.creado_en.desc(), Envio.id_envio.desc()).limit(tamano)
+        caminos = ("pydantic", "rapido", "resumen")
+        tiempos = {camino: ([], []) for camino in caminos}
+        salida = {}
+
+        for _ in range(args.repeticiones):
+            for camino in caminos:
+                totales, conversion = tiempos[camino]
+                async with AsyncSessionLocal() as db:
+                    inicio = time.perf_counter()
+                    if camino == "pydantic":
+                        envios = (await db.execute(query)).scalars().all()
+                        medio = time.perf_counter()
+                        cuerpo = bytes_pydantic(envios)
+                    else:
+                        vista = "resumen" if camino == "resumen" else "completa"
+                        filas = (await db.execute(columnas_envio(query, vista))).all()
+                        medio = time.perf_counter()
+                        cuerpo = bytes_rapido(filas, vista)
+                    fin = time.perf_counter()
+                totales.append(fin - inicio)
+                conversion.append(fin - medio)
+                salida[camino] = cuerpo
+
+        iguales = json.loads(salida["pydantic"]) == json.loads(salida["rapido"])
+        p50_pydantic = percentil(tiempos["pydantic"][0], 50)
+        escenario = {"filas": tamano, "mismo_json": iguales}
+        for camino in caminos:
+            p50 = percentil(tiempos[camino][0], 50)
+            escenario[camino] = {
+                "bytes": len(salida[camino]),
+                "total": _resumen(tiempos[camino][0]),
+                "conversion": _resumen(tiempos[camino][1]),
+                "aceleracion_total": round(p50_pydantic / p50, 2) if p50 else None,
+            }
+        resultado["escenarios"].append(escenario)
+
+    await async_engine.dispose()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización de listas de envíos")
+    parser.add_argument("--tamanos", default="50,200,500",
+                        type=lambda texto: [int(n) for n in texto.split(",")])
+    parser.add_argument("--repeticiones", type=int, default=200)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "pqexpress_bench_serializacion.db"))
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    configurar_sqlite(args.db)
+    crear_esquema()
+    sembrar_datos(1, max(args.tamanos))
+    imprimir_resultado(asyncio.run(ejecutar(args)), args.salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# ============================================================
+# PQEXPRESS - Benchmark de Conexiones de Eventos en Vivo
+# Miles de conexiones SSE inactivas a /api/envios/stream
+# ============================================================
+"""
+Abre muchas conexiones a GET /api/envios/stream, las deja inactivas y mide:
+- tiempo de apertura por conexión (p50/p95/p99)
+- memoria del servidor por conexión (solo servidor local, vía /proc)
+- latencia de entrega de un evento (iniciar-ruta) a todas las conexiones
+  del repartidor que lo genera
+- que el servidor libere las suscripciones al cerrar las conexiones
+
+El transporte ASGI en proceso de httpx no soporta respuestas infinitas, por
+lo que sin --url se levanta uvicorn en un subproceso contra SQLite. Cada
+conexión usa un descriptor en el cliente y otro en el servidor: revisar
+`ulimit -n` (el script sube el límite blando hasta el duro).
+
+/api/metricas/eventos se consulta con METRICAS_TOKEN (el del entorno o,
+con el servidor local, uno generado para la corrida).
+
+Uso:
+    python -m benchmarks.bench_stream --conexiones 10000 --repartidores 100
+    METRICAS_TOKEN=... python -m benchmarks.bench_stream --url http://localhost:8000 --conexiones 2000 --repartidores 20
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from benchmarks.comun import (
+    DIRECTORIO_BACKEND, configurar_sqlite, crear_esquema, sembrar_datos,
+    cliente_api, iniciar_sesion, percentil, imprimir_resultado
+)
+
+
+def subir_limite_descriptores(necesarios: int) -> int:
+    """Sube el límite blando de archivos abiertos hasta el duro. Returns: límite resultante."""
+    blando, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    objetivo = duro if duro != resource.RLIM_INFINITY else max(blando, necesarios)
+    if blando < objetivo:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (objetivo, duro))
+    return objetivo
+
+
+def puerto_libre() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def memoria_proceso_kb(pid: int) -> Optional[int]:
+    """VmRSS del proceso (Linux)."""
+    try:
+        with open(f"/proc/{pid}/status") as archivo:
+            for linea in archivo:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def iniciar_servidor(puerto: int) -> subprocess.Popen:
+    """uvicorn en un subproceso; hereda DATABASE_URL de configurar_sqlite()."""
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(puerto), "--log-level", "warning", "--backlog", "4096"],
+        cwd=DIRECTORIO_BACKEND,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+async def esperar_servidor(cliente, intentos: int = 100) -> None:
+    for _ in range(intentos):
+        try:
+            if (await cliente.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("El servidor no respondió a /health")
+
+
+class ConexionSSE:
+    """Conexión HTTP/1.1 cruda a /stream que registra cuándo llega cada tipo de evento."""
+
+    def __init__(self, host: str, puerto: int, encabezados: dict):
+        self.host, self.puerto, self.encabezados = host, puerto, encabezados
+        self.lector = self.escritor = None
+        self.eventos: dict = {}
+        self._tarea = None
+
+    async def abrir(self) -> float:
+        inicio = time.perf_counter()
+        self.lector, self.escritor = await asyncio.open_connection(self.host, self.puerto)
+        lineas = [f"GET /api/envios/stream HTTP/1.1", f"Host: {self.host}", "Accept: text/event-stream"]
+        lineas += [f"{nombre}: {valor}" for nombre, valor in self.encabezados.items()]
+        self.escritor.write(("\r\n".join(lineas) + "\r\n\r\n").encode("ascii"))
+        await self.escritor.drain()
+        estado = await self.lector.readline()
+        if b" 200 " not in estado:
+            raise RuntimeError(f"/stream respondió {estado!r}")
+        # Encabezados y primer fragmento (retry:)
+        while (await self.lector.readline()) not in (b"\r\n", b""):
+            pass
+        while b"retry:" not in await self.lector.readline():
+            pass
+        self._tarea = asyncio.get_running_loop().create_task(self._leer())
+        return time.perf_counter() - inicio
+
+    async def _leer(self) -> None:
+        while True:
+            linea = await self.lector.readline()
+            if not linea:
+                return
+            if linea.startswith(b"event: "):
+                self.eventos.setdefault(linea[7:].strip().decode(), time.perf_counter())
+
+    def cerrar(self) -> None:
+        if self._tarea:
+            self._tarea.cancel()
+        if self.escritor:
+            self.escritor.close()
+
+
+async def abrir_conexiones(host: str, puerto: int, sesiones: List[dict], total: int, lote: int):
+    """Abre `total` conexiones en tandas de `lote` (repartidor = número % len(sesiones))."""
+    conexiones, tiempos = [], []
+    for inicio in range(0, total, lote):
+        tanda = [
+            ConexionSSE(host, puerto, sesiones[numero % len(sesiones)])
+            for numero in range(inicio, min(inicio + lote, total))
+        ]
+        tiempos += await asyncio.gather(*(conexion.abrir() for conexion in tanda))
+        conexiones += tanda
+    return conexiones, tiempos
+
+
+async def ejecutar(args, pid_servidor: Optional[int]) -> dict:
+    resultado = {"configuracion": vars(args)}
+    url = urlsplit(args.url)
+    metricas = {"X-Metricas-Token": os.environ.get("METRICAS_TOKEN", "")}
+
+    async with cliente_api(args.url) as cliente:
+        await esperar_servidor(cliente)
+        n_sesiones = min(args.repartidores, args.conexiones)
+        sesiones = []
+        for i in range(n_sesiones):
+            sesiones.append(await iniciar_sesion(cliente, f"bench{i + 1}"))
+
+        memoria_inicial = memoria_proceso_kb(pid_servidor) if pid_servidor else None
+        inicio = time.perf_counter()
+        conexiones, tiempos = await abrir_conexiones(
+            url.hostname, url.port or 80, sesiones, args.conexiones, args.lote_apertura
+        )
+        resultado["apertura"] = {
+            "conexiones": len(conexiones),
+            "duracion_s": round(time.perf_counter() - inicio, 2),
+            "p50_ms": round(percentil(tiempos, 50) * 1000, 2),
+            "p95_ms": round(percentil(tiempos, 95) * 1000, 2),
+            "p99_ms": round(percentil(tiempos, 99) * 1000, 2),
+        }
+
+        await asyncio.sleep(args.inactividad)
+        resultado["servidor"] = (await cliente.get("/api/metricas/eventos", headers=metricas)).json()
+        if pid_servidor:
+            memoria = memoria_proceso_kb(pid_servidor)
+            resultado["servidor"]["memoria_kb"] = memoria
+            resultado["servidor"]["kb_por_conexion"] = round((memoria - memoria_inicial) / len(conexiones), 2)
+
+        # Un evento del repartidor bench1 (envío 1, ver sembrar_datos) a todas sus conexiones
+        propias = conexiones[::n_sesiones]
+        inicio = time.perf_counter()
+        respuesta = await cliente.post("/api/envios/1/iniciar-ruta", json={}, headers=sesiones[0])
+        limite = time.perf_counter() + 10
+        while time.perf_counter() < limite and any("envios_actualizados" not in c.eventos for c in propias):
+            await asyncio.sleep(0.005)
+        latencias = [c.eventos["envios_actualizados"] - inicio for c in propias if "envios_actualizados" in c.eventos]
+        resultado["entrega"] = {
+            "iniciar_ruta_status": respuesta.status_code,
+            "conexiones_destino": len(propias),
+            "recibidos": len(latencias),
+            "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+            "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+            "max_ms": round(max(latencias) * 1000, 2) if latencias else 0.0,
+        }
+
+        for conexion in conexiones:
+            conexion.cerrar()
+        limite = time.perf_counter() + 30
+        while time.perf_counter() < limite:
+            abiertas = (await cliente.get("/api/metricas/eventos", headers=metricas)).json()["conexiones"]
+            if abiertas == 0:
+                break
+            await asyncio.sleep(0.2)
+        resultado["cierre"] = {"conexiones_abiertas_al_final": abiertas}
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de conexiones SSE inactivas")
+    parser.add_argument("--url", default=None, help="URL de un servidor en ejecución (omitir para uvicorn local)")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "pqexpress_bench_stream.db"))
+    parser.add_argument("--conexiones", type=int, default=10000)
+    parser.add_argument("--repartidores", type=int, default=100)
+    parser.add_argument("--lote-apertura", type=int, default=500, help="Conexiones abiertas en paralelo")
+    parser.add_argument("--inactividad", type=float, default=5.0, help="Segundos con todas las conexiones abiertas")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    subir_limite_descriptores(args.conexiones + 1000)
+    servidor = None
+    if not args.url:
+        configurar_sqlite(args.db)
+        crear_esquema()
+        sembrar_datos(args.repartidores, 5)
+        os.environ.setdefault("METRICAS_TOKEN", secrets.token_hex(16))
+        puerto = puerto_libre()
+        args.url = f"http://127.0.0.1:{puerto}"
+        servidor = iniciar_servidor(puerto)
+
+    try:
+        imprimir_resultado(asyncio.run(ejecutar(args, servidor.pid if servidor else None)), args.salida)
+    finally:
+        if servidor:
+            servidor.terminate()
+            servidor.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# ============================================================
+# PQEXPRESS - Utilidades Comunes de Benchmarks
+# Base SQLite de prueba, datos sintéticos, cliente HTTP y estadísticas
+# ============================================================
+"""
+Funciones compartidas por los scripts de benchmarks.
+
+IMPORTANTE: configurar_sqlite() debe llamarse ANTES de importar cualquier
+módulo de `app`, porque database.py crea los motores al importarse.
+"""
+
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+# Permitir `python benchmarks/xxx.py` además de `python -m benchmarks.xxx`
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if DIRECTORIO_BACKEND not in sys.path:
+    sys.path.insert(0, DIRECTORIO_BACKEND)
+
+# Contraseña de todos los repartidores sintéticos
+CLAVE_PRUEBA = "123456"
+
+# Centro aproximado de la Ciudad de México (igual que los datos de schema.sql)
+LAT_CENTRO = 19.4326
+LNG_CENTRO = -99.1332
+
+
+# ============================================================
+# BASE DE DATOS DE PRUEBA
+# ============================================================
+
+def configurar_sqlite(ruta: str) -> None:
+    """
+    Apunta los motores síncrono y asíncrono a un archivo SQLite.
+
+    Args:
+        ruta: Ruta del archivo SQLite (se crea si no existe).
+    """
+    ruta = os.path.abspath(ruta)
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta}"
+    os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{ruta}"
+
+
+def crear_esquema(reiniciar: bool = True) -> None:
+    """Crea (o recrea) las tablas a partir de los modelos ORM."""
+    from app.database import Base, engine
+    from app import models  # noqa: F401  (registra los modelos en Base)
+
+    if reiniciar:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+def sembrar_datos(
+    n_repartidores: int,
+    envios_por_repartidor: int,
+    semilla: int = 42,
+    tamano_lote: int = 5000
+) -> Dict[str, int]:
+    """
+    Inserta repartidores y envíos sintéticos con inserciones masivas (Core).
+
+    Cada repartidor se llama `bench{n}` y usa CLAVE_PRUEBA. Los envíos se
+    reparten entre asignado, en_camino, completado y fallido.
+
+    Returns:
+        dict: Número de repartidores y envíos insertados.
+    """
+    from sqlalchemy import insert
+    from app.database import engine
+    from app.models import Repartidor, Envio
+    from app.security import hashear_clave
+
+    aleatorio = random.Random(semilla)
+    clave_hash = hashear_clave(CLAVE_PRUEBA)
+    ahora = datetime.utcnow().replace(microsecond=0)
+
+    with engine.begin() as conexion:
+        for inicio in range(0, n_repartidores, tamano_lote):
+            fin = min(inicio + tamano_lote, n_repartidores)
+            conexion.execute(insert(Repartidor), [
+                {
+                    "id_repartidor": i + 1,
+                    "usuario": f"bench{i + 1}",
+                    "clave_hash": clave_hash,
+                    "correo": f"bench{i + 1}@pqexpress.mx",
+                    "nombre_completo": f"Repartidor Benchmark {i + 1}",
+                    "num_telefono": f"55{i:08d}",
+                    "esta_activo": True,
+                    "fecha_alta": ahora,
+                }
+                for i in range(inicio, fin)
+            ])
+
+        total_envios = n_repartidores * envios_por_repartidor
+        lote: List[dict] = []
+        for i in range(total_envios):
+            creado = ahora - timedelta(minutes=aleatorio.randint(0, 60 * 24 * 90))
+            estatus = aleatorio.choices(
+                ["asignado", "en_camino", "completado", "fallido"],
+                weights=[30, 10, 55, 5]
+            )[0]
+            lote.append({
+                "id_envio": i + 1,
+                "numero_guia": f"BEN-{i + 1:010d}",
+                "id_repartidor": i % n_repartidores + 1,
+                "receptor_nombre": f"Cliente {i + 1}",
+                "receptor_telefono": f"55{aleatorio.randint(0, 99999999):08d}",
+                "calle": f"Calle {aleatorio.randint(1, 500)}",
+                "numero_exterior": str(aleatorio.randint(1, 3000)),
+                "colonia": f"Colonia {aleatorio.randint(1, 200)}",
+                "municipio_ciudad": "Ciudad de México",
+                "codigo_postal": f"{aleatorio.randint(1000, 16999):05d}",
+                "referencias_adicionales": "Portón negro, tocar el timbre",
+                "lat_destino": round(LAT_CENTRO + aleatorio.uniform(-0.15, 0.15), 6),
+                "lng_destino": round(LNG_CENTRO + aleatorio.uniform(-0.15, 0.15), 6),
+                "estatus_envio": estatus,
+                "fecha_asignacion": creado + timedelta(minutes=5),
+                "fecha_completado": (
+                    creado + timedelta(hours=aleatorio.randint(1, 48))
+                    if estatus in ("completado", "fallido") else None
+                ),
+                "observaciones": None,
+                "creado_en": creado,
+                "modificado_en": creado,
+            })
+            if len(lote) >= tamano_lote:
+                conexion.execute(insert(Envio), lote)
+                lote = []
+        if lote:
+            conexion.execute(insert(Envio), lote)
+
+    return {"repartidores": n_repartidores, "envios": total_envios}
+
+
+# ============================================================
+# CLIENTE HTTP
+# ============================================================
+
+@asynccontextmanager
+async def cliente_api(url: Optional[str] = None):
+    """
+    Crea un cliente httpx contra un servidor remoto o contra la app en proceso.
+
+    Args:
+        url: URL base de un servidor en ejecución (ej. http://localhost:8000).
+             Si es None se usa la app en proceso, ejecutando sus eventos de inicio y cierre.
+    """
+    import httpx
+
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=60) as cliente:
+            yield cliente
+        return
+
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=60) as cliente:
+            yield cliente
+
+
+async def iniciar_sesion(cliente, usuario: str, clave: str = CLAVE_PRUEBA) -> Dict[str, str]:
+    """
+    Inicia sesión y retorna los headers de autorización.
+
+    Raises:
+        RuntimeError: Si el login no responde 200.
+    """
+    respuesta = await cliente.post("/api/auth/login", json={"usuario": usuario, "clave": clave})
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"Login fallido para {usuario}: {respuesta.status_code} {respuesta.text}")
+    return {"Authorization": f"Bearer {respuesta.json()['token']}"}
+
+
+# ============================================================
+# ESTADÍSTICAS
+# ============================================================
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil p (0-100) por interpolación lineal."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicion = (len(ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    fraccion = posicion - inferior
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * fraccion
+
+
+def resumir_latencias(latencias: List[float], duracion_segundos: float, errores: int = 0) -> Dict[str, float]:
+    """
+    Resume latencias (en segundos) en milisegundos y throughput.
+
+    Returns:
+        dict: solicitudes, errores, rps, media/p50/p95/p99/max en ms.
+    """
+    return {
+        "solicitudes": len(latencias),
+        "errores": errores,
+        "rps": round(len(latencias) / duracion_segundos, 1) if duracion_segundos > 0 else 0.0,
+        "media_ms": round(statistics.fmean(latencias) * 1000, 2) if latencias else 0.0,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "max_ms": round(max(latencias) * 1000, 2) if latencias else 0.0,
+    }
+
+
+async def carga_concurrente(
+    operacion: Callable[[int], Awaitable[bool]],
+    concurrencia: int,
+    duracion_segundos: float
+) -> Dict[str, float]:
+    """
+    Ejecuta `operacion` en bucle desde N tareas concurrentes durante un tiempo fijo.
+
+    Args:
+        operacion: Corrutina que recibe el número de tarea y retorna True si tuvo éxito.
+        concurrencia: Número de tareas simultáneas.
+        duracion_segundos: Duración de la prueba.
+
+    Returns:
+        dict: Resumen de resumir_latencias.
+    """
+    latencias: List[float] = []
+    errores = 0
+    fin = time.perf_counter() + duracion_segundos
+
+    async def trabajador(numero: int):
+        nonlocal errores
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            exito = await operacion(numero)
+            if exito:
+                latencias.append(time.perf_counter() - inicio)
+            else:
+                errores += 1
+
+    inicio_total = time.perf_counter()
+    await asyncio.gather(*(trabajador(i) for i in range(concurrencia)))
+    return resumir_latencias(latencias, time.perf_counter() - inicio_total, errores)
+
+
+def imprimir_resultado(resultado: dict, ruta_salida: Optional[str] = None) -> None:
+    """Imprime el resultado como JSON y opcionalmente lo guarda en un archivo."""
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False, default=str)
+    print(texto)
+    if ruta_salida:
+        with open(ruta_salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto)
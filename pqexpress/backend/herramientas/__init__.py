@@ -0,0 +1,8 @@
+# ============================================================
+# PQEXPRESS - Herramientas de Mantenimiento
+# ============================================================
+"""
+Scripts de operación y diagnóstico del backend.
+Se ejecutan como módulos desde el directorio backend, ej:
+    python -m herramientas.asesor_indices
+"""
@@ -0,0 +1,174 @@
+# ============================================================
+# PQEXPRESS - Asesor de Índices
+# Ejecuta EXPLAIN sobre las consultas de cada endpoint de envíos
+# ============================================================
+"""
+Verifica que las consultas de routers/envios.py usen los índices
+compuestos: falla (código de salida 1) si alguna hace un recorrido
+completo de tabla/índice o necesita ordenar aparte (filesort / temp B-tree).
+
+Por defecto crea una base SQLite temporal con datos sintéticos. Con
+--bd-configurada usa DATABASE_URL (ej. MySQL); agregar --sembrar si esa
+base está vacía.
+
+Uso:
+    python -m herramientas.asesor_indices
+    python -m herramientas.asesor_indices --bd-configurada --sembrar --repartidores 500 --envios 400
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if DIRECTORIO_BACKEND not in sys.path:
+    sys.path.insert(0, DIRECTORIO_BACKEND)
+
+from benchmarks.comun import configurar_sqlite, crear_esquema, sembrar_datos  # noqa: E402
+
+
+def consultas_endpoints(conexion) -> dict:
+    """
+    Construye las consultas de cada endpoint con parámetros reales
+    tomados de la base (un repartidor y un cursor existentes).
+    """
+    from sqlalchemy import select
+    from app.etags import consulta_version
+    from app.geo import caja_para_radio, celdas_para_caja, rangos_para_celdas
+    from app.models import Envio
+    from app.routers import envios as r
+
+    fila = conexion.execute(
+        select(Envio.id_repartidor, Envio.id_envio, Envio.creado_en, Envio.fecha_completado, Envio.modificado_en,
+               Envio.lat_destino, Envio.lng_destino)
+        .where(Envio.fecha_completado.isnot(None), Envio.lat_destino.isnot(None))
+        .limit(1)
+    ).first()
+    if fila is None:
+        raise SystemExit("La base no tiene envíos completados; ejecutar con --sembrar")
+    id_rep = fila.id_repartidor
+    caja = caja_para_radio(float(fila.lat_destino), float(fila.lng_destino), 500)
+
+    return {
+        "GET /mis-envios": r.construir_pagina(
+            r.consulta_mis_envios(id_rep), Envio.creado_en, None, None),
+        "GET /mis-envios?limite": r.construir_pagina(
+            r.consulta_mis_envios(id_rep), Envio.creado_en, None, 50),
+        "GET /mis-envios?cursor": r.construir_pagina(
+            r.consulta_mis_envios(id_rep), Envio.creado_en, (fila.creado_en, fila.id_envio), 50),
+        "GET /mis-envios?estatus": r.construir_pagina(
+            r.consulta_mis_envios(id_rep, "asignado"), Envio.creado_en, None, 50),
+        "GET /pendientes": r.consulta_pendientes(id_rep),
+        "GET /en-ruta": r.consulta_en_ruta(id_rep),
+        "GET /historial": r.construir_pagina(
+            r.consulta_historial(id_rep), Envio.fecha_completado, None, 50),
+        "GET /historial?cursor": r.construir_pagina(
+            r.consulta_historial(id_rep), Envio.fecha_completado,
+            (fila.fecha_completado, fila.id_envio), 50),
+        "GET /sync": r.consulta_sync(id_rep, None).limit(201),
+        "GET /sync?since": r.consulta_sync(id_rep, (fila.modificado_en, fila.id_envio)).limit(201),
+        "GET /sync (bajas)": r.consulta_bajas(id_rep, fila.modificado_en),
+        "GET /ruta-optimizada": r.consulta_ruta(id_rep),
+        "GET /cercanos": r.consulta_cercanos(id_rep, rangos_para_celdas(celdas_para_caja(caja)), caja),
+        "GET /{id_envio}": r.consulta_envio(fila.id_envio, id_rep),
+        "ETag (versión)": consulta_version(id_rep),
+    }
+
+
+def explicar(conexion, consulta) -> list:
+    """
+    Ejecuta EXPLAIN (MySQL) o EXPLAIN QUERY PLAN (SQLite) sobre una consulta.
+
+    Returns:
+        list: Filas del plan como diccionarios.
+    """
+    compilada = consulta.compile(dialect=conexion.dialect)
+    if compilada.positional:
+        parametros = tuple(compilada.params[nombre] for nombre in compilada.positiontup)
+    else:
+        parametros = compilada.params
+
+    prefijo = "EXPLAIN QUERY PLAN " if conexion.dialect.name == "sqlite" else "EXPLAIN "
+    resultado = conexion.exec_driver_sql(prefijo + str(compilada), parametros)
+    return [dict(fila._mapping) for fila in resultado]
+
+
+def problemas_del_plan(dialecto: str, plan: list) -> list:
+    """
+    Detecta recorridos completos y ordenamientos extra en un plan.
+
+    Returns:
+        list: Descripciones de los problemas (vacía si el plan es bueno).
+    """
+    problemas = []
+    for paso in plan:
+        if dialecto == "sqlite":
+            detalle = paso.get("detail", "")
+            if detalle.startswith("SCAN "):
+                problemas.append(f"recorrido completo: {detalle}")
+            if "TEMP B-TREE" in detalle:
+                problemas.append(f"ordenamiento extra: {detalle}")
+        else:
+            tipo = (paso.get("type") or "").upper()
+            extra = paso.get("Extra") or ""
+            if tipo in ("ALL", "INDEX"):
+                problemas.append(f"recorrido completo ({tipo}) en {paso.get('table')}")
+            if "filesort" in extra or "temporary" in extra:
+                problemas.append(f"{extra} en {paso.get('table')}")
+    return problemas
+
+
+def describir_plan(dialecto: str, plan: list) -> str:
+    """Resume un plan en una línea legible."""
+    if dialecto == "sqlite":
+        return " | ".join(paso.get("detail", "") for paso in plan)
+    return " | ".join(
+        f"{paso.get('table')}: type={paso.get('type')} key={paso.get('key')} rows={paso.get('rows')} {paso.get('Extra') or ''}".strip()
+        for paso in plan
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica con EXPLAIN los planes de las consultas de envíos")
+    parser.add_argument("--bd-configurada", action="store_true",
+                        help="Usar DATABASE_URL en lugar de una base SQLite temporal")
+    parser.add_argument("--sembrar", action="store_true", help="Crear tablas y sembrar datos en la base configurada")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "pqexpress_asesor.db"))
+    parser.add_argument("--repartidores", type=int, default=200)
+    parser.add_argument("--envios", type=int, default=200, help="Envíos por repartidor")
+    args = parser.parse_args()
+
+    if not args.bd_configurada:
+        configurar_sqlite(args.db)
+    if not args.bd_configurada or args.sembrar:
+        crear_esquema()
+        sembrar_datos(args.repartidores, args.envios)
+
+    from app.database import engine
+
+    fallas = 0
+    with engine.connect() as conexion:
+        dialecto = conexion.dialect.name
+        # Actualizar estadísticas para que el optimizador vea el volumen real
+        if dialecto == "sqlite":
+            conexion.exec_driver_sql("ANALYZE")
+        else:
+            conexion.exec_driver_sql("ANALYZE TABLE envios")
+
+        print(f"Dialecto: {dialecto}")
+        for nombre, consulta in consultas_endpoints(conexion).items():
+            plan = explicar(conexion, consulta)
+            problemas = problemas_del_plan(dialecto, plan)
+            estado = "FALLA" if problemas else "OK"
+            print(f"[{estado:5}] {nombre:28} {describir_plan(dialecto, plan)}")
+            for problema in problemas:
+                print(f"          - {problema}")
+            fallas += bool(problemas)
+
+    print(f"\n{fallas} consulta(s) con problemas")
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
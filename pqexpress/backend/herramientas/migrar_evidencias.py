@@ -0,0 +1,187 @@
+# ============================================================
+# PQEXPRESS - Migración de Evidencias
+# Mueve las fotos Base64 de confirmaciones_entrega al almacén de evidencias
+# ============================================================
+"""
+Recorre por lotes las confirmaciones que aún tienen imagen_evidencia,
+guarda cada foto en el almacén configurado (EVIDENCIAS_BACKEND) y deja
+en la fila solo hash, tamaño y tipo MIME. Cada lote se confirma por
+separado, así que el script puede interrumpirse y volver a ejecutarse.
+
+Con --optimizar además recomprime las fotos ya migradas y genera sus
+miniaturas (requiere Pillow y la migración 004).
+
+Requiere haber aplicado database/migraciones/003_evidencias_fuera_de_bd.sql.
+
+Uso:
+    python -m herramientas.migrar_evidencias --lote 200
+    python -m herramientas.migrar_evidencias --optimizar
+"""
+
+import argparse
+import os
+import sys
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if DIRECTORIO_BACKEND not in sys.path:
+    sys.path.insert(0, DIRECTORIO_BACKEND)
+
+from sqlalchemy import func, or_, select, update  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.evidencias import almacen_evidencias, guardar_evidencia_base64  # noqa: E402
+from app.imagenes import PILLOW_DISPONIBLE, MIME_PROCESADO, generar_variantes  # noqa: E402
+from app.models import ConfirmacionEntrega  # noqa: E402
+
+
+def migrar(tamano_lote: int) -> dict:
+    """
+    Migra todas las evidencias pendientes.
+
+    Returns:
+        dict: Contadores de filas migradas, fallidas y bytes movidos.
+    """
+    migradas = 0
+    fallidas = 0
+    bytes_movidos = 0
+    ultimo_id = 0
+
+    while True:
+        db = SessionLocal()
+        try:
+            filas = db.execute(
+                select(ConfirmacionEntrega.id_confirmacion, ConfirmacionEntrega.imagen_evidencia)
+                .where(
+                    ConfirmacionEntrega.id_confirmacion > ultimo_id,
+                    ConfirmacionEntrega.imagen_evidencia.isnot(None)
+                )
+                .order_by(ConfirmacionEntrega.id_confirmacion)
+                .limit(tamano_lote)
+            ).all()
+            if not filas:
+                break
+
+            for id_confirmacion, imagen_base64 in filas:
+                ultimo_id = id_confirmacion
+                try:
+                    sha256, tamano, mime = guardar_evidencia_base64(imagen_base64)
+                except ValueError as e:
+                    print(f"  ⚠️  Confirmación {id_confirmacion}: {e}")
+                    fallidas += 1
+                    continue
+                db.execute(
+                    update(ConfirmacionEntrega)
+                    .where(ConfirmacionEntrega.id_confirmacion == id_confirmacion)
+                    .values(
+                        evidencia_sha256=sha256,
+                        evidencia_bytes=tamano,
+                        evidencia_mime=mime,
+                        imagen_evidencia=None
+                    )
+                )
+                migradas += 1
+                bytes_movidos += tamano
+
+            db.commit()
+            print(f"Lote hasta id {ultimo_id}: {migradas} migradas, {fallidas} fallidas")
+        finally:
+            db.close()
+
+    return {"migradas": migradas, "fallidas": fallidas, "bytes_movidos": bytes_movidos}
+
+
+def optimizar(tamano_lote: int) -> dict:
+    """
+    Genera foto optimizada y miniatura para las evidencias que aún no la tienen.
+
+    Returns:
+        dict: Contadores de filas optimizadas, omitidas y bytes ahorrados.
+    """
+    optimizadas = 0
+    omitidas = 0
+    bytes_ahorrados = 0
+    ultimo_id = 0
+
+    while True:
+        db = SessionLocal()
+        try:
+            filas = db.execute(
+                select(
+                    ConfirmacionEntrega.id_confirmacion,
+                    ConfirmacionEntrega.evidencia_sha256,
+                    ConfirmacionEntrega.evidencia_bytes
+                )
+                .where(
+                    ConfirmacionEntrega.id_confirmacion > ultimo_id,
+                    ConfirmacionEntrega.evidencia_sha256.isnot(None),
+                    ConfirmacionEntrega.miniatura_sha256.is_(None)
+                )
+                .order_by(ConfirmacionEntrega.id_confirmacion)
+                .limit(tamano_lote)
+            ).all()
+            if not filas:
+                break
+
+            originales = []
+            for id_confirmacion, sha256, tamano in filas:
+                ultimo_id = id_confirmacion
+                variantes = generar_variantes(sha256)
+                if variantes is None:
+                    omitidas += 1
+                    continue
+                sha_foto, bytes_foto, sha_miniatura, bytes_miniatura = variantes
+                valores = {"miniatura_sha256": sha_miniatura, "miniatura_bytes": bytes_miniatura}
+                if sha_foto != sha256:
+                    valores.update(evidencia_sha256=sha_foto, evidencia_bytes=bytes_foto, evidencia_mime=MIME_PROCESADO)
+                    originales.append(sha256)
+                    bytes_ahorrados += (tamano or 0) - bytes_foto
+                db.execute(
+                    update(ConfirmacionEntrega)
+                    .where(ConfirmacionEntrega.id_confirmacion == id_confirmacion)
+                    .values(**valores)
+                )
+                optimizadas += 1
+            db.commit()
+
+            # Eliminar del almacén las originales que ya nadie referencia
+            for sha256 in originales:
+                referencias = db.execute(
+                    select(func.count(ConfirmacionEntrega.id_confirmacion)).where(or_(
+                        ConfirmacionEntrega.evidencia_sha256 == sha256,
+                        ConfirmacionEntrega.miniatura_sha256 == sha256
+                    ))
+                ).scalar_one()
+                if referencias == 0:
+                    almacen_evidencias.eliminar(sha256)
+            print(f"Lote hasta id {ultimo_id}: {optimizadas} optimizadas, {omitidas} omitidas")
+        finally:
+            db.close()
+
+    return {"optimizadas": optimizadas, "omitidas": omitidas, "bytes_ahorrados": bytes_ahorrados}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mueve las fotos Base64 de la BD al almacén de evidencias")
+    parser.add_argument("--lote", type=int, default=200, help="Filas por transacción")
+    parser.add_argument("--optimizar", action="store_true",
+                        help="Recomprimir y generar miniaturas de las evidencias ya migradas")
+    args = parser.parse_args()
+
+    resultado = migrar(args.lote)
+    print("=" * 60)
+    print(f"✅ Migradas: {resultado['migradas']} ({resultado['bytes_movidos'] / 1_048_576:.1f} MB)")
+    print(f"⚠️  Fallidas: {resultado['fallidas']} (conservan imagen_evidencia)")
+    print("Para recuperar espacio en MySQL: OPTIMIZE TABLE confirmaciones_entrega;")
+    print("=" * 60)
+
+    if args.optimizar:
+        if not PILLOW_DISPONIBLE:
+            raise SystemExit("--optimizar requiere Pillow (pip install Pillow)")
+        resultado = optimizar(args.lote)
+        print(f"✅ Optimizadas: {resultado['optimizadas']} ({resultado['bytes_ahorrados'] / 1_048_576:.1f} MB ahorrados)")
+        print(f"⚠️  Omitidas: {resultado['omitidas']} (no son imágenes legibles)")
+        print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# ============================================================
+# PQEXPRESS - Perfil de Consultas por Endpoint
+# Cuenta las sentencias SQL de cada endpoint y detecta N+1
+# ============================================================
+"""
+Recorre los endpoints de envíos con el perfilador SQL activo
+(app/perfil_sql.py) y falla (código de salida 1) si alguno ejecuta más
+sentencias que su presupuesto en PRESUPUESTOS o repite una sentencia
+dentro de la misma solicitud (n+1 o duplicada).
+
+Al cambiar un endpoint a propósito, actualizar su presupuesto aquí en
+el mismo commit.
+
+Por defecto usa una base SQLite temporal con datos sintéticos.
+
+Uso:
+    python -m herramientas.perfil_endpoints
+    python -m herramientas.perfil_endpoints --detalle
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if DIRECTORIO_BACKEND not in sys.path:
+    sys.path.insert(0, DIRECTORIO_BACKEND)
+
+# Debe fijarse antes de importar la app
+os.environ["PERFIL_SQL_HABILITADO"] = "true"
+
+from benchmarks.comun import (  # noqa: E402
+    LAT_CENTRO, LNG_CENTRO, cliente_api, configurar_sqlite, crear_esquema, iniciar_sesion, sembrar_datos
+)
+
+# Sentencias máximas por solicitud. /pendientes es la primera después del login
+# y paga la validación del token; las demás usan la caché de sesiones.
+PRESUPUESTOS = {
+    ("POST", "/auth/login"): 5,
+    ("GET", "/envios/mis-envios"): 2,
+    ("GET", "/envios/pendientes"): 4,
+    ("GET", "/envios/en-ruta"): 2,
+    ("GET", "/envios/historial"): 2,
+    ("GET", "/envios/sync"): 2,
+    ("GET", "/envios/cercanos"): 1,
+    ("GET", "/envios/ruta-optimizada"): 1,
+    ("GET", "/envios/{id_envio}"): 2,
+    ("POST", "/envios/{id_envio}/iniciar-ruta"): 3,
+    ("POST", "/envios/{id_envio}/confirmar-entrega"): 6,
+    ("GET", "/envios/{id_envio}/confirmacion"): 2,
+    ("POST", "/envios/confirmar-entregas/lote"): 4,
+}
+
+
+async def recorrer_endpoints(usuario: str) -> None:
+    """Ejecuta una vez cada endpoint de PRESUPUESTOS con datos reales."""
+    async with cliente_api() as cliente:
+        headers = await iniciar_sesion(cliente, usuario)
+        pendientes = (await cliente.get("/api/envios/pendientes", headers=headers)).json()["envios"]
+        if len(pendientes) < 4:
+            raise SystemExit("Se necesitan al menos 4 envíos pendientes por repartidor")
+        ids = [envio["id_envio"] for envio in pendientes[:4]]
+        ubicacion = {"lat": LAT_CENTRO, "lng": LNG_CENTRO}
+
+        for ruta in ("mis-envios", "en-ruta", "historial", "sync", f"{ids[0]}"):
+            await cliente.get(f"/api/envios/{ruta}", headers=headers)
+        await cliente.get("/api/envios/cercanos", headers=headers, params={**ubicacion, "radio_metros": 5000})
+        await cliente.get("/api/envios/ruta-optimizada", headers=headers, params=ubicacion)
+
+        for id_envio in ids:
+            await cliente.post(f"/api/envios/{id_envio}/iniciar-ruta", headers=headers)
+        await cliente.post(
+            f"/api/envios/{ids[0]}/confirmar-entrega", headers=headers,
+            json={"lat_confirmacion": LAT_CENTRO, "lng_confirmacion": LNG_CENTRO, "nombre_receptor": "Perfil"}
+        )
+        await cliente.get(f"/api/envios/{ids[0]}/confirmacion", headers=headers)
+        await cliente.post("/api/envios/confirmar-entregas/lote", headers=headers, json={"confirmaciones": [
+            {"id_envio": id_envio, "lat_confirmacion": LAT_CENTRO, "lng_confirmacion": LNG_CENTRO}
+            for id_envio in ids[1:]
+        ]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica las sentencias SQL por solicitud de cada endpoint")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "pqexpress_perfil.db"))
+    parser.add_argument("--detalle", action="store_true", help="Mostrar las sentencias de cada solicitud")
+    args = parser.parse_args()
+
+    configurar_sqlite(args.db)
+    crear_esquema()
+    sembrar_datos(3, 20)
+    asyncio.run(recorrer_endpoints("bench1"))
+
+    from app.perfil_sql import historial_perfiles
+
+    fallas = 0
+    vistos = set()
+    for perfil in reversed(historial_perfiles.estadisticas()["perfiles"]):
+        clave = (perfil["metodo"], perfil["ruta"])
+        if clave not in PRESUPUESTOS or clave in vistos:
+            continue
+        vistos.add(clave)
+        presupuesto = PRESUPUESTOS[clave]
+        problemas = []
+        if perfil["codigo"] >= 400:
+            problemas.append(f"respondió {perfil['codigo']}")
+        if perfil["consultas"] > presupuesto:
+            problemas.append(f"{perfil['consultas']} sentencias (presupuesto {presupuesto})")
+        for repetida in perfil["repetidas"]:
+            problemas.append(f"{repetida['tipo']} x{repetida['veces']}: {repetida['sentencia'][:120]}")
+
+        estado = "FALLA" if problemas else "OK"
+        nombre = f"{perfil['metodo']} {perfil['ruta']}"
+        print(f"[{estado:5}] {nombre:45} {perfil['consultas']:3}/{presupuesto:<3} {perfil['tiempo_ms']:8.2f} ms en BD")
+        for problema in problemas:
+            print(f"          - {problema}")
+        if args.detalle:
+            for sentencia in perfil["sentencias"]:
+                print(f"            {sentencia['tiempo_ms']:7.2f} ms  {' '.join(sentencia['sentencia'].split())[:150]}")
+        fallas += bool(problemas)
+
+    for metodo, ruta in PRESUPUESTOS.keys() - vistos:
+        print(f"[FALLA] {metodo} {ruta:40} no se ejecutó")
+        fallas += 1
+
+    print(f"\n{fallas} endpoint(s) con problemas")
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+# ============================================================
+# PQEXPRESS - Pruebas del Backend
+# Ejecutar desde backend/: python -m pytest -q
+# ============================================================
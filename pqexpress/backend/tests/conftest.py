@@ -0,0 +1,66 @@
+# ============================================================
+# PQEXPRESS - Configuración de Pruebas
+# Base SQLite temporal y cliente de la app con datos sintéticos
+# ============================================================
+"""
+La base se configura al importar este archivo, ANTES de que cualquier
+prueba importe `app` (database.py crea los motores al importarse). Las
+evidencias van a un directorio temporal y /api/metricas usa
+TOKEN_METRICAS.
+"""
+
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.comun import CLAVE_PRUEBA, configurar_sqlite, crear_esquema, sembrar_datos
+
+TOKEN_METRICAS = "token-metricas-pruebas"
+
+_DIRECTORIO = tempfile.mkdtemp(prefix="pqexpress_pruebas_")
+os.environ["EVIDENCIAS_DIR"] = os.path.join(_DIRECTORIO, "evidencias")
+os.environ["METRICAS_TOKEN"] = TOKEN_METRICAS
+# La tarea de inicio correría mientras cada prueba recrea las tablas
+os.environ["EVIDENCIAS_REINTENTAR_AL_INICIAR"] = "false"
+configurar_sqlite(os.path.join(_DIRECTORIO, "pruebas.db"))
+
+
+def sembrar() -> None:
+    """Repartidores bench1..bench3 (clave CLAVE_PRUEBA) con 10 envíos cada uno."""
+    crear_esquema()
+    sembrar_datos(3, 10)
+
+
+@pytest.fixture(scope="session")
+def _app():
+    """
+    Una sola vida de la app para toda la sesión: el shutdown cierra los
+    pools globales (bcrypt, imágenes) y no se vuelven a abrir.
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    sembrar()
+    with TestClient(app) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def cliente(_app):
+    """App en proceso sobre una base recién sembrada (ver sembrar())."""
+    sembrar()
+    return _app
+
+
+def iniciar_sesion(cliente, usuario: str = "bench1") -> dict:
+    """Inicia sesión y retorna el encabezado Authorization."""
+    respuesta = cliente.post("/api/auth/login", json={"usuario": usuario, "clave": CLAVE_PRUEBA})
+    assert respuesta.status_code == 200, respuesta.text
+    return {"Authorization": f"Bearer {respuesta.json()['token']}"}
+
+
+@pytest.fixture
+def sesion(cliente) -> dict:
+    """Encabezados de una sesión de bench1."""
+    return iniciar_sesion(cliente)
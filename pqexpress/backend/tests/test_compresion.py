@@ -0,0 +1,82 @@
+# ============================================================
+# PQEXPRESS - Pruebas de Compresión
+# Negociación de Accept-Encoding y Vary en todas las variantes
+# ============================================================
+"""
+El middleware se prueba sobre una app Starlette mínima: una ruta JSON
+grande (se comprime), una JSON chica (bajo el umbral), una en streaming
+y una imagen (tipo fuera de COMPRESION_TIPOS).
+"""
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app import compresion
+from app.compresion import MiddlewareCompresion, elegir_codificacion
+
+
+@pytest.mark.parametrize("encabezado, esperado", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("GZIP ; q=1", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=abc", None),
+    ("br, gzip", "br"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0.8, gzip;q=0.8", "br"),
+    ("*", "br"),
+    ("*;q=0.2, br;q=0", "gzip"),
+    ("gzip;q=0, *", "br"),
+])
+def test_elegir_codificacion(monkeypatch, encabezado, esperado):
+    monkeypatch.setattr(compresion, "CODIFICACIONES", ("br", "gzip"))
+    assert elegir_codificacion(encabezado) == esperado
+
+
+def test_elegir_codificacion_sin_brotli(monkeypatch):
+    monkeypatch.setattr(compresion, "CODIFICACIONES", ("gzip",))
+    assert elegir_codificacion("br") is None
+    assert elegir_codificacion("br, gzip;q=0.1") == "gzip"
+
+
+async def _en_partes():
+    yield b'{"a": '
+    yield b"1}"
+
+
+@pytest.fixture
+def cliente():
+    app = Starlette(routes=[
+        Route("/grande", lambda request: JSONResponse({"envios": ["x" * 40] * 200})),
+        Route("/chica", lambda request: JSONResponse({"ok": True})),
+        Route("/stream", lambda request: StreamingResponse(_en_partes(), media_type="application/json")),
+        Route("/foto", lambda request: Response(b"\xff\xd8\xff" * 1000, media_type="image/jpeg")),
+    ])
+    return TestClient(MiddlewareCompresion(app))
+
+
+def _vary(respuesta) -> list:
+    return [valor.strip().lower() for valor in respuesta.headers.get("vary", "").split(",") if valor.strip()]
+
+
+@pytest.mark.parametrize("ruta", ["/grande", "/chica", "/stream"])
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity"])
+def test_vary_en_respuestas_comprimibles(cliente, ruta, accept_encoding):
+    respuesta = cliente.get(ruta, headers={"Accept-Encoding": accept_encoding})
+    assert respuesta.status_code == 200
+    assert _vary(respuesta) == ["accept-encoding"]
+    comprimida = ruta == "/grande" and accept_encoding == "gzip"
+    assert (respuesta.headers.get("content-encoding") == "gzip") == comprimida
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity"])
+def test_sin_vary_en_tipos_no_comprimibles(cliente, accept_encoding):
+    respuesta = cliente.get("/foto", headers={"Accept-Encoding": accept_encoding})
+    assert "content-encoding" not in respuesta.headers
+    assert "vary" not in respuesta.headers
@@ -0,0 +1,82 @@
+# ============================================================
+# PQEXPRESS - Pruebas de Confirmación de Entregas
+# La foto Base64 va al almacén antes del commit; la fila solo guarda el hash
+# ============================================================
+
+import base64
+import hashlib
+
+from sqlalchemy import select
+
+from app import evidencias
+from app.database import AsyncSessionLocal
+from app.models import ConfirmacionEntrega
+
+JPEG = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 40
+FOTO_BASE64 = "data:image/jpeg;base64," + base64.b64encode(JPEG).decode()
+SHA_FOTO = hashlib.sha256(JPEG).hexdigest()
+GPS = {"lat_confirmacion": 19.4326, "lng_confirmacion": -99.1332}
+
+
+def _asignados(cliente, sesion) -> list:
+    envios = cliente.get("/api/envios/pendientes", headers=sesion).json()["envios"]
+    return [envio["id_envio"] for envio in envios if envio["estatus_envio"] == "asignado"]
+
+
+def _fila(cliente, id_envio: int):
+    async def leer():
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(
+                select(
+                    ConfirmacionEntrega.imagen_evidencia,
+                    ConfirmacionEntrega.evidencia_sha256,
+                    ConfirmacionEntrega.evidencia_bytes
+                ).where(ConfirmacionEntrega.id_envio == id_envio)
+            )).one()
+    return cliente.portal.call(leer)
+
+
+def test_confirmar_entrega_guarda_la_foto_en_el_almacen(cliente, sesion):
+    id_envio = _asignados(cliente, sesion)[0]
+    respuesta = cliente.post(
+        f"/api/envios/{id_envio}/confirmar-entrega", headers=sesion,
+        json={**GPS, "imagen_evidencia": FOTO_BASE64}
+    )
+    assert respuesta.status_code == 200, respuesta.text
+    confirmacion = respuesta.json()["confirmacion"]
+    assert (confirmacion["evidencia_sha256"], confirmacion["evidencia_bytes"]) == (SHA_FOTO, len(JPEG))
+    assert confirmacion["evidencia_mime"] == "image/jpeg"
+
+    imagen_evidencia, sha256, _ = _fila(cliente, id_envio)
+    assert imagen_evidencia is None
+    assert evidencias.almacen_evidencias.existe(sha256)
+
+
+def test_lote_guarda_las_fotos_en_el_almacen(cliente, sesion):
+    ids = _asignados(cliente, sesion)[:2]
+    respuesta = cliente.post("/api/envios/confirmar-entregas/lote", headers=sesion, json={
+        "confirmaciones": [
+            {"id_envio": ids[0], **GPS, "imagen_evidencia": FOTO_BASE64},
+            {"id_envio": ids[1], **GPS},
+        ]
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    resultados = respuesta.json()["resultados"]
+    assert [r["exito"] for r in resultados] == [True, True]
+    # El hash ya está en la respuesta: la foto se guardó antes del commit
+    assert resultados[0]["confirmacion"]["evidencia_sha256"] == SHA_FOTO
+
+    imagen_evidencia, sha256, _ = _fila(cliente, ids[0])
+    assert imagen_evidencia is None
+    assert evidencias.almacen_evidencias.existe(sha256)
+    assert _fila(cliente, ids[1]) == (None, None, None)
+
+
+def test_entrega_rechazada_no_guarda_la_foto(cliente, sesion):
+    evidencias.almacen_evidencias.eliminar(SHA_FOTO)
+    respuesta = cliente.post(
+        "/api/envios/999999/confirmar-entrega", headers=sesion,
+        json={**GPS, "imagen_evidencia": FOTO_BASE64}
+    )
+    assert respuesta.status_code == 404
+    assert not evidencias.almacen_evidencias.existe(SHA_FOTO)
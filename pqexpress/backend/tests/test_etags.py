@@ -0,0 +1,60 @@
+# ============================================================
+# PQEXPRESS - Pruebas de ETags
+# If-None-Match responde 304 mientras los envíos no cambien
+# ============================================================
+
+import pytest
+
+from app import etags
+from app.etags import coincide_etag
+
+RUTA = "/api/envios/pendientes"
+
+
+@pytest.mark.parametrize("if_none_match, esperado", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"otro", W/"abc"', True),
+    ("*", True),
+    ('"otro"', False),
+])
+def test_coincide_etag(if_none_match, esperado):
+    assert coincide_etag(if_none_match, '"abc"') is esperado
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity"])
+def test_if_none_match_responde_304(cliente, sesion, accept_encoding):
+    encabezados = {**sesion, "Accept-Encoding": accept_encoding}
+    primera = cliente.get(RUTA, headers=encabezados)
+    assert primera.status_code == 200
+    etag = primera.headers["etag"]
+
+    respuesta = cliente.get(RUTA, headers={**encabezados, "If-None-Match": etag})
+    assert respuesta.status_code == 304
+    assert respuesta.content == b""
+    assert respuesta.headers["etag"].removeprefix("W/") == etag.removeprefix("W/")
+    assert "accept-encoding" in respuesta.headers["vary"].lower()
+
+
+def test_etag_depende_de_la_url(cliente, sesion):
+    etag = cliente.get(RUTA, headers=sesion).headers["etag"]
+    respuesta = cliente.get("/api/envios/mis-envios", headers={**sesion, "If-None-Match": etag})
+    assert respuesta.status_code == 200
+
+
+def test_un_cambio_invalida_el_etag(cliente, sesion, monkeypatch):
+    primera = cliente.get(RUTA, headers=sesion)
+    etag = primera.headers["etag"]
+    id_envio = next(e["id_envio"] for e in primera.json()["envios"] if e["estatus_envio"] == "asignado")
+    assert cliente.post(f"/api/envios/{id_envio}/iniciar-ruta", headers=sesion).status_code == 200
+
+    # Dentro de la ventana no se emite ETag: la respuesta se envía completa
+    respuesta = cliente.get(RUTA, headers={**sesion, "If-None-Match": etag})
+    assert respuesta.status_code == 200
+    assert "etag" not in respuesta.headers
+
+    monkeypatch.setattr(etags, "ETAG_VENTANA_SEGUNDOS", 0)
+    respuesta = cliente.get(RUTA, headers={**sesion, "If-None-Match": etag})
+    assert respuesta.status_code == 200
+    assert respuesta.headers["etag"] != etag
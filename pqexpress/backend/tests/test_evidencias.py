@@ -0,0 +1,215 @@
+# ============================================================
+# PQEXPRESS - Pruebas del Almacén de Evidencias
+# Subida multipart en streaming y recolección de archivos liberados
+# ============================================================
+
+from types import SimpleNamespace
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+from sqlalchemy import update
+
+from app import evidencias
+from app.database import AsyncSessionLocal
+from app.evidencias import (
+    AlmacenLocal, EscritorEvidencia, EvidenciaDemasiadoGrandeError, EvidenciaInvalidaError,
+    RecolectorEvidencias, _parser_multipart, recibir_evidencia
+)
+from app.models import ConfirmacionEntrega
+
+from tests.conftest import iniciar_sesion
+
+LIMITE = "----pqexpress7MA4YWxkTrZu0gW"
+JPEG = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 40
+
+
+@pytest.fixture
+def almacen(tmp_path, monkeypatch):
+    almacen = AlmacenLocal(str(tmp_path / "evidencias"))
+    monkeypatch.setattr(evidencias, "almacen_evidencias", almacen)
+    return almacen
+
+
+# ============================================================
+# MULTIPART
+# ============================================================
+
+def _formulario(*partes) -> bytes:
+    """partes: (nombre, nombre de archivo o None, contenido)."""
+    cuerpo = b""
+    for nombre, archivo, contenido in partes:
+        disposicion = f'form-data; name="{nombre}"' + (f'; filename="{archivo}"' if archivo else "")
+        cuerpo += f"--{LIMITE}\r\nContent-Disposition: {disposicion}\r\n".encode()
+        if archivo:
+            cuerpo += b"Content-Type: image/jpeg\r\n"
+        cuerpo += b"\r\n" + contenido + b"\r\n"
+    return cuerpo + f"--{LIMITE}--\r\n".encode()
+
+
+async def _en_bloques(datos: bytes, tamano: int):
+    for inicio in range(0, len(datos), tamano):
+        yield datos[inicio:inicio + tamano]
+
+
+def _recibir(cuerpo: bytes, content_type: str = f"multipart/form-data; boundary={LIMITE}", bloque: int = 7):
+    return asyncio.run(recibir_evidencia(_en_bloques(cuerpo, bloque), content_type))
+
+
+def test_multipart_toma_el_campo_imagen(almacen):
+    cuerpo = _formulario(("nota", None, b"entregado en porteria"), ("imagen", "foto.jpg", JPEG))
+    sha256, tamano, mime = _recibir(cuerpo)
+    assert (sha256, tamano, mime) == (hashlib.sha256(JPEG).hexdigest(), len(JPEG), "image/jpeg")
+    assert almacen.leer(sha256) == JPEG
+
+
+def test_multipart_usa_el_primer_archivo_si_el_campo_tiene_otro_nombre(almacen):
+    otro = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+    sha256, _, mime = _recibir(_formulario(("foto", "a.png", otro), ("extra", "b.jpg", JPEG)))
+    assert sha256 == hashlib.sha256(otro).hexdigest()
+    assert mime == "image/png"
+
+
+def test_multipart_sin_archivo(almacen):
+    with pytest.raises(EvidenciaInvalidaError, match="imagen"):
+        _recibir(_formulario(("nota", None, b"sin foto")))
+
+
+def test_multipart_sin_boundary(almacen):
+    with pytest.raises(EvidenciaInvalidaError, match="boundary"):
+        _recibir(_formulario(("imagen", "foto.jpg", JPEG)), content_type="multipart/form-data")
+
+
+def test_content_type_no_soportado(almacen):
+    with pytest.raises(EvidenciaInvalidaError) as error:
+        _recibir(JPEG, content_type="application/json")
+    assert error.value.codigo == 415
+
+
+def test_binario_crudo(almacen):
+    sha256, tamano, mime = _recibir(JPEG, content_type="image/jpeg", bloque=1000)
+    assert (sha256, tamano, mime) == (hashlib.sha256(JPEG).hexdigest(), len(JPEG), "image/jpeg")
+
+
+def test_multipart_excede_el_limite(almacen, tmp_path):
+    with EscritorEvidencia(almacen, limite_bytes=1000) as escritor:
+        parser, _ = _parser_multipart(f"multipart/form-data; boundary={LIMITE}", escritor, "imagen")
+        with pytest.raises(EvidenciaDemasiadoGrandeError):
+            parser.write(_formulario(("imagen", "foto.jpg", JPEG)))
+    # El temporal se descarta al salir
+    assert not list(tmp_path.glob("**/*.subida"))
+
+
+@pytest.mark.parametrize("cuerpo, content_type", [
+    (_formulario(("imagen", "foto.jpg", JPEG)), f"multipart/form-data; boundary={LIMITE}"),
+    (JPEG, "image/jpeg"),
+])
+def test_la_escritura_no_corre_en_el_event_loop(almacen, monkeypatch, cuerpo, content_type):
+    hilos = []
+    escribir = EscritorEvidencia.escribir
+
+    def escribir_registrando(self, bloque):
+        hilos.append(threading.get_ident())
+        escribir(self, bloque)
+
+    monkeypatch.setattr(EscritorEvidencia, "escribir", escribir_registrando)
+    # asyncio.run ejecuta el event loop en este hilo
+    sha256, _, _ = _recibir(cuerpo, content_type)
+    assert almacen.leer(sha256) == JPEG
+    assert hilos and threading.get_ident() not in hilos
+
+
+# ============================================================
+# RECOLECCIÓN
+# ============================================================
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """Reloj de evidencias.py controlado por la prueba (inicia en la hora real)."""
+    reloj = SimpleNamespace(ahora=time.time())
+    monkeypatch.setattr(evidencias, "time", SimpleNamespace(time=lambda: reloj.ahora))
+    return reloj
+
+
+def _modificar(almacen, sha256: str, fecha: float) -> None:
+    os.utime(almacen.ruta(sha256), (fecha, fecha))
+
+
+def _confirmar_entrega(cliente) -> int:
+    """Entrega un envío asignado de bench1 (sin foto) y retorna su id_confirmacion."""
+    sesion = iniciar_sesion(cliente)
+    envios = cliente.get("/api/envios/pendientes", headers=sesion).json()["envios"]
+    id_envio = next(envio["id_envio"] for envio in envios if envio["estatus_envio"] == "asignado")
+    assert cliente.post(f"/api/envios/{id_envio}/iniciar-ruta", headers=sesion).status_code == 200
+    respuesta = cliente.post(f"/api/envios/{id_envio}/confirmar-entrega", headers=sesion, json={
+        "lat_confirmacion": 19.4326, "lng_confirmacion": -99.1332
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()["confirmacion"]["id_confirmacion"]
+
+
+def test_guardar_un_archivo_existente_renueva_su_fecha(almacen):
+    sha256 = almacen.guardar(JPEG)
+    _modificar(almacen, sha256, time.time() - 3600)
+    assert almacen.guardar(JPEG) == sha256
+    assert almacen.modificado_en(sha256) > time.time() - 60
+
+
+def test_recolector_espera_la_gracia_y_borra_sin_referencias(cliente, almacen, reloj):
+    recolector = RecolectorEvidencias(gracia_segundos=60)
+    sha256 = almacen.guardar(JPEG)
+    _modificar(almacen, sha256, reloj.ahora - 3600)
+    recolector.registrar(sha256, None)
+
+    assert cliente.portal.call(recolector.barrer) == 0
+    assert almacen.existe(sha256)
+
+    reloj.ahora += 61
+    assert cliente.portal.call(recolector.barrer) == 1
+    assert not almacen.existe(sha256)
+    assert recolector.pendientes == 0
+
+
+def test_recolector_conserva_archivos_referenciados(cliente, almacen, reloj):
+    recolector = RecolectorEvidencias(gracia_segundos=60)
+    sha256 = almacen.guardar(JPEG)
+    _modificar(almacen, sha256, reloj.ahora - 3600)
+
+    async def referenciar():
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(ConfirmacionEntrega)
+                .where(ConfirmacionEntrega.id_confirmacion == id_confirmacion)
+                .values(miniatura_sha256=sha256)
+            )
+            await db.commit()
+
+    id_confirmacion = _confirmar_entrega(cliente)
+    cliente.portal.call(referenciar)
+    recolector.registrar(sha256)
+    reloj.ahora += 61
+    assert cliente.portal.call(recolector.barrer) == 0
+    assert almacen.existe(sha256)
+    assert recolector.pendientes == 0
+
+
+def test_recolector_no_borra_un_archivo_reutilizado_durante_la_gracia(cliente, almacen, reloj):
+    recolector = RecolectorEvidencias(gracia_segundos=60)
+    sha256 = almacen.guardar(JPEG)
+    _modificar(almacen, sha256, reloj.ahora - 3600)
+    recolector.registrar(sha256)
+
+    # Otra subida de la misma foto reutiliza el archivo y aún no hace commit
+    reloj.ahora += 30
+    _modificar(almacen, sha256, reloj.ahora)
+    reloj.ahora += 31
+    assert cliente.portal.call(recolector.barrer) == 0
+    assert almacen.existe(sha256)
+    # Se revisa de nuevo tras otra gracia (si nunca se referenció, se borra)
+    assert recolector.pendientes == 1
+    reloj.ahora += 61
+    assert cliente.portal.call(recolector.barrer) == 1
+
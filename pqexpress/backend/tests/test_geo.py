@@ -0,0 +1,43 @@
+# ============================================================
+# PQEXPRESS - Pruebas de Geohash
+# Codificación, prefijos y cobertura de la caja de búsqueda por radio
+# ============================================================
+
+import random
+
+import pytest
+
+from app.geo import (
+    caja_para_radio, celdas_para_caja, codificar_geohash, rangos_para_celdas, siguiente_prefijo
+)
+
+
+def test_geohash_conocido():
+    assert codificar_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert codificar_geohash(19.4326, -99.1332).startswith("9g3w")
+
+
+@pytest.mark.parametrize("prefijo, siguiente", [("u4", "u5"), ("9z", "b"), ("bzz", "c"), ("zz", None)])
+def test_siguiente_prefijo(prefijo, siguiente):
+    assert siguiente_prefijo(prefijo) == siguiente
+
+
+def test_rangos_unen_celdas_contiguas():
+    assert rangos_para_celdas(["u4", "u5", "u7"]) == [("u4", "u6"), ("u7", "u8")]
+    assert rangos_para_celdas(["zz"]) == [("zz", None)]
+
+
+@pytest.mark.parametrize("lat, lng, radio", [(19.4326, -99.1332, 500), (19.4326, -99.1332, 20000), (0.0001, -0.0001, 300)])
+def test_celdas_cubren_la_caja(lat, lng, radio):
+    caja = caja_para_radio(lat, lng, radio)
+    celdas = celdas_para_caja(caja, max_celdas=16)
+    assert 0 < len(celdas) <= 16
+    rangos = rangos_para_celdas(celdas)
+
+    lat_min, lng_min, lat_max, lng_max = caja
+    aleatorio = random.Random(3)
+    puntos = [(lat_min, lng_min), (lat_min, lng_max), (lat_max, lng_min), (lat_max, lng_max)]
+    puntos += [(aleatorio.uniform(lat_min, lat_max), aleatorio.uniform(lng_min, lng_max)) for _ in range(200)]
+    for punto_lat, punto_lng in puntos:
+        geohash = codificar_geohash(punto_lat, punto_lng)
+        assert any(inicio <= geohash and (fin is None or geohash < fin) for inicio, fin in rangos)
@@ -0,0 +1,75 @@
+# ============================================================
+# PQEXPRESS - Pruebas de Idempotencia
+# Reintentos con Idempotency-Key: repetición, 409 en proceso y 422
+# ============================================================
+
+import hashlib
+import json
+import uuid
+
+from app.idempotencia import almacen_idempotencia
+
+GPS = {"lat_confirmacion": 19.4326, "lng_confirmacion": -99.1332}
+
+
+def _id_asignado(cliente, sesion) -> int:
+    envios = cliente.get("/api/envios/pendientes", headers=sesion).json()["envios"]
+    return next(envio["id_envio"] for envio in envios if envio["estatus_envio"] == "asignado")
+
+
+def _confirmar(cliente, sesion, id_envio: int, clave: str, cuerpo: bytes):
+    return cliente.post(
+        f"/api/envios/{id_envio}/confirmar-entrega",
+        headers={**sesion, "Idempotency-Key": clave, "Content-Type": "application/json"},
+        content=cuerpo
+    )
+
+
+def test_reintento_devuelve_la_respuesta_original(cliente, sesion):
+    id_envio = _id_asignado(cliente, sesion)
+    clave, cuerpo = str(uuid.uuid4()), json.dumps(GPS).encode()
+
+    primera = _confirmar(cliente, sesion, id_envio, clave, cuerpo)
+    assert primera.status_code == 200, primera.text
+    assert "idempotent-replayed" not in primera.headers
+
+    # Sin la clave el envío ya confirmado respondería 400
+    repetida = _confirmar(cliente, sesion, id_envio, clave, cuerpo)
+    assert repetida.status_code == 200
+    assert repetida.headers["idempotent-replayed"] == "true"
+    assert repetida.json() == primera.json()
+
+
+def test_misma_clave_con_otro_cuerpo_responde_422(cliente, sesion):
+    id_envio = _id_asignado(cliente, sesion)
+    clave = str(uuid.uuid4())
+    assert _confirmar(cliente, sesion, id_envio, clave, json.dumps(GPS).encode()).status_code == 200
+
+    otro = json.dumps({**GPS, "comentarios": "otro intento"}).encode()
+    assert _confirmar(cliente, sesion, id_envio, clave, otro).status_code == 422
+
+
+def test_clave_en_proceso_responde_409(cliente, sesion):
+    id_envio = _id_asignado(cliente, sesion)
+    clave, cuerpo = str(uuid.uuid4()), json.dumps(GPS).encode()
+
+    # El primer intento (id_repartidor 1) sigue en curso
+    reservada = hashlib.sha256(
+        f"1|POST|/api/envios/{id_envio}/confirmar-entrega|{clave}".encode("utf-8")
+    ).hexdigest()
+    assert cliente.portal.call(almacen_idempotencia.reservar, reservada, hashlib.sha256(cuerpo).hexdigest()) is None
+
+    respuesta = _confirmar(cliente, sesion, id_envio, clave, cuerpo)
+    assert respuesta.status_code == 409
+    assert respuesta.headers["retry-after"] == "1"
+
+    # Al terminar el primer intento, el reintento se ejecuta normalmente
+    cliente.portal.call(almacen_idempotencia.liberar, reservada)
+    assert _confirmar(cliente, sesion, id_envio, clave, cuerpo).status_code == 200
+
+
+def test_un_intento_fallido_libera_la_clave(cliente, sesion):
+    clave, cuerpo = str(uuid.uuid4()), json.dumps(GPS).encode()
+    assert _confirmar(cliente, sesion, 999999, clave, cuerpo).status_code == 404
+    # No queda reservada: el reintento vuelve a ejecutarse (no 409)
+    assert _confirmar(cliente, sesion, 999999, clave, cuerpo).status_code == 404
@@ -0,0 +1,92 @@
+# ============================================================
+# PQEXPRESS - Pruebas de Imágenes de Evidencia
+# Las fotos guardadas no conservan metadatos EXIF
+# ============================================================
+
+import io
+import random
+
+import pytest
+
+from app import evidencias
+from app.evidencias import AlmacenLocal
+from app.imagenes import generar_variantes, optimizar_imagen
+
+Image = pytest.importorskip("PIL.Image")
+
+ETIQUETA_MODELO = 0x0110
+ETIQUETA_GPS = 0x8825
+
+
+def _jpeg_con_exif(calidad: int) -> bytes:
+    # Ruido: a calidad baja pesa mucho menos que recodificado a IMAGEN_CALIDAD
+    imagen = Image.frombytes("RGB", (128, 96), random.Random(1).randbytes(128 * 96 * 3))
+    exif = Image.Exif()
+    exif[ETIQUETA_MODELO] = "Telefono de prueba"
+    exif[ETIQUETA_GPS] = {1: "N", 2: (19.0, 25.0, 57.0)}
+    salida = io.BytesIO()
+    imagen.save(salida, format="JPEG", quality=calidad, exif=exif)
+    return salida.getvalue()
+
+
+def _sin_exif(contenido: bytes) -> bool:
+    return b"Exif" not in contenido and not dict(Image.open(io.BytesIO(contenido)).getexif())
+
+
+@pytest.fixture
+def almacen(tmp_path, monkeypatch):
+    almacen = AlmacenLocal(str(tmp_path / "evidencias"))
+    monkeypatch.setattr(evidencias, "almacen_evidencias", almacen)
+    return almacen
+
+
+def test_optimizar_elimina_exif():
+    original = _jpeg_con_exif(90)
+    assert not _sin_exif(original)
+    foto, miniatura = optimizar_imagen(original)
+    assert _sin_exif(foto)
+    assert _sin_exif(miniatura)
+
+
+def test_variantes_sin_exif_aunque_la_recodificada_pese_mas(almacen):
+    # Calidad 20: la recodificación a IMAGEN_CALIDAD pesa más que la original
+    original = _jpeg_con_exif(20)
+    sha_original = almacen.guardar(original)
+
+    sha_foto, bytes_foto, sha_miniatura, _ = generar_variantes(sha_original)
+
+    assert sha_foto != sha_original
+    assert bytes_foto > len(original)
+    assert _sin_exif(almacen.leer(sha_foto))
+    assert _sin_exif(almacen.leer(sha_miniatura))
+
+
+def _entregar(cliente, sesion) -> int:
+    """Entrega un envío asignado de bench1 (sin foto) y retorna su id."""
+    envios = cliente.get("/api/envios/pendientes", headers=sesion).json()["envios"]
+    id_envio = next(envio["id_envio"] for envio in envios if envio["estatus_envio"] == "asignado")
+    assert cliente.post(f"/api/envios/{id_envio}/iniciar-ruta", headers=sesion).status_code == 200
+    respuesta = cliente.post(f"/api/envios/{id_envio}/confirmar-entrega", headers=sesion, json={
+        "lat_confirmacion": 19.4326, "lng_confirmacion": -99.1332
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    return id_envio
+
+
+def test_miniatura_sin_archivo_responde_404(cliente, sesion):
+    id_envio = _entregar(cliente, sesion)
+    respuesta = cliente.post(
+        f"/api/envios/{id_envio}/evidencia", headers=sesion,
+        files={"imagen": ("foto.jpg", _jpeg_con_exif(90), "image/jpeg")}
+    )
+    assert respuesta.status_code == 200, respuesta.text
+
+    # La miniatura se genera en segundo plano (TestClient la ejecuta antes de responder)
+    miniatura = cliente.get(f"/api/envios/{id_envio}/evidencia/miniatura", headers=sesion)
+    assert miniatura.status_code == 200
+    assert _sin_exif(miniatura.content)
+
+    sha256 = miniatura.headers["etag"].strip('"')
+    evidencias.almacen_evidencias.eliminar(sha256)
+    respuesta = cliente.get(f"/api/envios/{id_envio}/evidencia/miniatura", headers=sesion)
+    assert respuesta.status_code == 404
@@ -0,0 +1,103 @@
+# ============================================================
+# PQEXPRESS - Pruebas de Confirmación en Lote
+# Resultado por entrega, reenvío seguro, reintento y rollback
+# ============================================================
+"""
+Un registro concurrente que gana la carrera entre la validación y el
+INSERT se simula con una primera lectura desactualizada de
+consulta_estado_lote: muestra los envíos en camino y sin confirmar.
+"""
+
+import pytest
+from sqlalchemy import literal, null, select
+from sqlalchemy.exc import IntegrityError
+
+from app.database import AsyncSessionLocal
+from app.models import ConfirmacionEntrega, Envio
+from app.routers import envios
+
+RUTA = "/api/envios/confirmar-entregas/lote"
+GPS = {"lat_confirmacion": 19.4326, "lng_confirmacion": -99.1332}
+
+
+def _asignados(cliente, sesion) -> list:
+    pendientes = cliente.get("/api/envios/pendientes", headers=sesion).json()["envios"]
+    return [envio["id_envio"] for envio in pendientes if envio["estatus_envio"] == "asignado"]
+
+
+def _lote(cliente, sesion, *ids) -> list:
+    respuesta = cliente.post(RUTA, headers=sesion, json={
+        "confirmaciones": [{"id_envio": id_envio, **GPS} for id_envio in ids]
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    return [(r["codigo"], r["confirmacion"] is not None) for r in respuesta.json()["resultados"]]
+
+
+def _estado(cliente, id_envio: int):
+    """(estatus_envio, confirmaciones registradas) del envío."""
+    async def leer():
+        async with AsyncSessionLocal() as db:
+            estatus = (await db.execute(
+                select(Envio.estatus_envio).where(Envio.id_envio == id_envio)
+            )).scalar_one()
+            confirmaciones = (await db.execute(
+                select(ConfirmacionEntrega.id_confirmacion).where(ConfirmacionEntrega.id_envio == id_envio)
+            )).scalars().all()
+            return estatus, len(confirmaciones)
+    return cliente.portal.call(leer)
+
+
+@pytest.fixture
+def vista_desactualizada(monkeypatch):
+    """Hace que las primeras `veces` lecturas del lote no vean confirmaciones."""
+    original = envios.consulta_estado_lote
+    estado = {"veces": 1, "llamadas": 0}
+
+    def consulta(ids_envio, id_repartidor):
+        estado["llamadas"] += 1
+        if estado["llamadas"] > estado["veces"]:
+            return original(ids_envio, id_repartidor)
+        return select(
+            Envio.id_envio,
+            literal("en_camino").label("estatus_envio"),
+            null().label("id_confirmacion")
+        ).where(Envio.id_envio.in_(ids_envio), Envio.id_repartidor == id_repartidor)
+
+    monkeypatch.setattr(envios, "consulta_estado_lote", consulta)
+    return estado
+
+
+def test_lote_resultado_por_entrega_y_reenvio_seguro(cliente, sesion):
+    a, b = _asignados(cliente, sesion)[:2]
+    assert _lote(cliente, sesion, a, a, 999999, b) == [(201, True), (400, False), (404, False), (201, True)]
+
+    # Reenviar el mismo lote no duplica nada: 409 con la confirmación existente
+    assert _lote(cliente, sesion, a, b) == [(409, True), (409, True)]
+    assert _estado(cliente, a) == ("completado", 1)
+    assert _estado(cliente, b) == ("completado", 1)
+
+
+def test_lote_reintenta_si_otro_registro_gana_la_carrera(cliente, sesion, vista_desactualizada):
+    a, b = _asignados(cliente, sesion)[:2]
+    # Registro concurrente de `a` que el primer intento del lote no ve
+    assert cliente.post(f"/api/envios/{a}/confirmar-entrega", headers=sesion, json=GPS).status_code == 200
+
+    assert _lote(cliente, sesion, a, b) == [(409, True), (201, True)]
+    assert vista_desactualizada["llamadas"] == 2
+    assert _estado(cliente, b) == ("completado", 1)
+
+
+def test_lote_se_revierte_completo_si_el_reintento_tambien_falla(cliente, sesion, vista_desactualizada):
+    a, b = _asignados(cliente, sesion)[:2]
+    assert cliente.post(f"/api/envios/{a}/confirmar-entrega", headers=sesion, json=GPS).status_code == 200
+    vista_desactualizada["veces"] = 2
+
+    with pytest.raises(IntegrityError):
+        _lote(cliente, sesion, a, b)
+    # Nada del lote quedó registrado
+    assert _estado(cliente, b) == ("asignado", 0)
+
+    # El cliente reenvía el lote y se registra normalmente
+    vista_desactualizada["veces"] = 0
+    assert _lote(cliente, sesion, a, b) == [(409, True), (201, True)]
+    assert _estado(cliente, b) == ("completado", 1)
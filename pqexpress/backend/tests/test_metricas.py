@@ -0,0 +1,43 @@
+# ============================================================
+# PQEXPRESS - Pruebas de Acceso a Métricas y Salud
+# /metrics y /api/metricas exigen METRICAS_TOKEN; /health/ready es público y resumido
+# ============================================================
+
+import pytest
+
+from tests.conftest import TOKEN_METRICAS
+
+
+@pytest.mark.parametrize("ruta", ["/metrics", "/api/metricas/perfil-sql", "/api/metricas/pool"])
+def test_metricas_sin_token_responden_403(cliente, sesion, ruta):
+    assert cliente.get(ruta).status_code == 403
+    assert cliente.get(ruta, headers={"X-Metricas-Token": "otro"}).status_code == 403
+    # Una sesión de repartidor no basta
+    assert cliente.get(ruta, headers=sesion).status_code == 403
+
+
+@pytest.mark.parametrize("encabezados", [
+    {"X-Metricas-Token": TOKEN_METRICAS},
+    {"Authorization": f"Bearer {TOKEN_METRICAS}"},
+])
+def test_metrics_con_token(cliente, encabezados):
+    respuesta = cliente.get("/metrics", headers=encabezados)
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("text/plain")
+
+
+def test_readiness_publico_sin_contadores(cliente):
+    respuesta = cliente.get("/health/ready")
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert cuerpo["listo"] is True
+    assert set(cuerpo) == {"servicio", "listo", "estado", "componentes"}
+    assert all(isinstance(estado, str) for estado in cuerpo["componentes"].values())
+    assert "prestadas" not in respuesta.text and "en_cola" not in respuesta.text
+
+
+def test_readiness_con_token_incluye_detalle(cliente):
+    cuerpo = cliente.get("/health/ready", headers={"X-Metricas-Token": TOKEN_METRICAS}).json()
+    assert cuerpo["listo"] is True
+    assert "pool_bd" in cuerpo and "dependencias" in cuerpo
+    assert "en_cola" in cuerpo["dependencias"]["pool_hash"]
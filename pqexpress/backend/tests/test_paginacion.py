@@ -0,0 +1,66 @@
+# ============================================================
+# PQEXPRESS - Pruebas de Paginación
+# Cursores keyset: codificación y filtro de la página siguiente
+# ============================================================
+"""
+No levantan la app ni usan la base de datos configurada: el filtro
+keyset se evalúa contra una tabla SQLite en memoria.
+"""
+
+from datetime import datetime
+import random
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, create_engine, insert, select
+
+from app.paginacion import codificar_cursor, decodificar_cursor, filtro_despues_de
+
+
+@pytest.mark.parametrize("fecha", [datetime(2026, 3, 1, 14, 30, 5, 123000), None])
+def test_cursor_ida_y_vuelta(fecha):
+    cursor = codificar_cursor(fecha, 42)
+    assert "=" not in cursor
+    assert decodificar_cursor(cursor) == (fecha, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "no-es-base64!", codificar_cursor(None, 1)[:-2], "eyJhIjoxfQ"])
+def test_cursor_invalido_responde_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decodificar_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_filtro_keyset_recorre_todo_con_nulls_al_final():
+    metadata = MetaData()
+    tabla = Table(
+        "filas", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("fecha", DateTime, nullable=True),
+    )
+    motor = create_engine("sqlite://")
+    metadata.create_all(motor)
+    aleatorio = random.Random(7)
+    # Fechas repetidas y NULL para ejercitar el desempate por id
+    fechas = [datetime(2026, 1, 1 + aleatorio.randrange(3)) for _ in range(30)] + [None] * 8
+    aleatorio.shuffle(fechas)
+
+    orden = (tabla.c.fecha.desc(), tabla.c.id.desc())
+    with motor.connect() as conexion:
+        conexion.execute(insert(tabla), [{"id": i + 1, "fecha": fecha} for i, fecha in enumerate(fechas)])
+        esperado = [fila.id for fila in conexion.execute(select(tabla.c.id).order_by(*orden))]
+
+        recorrido, posicion = [], None
+        while True:
+            consulta = select(tabla.c.id, tabla.c.fecha).order_by(*orden).limit(4)
+            if posicion is not None:
+                consulta = consulta.where(filtro_despues_de(tabla.c.fecha, tabla.c.id, *posicion))
+            pagina = conexion.execute(consulta).all()
+            if not pagina:
+                break
+            recorrido += [fila.id for fila in pagina]
+            posicion = decodificar_cursor(codificar_cursor(pagina[-1].fecha, pagina[-1].id))
+
+    assert recorrido == esperado
+    # Las filas sin fecha van al final
+    assert all(fechas[i - 1] is None for i in recorrido[-8:])
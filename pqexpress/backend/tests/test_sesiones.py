@@ -0,0 +1,60 @@
+# ============================================================
+# PQEXPRESS - Pruebas de la Caché de Sesiones
+# Logout, nuevo login y desactivación revocan el token de inmediato
+# ============================================================
+
+from datetime import datetime, timedelta
+
+from app.cache import CacheSesiones, cache_sesiones
+from app.database import AsyncSessionLocal
+from app.security import calcular_hash_token, desactivar_repartidor
+
+from tests.conftest import iniciar_sesion
+
+
+def _en_cache(sesion: dict) -> bool:
+    return cache_sesiones.obtener(calcular_hash_token(sesion["Authorization"][7:])) is not None
+
+
+def test_logout_revoca_el_token_en_cache(cliente, sesion):
+    assert cliente.get("/api/auth/me", headers=sesion).status_code == 200
+    assert _en_cache(sesion)
+
+    assert cliente.post("/api/auth/logout", headers=sesion).status_code == 200
+    assert not _en_cache(sesion)
+    assert cliente.get("/api/auth/me", headers=sesion).status_code == 401
+
+
+def test_nuevo_login_revoca_la_sesion_anterior(cliente, sesion):
+    assert cliente.get("/api/auth/me", headers=sesion).status_code == 200
+
+    nueva = iniciar_sesion(cliente)
+    assert cliente.get("/api/auth/me", headers=sesion).status_code == 401
+    assert cliente.get("/api/auth/me", headers=nueva).status_code == 200
+
+
+def test_desactivar_repartidor_revoca_el_token_en_cache(cliente, sesion):
+    assert cliente.get("/api/auth/me", headers=sesion).status_code == 200
+    assert _en_cache(sesion)
+
+    async def desactivar():
+        async with AsyncSessionLocal() as db:
+            return await desactivar_repartidor(db, 1)
+
+    assert cliente.portal.call(desactivar) is True
+    assert not _en_cache(sesion)
+    assert cliente.get("/api/auth/me", headers=sesion).status_code == 401
+    # Tampoco puede volver a entrar
+    respuesta = cliente.post("/api/auth/login", json={"usuario": "bench1", "clave": "123456"})
+    assert respuesta.status_code in (401, 403)
+    # Los demás repartidores no se ven afectados
+    assert cliente.get("/api/auth/me", headers=iniciar_sesion(cliente, "bench2")).status_code == 200
+
+
+def test_no_se_guarda_una_sesion_invalidada_durante_la_validacion():
+    cache = CacheSesiones(max_entradas=10, ttl_segundos=60)
+    generacion = cache.generacion(7)
+    # Un logout o desactivación llega mientras la solicitud consulta la BD
+    cache.invalidar_repartidor(7)
+    assert cache.guardar_sesion("h", {"id_repartidor": 7}, datetime.utcnow() + timedelta(hours=1), generacion) is False
+    assert cache.obtener("h") is None
@@ -0,0 +1,72 @@
+# ============================================================
+# PQEXPRESS - Pruebas de Sincronización Incremental
+# Token de /sync y bajas (tombstones) por reasignación o eliminación
+# ============================================================
+
+from datetime import datetime
+
+from sqlalchemy import delete, update
+
+from app.database import AsyncSessionLocal
+from app.models import Envio
+from app.paginacion import codificar_token_sync, decodificar_token_sync
+
+
+def test_token_sync_ida_y_vuelta():
+    fecha, bajas = datetime(2026, 3, 1, 8), datetime(2026, 2, 28, 23, 59)
+    assert decodificar_token_sync(codificar_token_sync(fecha, 7, bajas)) == (fecha, 7, bajas)
+
+
+def _sync(cliente, sesion, since=None) -> dict:
+    params = {"since": since} if since else {}
+    respuesta = cliente.get("/api/envios/sync", headers=sesion, params=params)
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()
+
+
+def _ejecutar(cliente, *sentencias) -> None:
+    async def ejecutar():
+        async with AsyncSessionLocal() as db:
+            for sentencia in sentencias:
+                await db.execute(sentencia)
+            await db.commit()
+    cliente.portal.call(ejecutar)
+
+
+def _reasignar(id_envio: int, id_repartidor: int):
+    return update(Envio).where(Envio.id_envio == id_envio).values(id_repartidor=id_repartidor)
+
+
+def test_sync_informa_envios_reasignados_y_eliminados(cliente, sesion):
+    inicial = _sync(cliente, sesion)
+    assert inicial["completo"] and inicial["eliminados"] == []
+    ids = [envio["id_envio"] for envio in inicial["envios"]]
+    reasignado, eliminado = ids[0], ids[1]
+
+    _ejecutar(cliente, _reasignar(reasignado, 2), delete(Envio).where(Envio.id_envio == eliminado))
+
+    delta = _sync(cliente, sesion, inicial["siguiente_token"])
+    assert not delta["completo"]
+    assert delta["eliminados"] == sorted([reasignado, eliminado])
+    assert not {reasignado, eliminado} & {envio["id_envio"] for envio in delta["envios"]}
+
+
+def test_sync_no_informa_como_baja_un_envio_devuelto(cliente, sesion):
+    inicial = _sync(cliente, sesion)
+    id_envio = inicial["envios"][0]["id_envio"]
+
+    # Se reasigna a otro repartidor y vuelve antes de la siguiente sincronización
+    _ejecutar(cliente, _reasignar(id_envio, 2))
+    _ejecutar(cliente, _reasignar(id_envio, 1))
+
+    delta = _sync(cliente, sesion, inicial["siguiente_token"])
+    assert id_envio not in delta["eliminados"]
+    assert id_envio in {envio["id_envio"] for envio in delta["envios"]}
+
+
+def test_token_vencido_fuerza_sincronizacion_completa(cliente, sesion):
+    antiguo = datetime(2000, 1, 1)
+    respuesta = _sync(cliente, sesion, codificar_token_sync(antiguo, 0, antiguo))
+    assert respuesta["completo"]
+    assert respuesta["eliminados"] == []
+    assert len(respuesta["envios"]) == len(_sync(cliente, sesion)["envios"])
@@ -0,0 +1,27 @@
+-- ============================================================
+-- PQEXPRESS - Migración 001
+-- Hash indexado del token en tokens_sesion
+-- ============================================================
+-- La validación de sesiones buscaba por jwt_token (TEXT sin índice),
+-- lo que recorría toda la tabla en cada solicitud autenticada.
+-- Se agrega token_hash = SHA-256 del JWT con índice único.
+-- Ejecutar una sola vez sobre una base creada con el schema.sql anterior.
+-- ============================================================
+
+USE pqexpress_db;
+
+-- 1. Agregar la columna (nula mientras se rellena)
+ALTER TABLE tokens_sesion
+    ADD COLUMN token_hash CHAR(64) NULL COMMENT 'SHA-256 del token JWT (búsqueda indexada)' AFTER jwt_token;
+
+-- 2. Rellenar filas existentes (SHA2 produce el mismo hex en minúsculas que hashlib)
+UPDATE tokens_sesion SET token_hash = SHA2(jwt_token, 256) WHERE token_hash IS NULL;
+
+-- 3. Eliminar duplicados (tokens idénticos emitidos en el mismo segundo), conservando el más reciente
+DELETE t1 FROM tokens_sesion t1
+JOIN tokens_sesion t2 ON t1.token_hash = t2.token_hash AND t1.id_token < t2.id_token;
+
+-- 4. Hacer la columna obligatoria y crear el índice único
+ALTER TABLE tokens_sesion
+    MODIFY token_hash CHAR(64) NOT NULL COMMENT 'SHA-256 del token JWT (búsqueda indexada)',
+    ADD UNIQUE INDEX idx_token_hash (token_hash);
@@ -0,0 +1,21 @@
+-- ============================================================
+-- PQEXPRESS - Migración 002
+-- Índices compuestos para las consultas de envíos
+-- ============================================================
+-- Los listados filtran por id_repartidor (+ estatus_envio) y ordenan
+-- por creado_en, fecha_asignacion o fecha_completado. Con índices de
+-- una sola columna MySQL tenía que ordenar con filesort.
+-- idx_repartidor queda cubierto por la columna inicial de los nuevos
+-- índices (incluido el FOREIGN KEY), por lo que se elimina.
+-- Verificar planes con: python -m herramientas.asesor_indices
+-- ============================================================
+
+USE pqexpress_db;
+
+ALTER TABLE envios
+    ADD INDEX idx_envios_rep_creado (id_repartidor, creado_en, id_envio),
+    ADD INDEX idx_envios_rep_estatus_creado (id_repartidor, estatus_envio, creado_en, id_envio),
+    ADD INDEX idx_envios_rep_estatus_asignacion (id_repartidor, estatus_envio, fecha_asignacion),
+    ADD INDEX idx_envios_rep_completado (id_repartidor, fecha_completado, id_envio, estatus_envio);
+
+ALTER TABLE envios DROP INDEX idx_repartidor;
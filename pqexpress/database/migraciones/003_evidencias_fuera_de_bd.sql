@@ -0,0 +1,19 @@
+-- ============================================================
+-- PQEXPRESS - Migración 003
+-- Evidencias fotográficas fuera de confirmaciones_entrega
+-- ============================================================
+-- Las fotos pasan a un almacén de archivos direccionado por contenido
+-- (app/evidencias.py). La fila solo guarda hash, tamaño y tipo MIME.
+-- Después de ejecutar este script, mover las fotos existentes con:
+--     python -m herramientas.migrar_evidencias
+-- y recuperar el espacio con: OPTIMIZE TABLE confirmaciones_entrega;
+-- ============================================================
+
+USE pqexpress_db;
+
+ALTER TABLE confirmaciones_entrega
+    MODIFY imagen_evidencia LONGTEXT COMMENT 'Obsoleto: foto en Base64 (ver herramientas/migrar_evidencias.py)',
+    ADD COLUMN evidencia_sha256 CHAR(64) COMMENT 'SHA-256 de la foto en el almacén de evidencias' AFTER imagen_evidencia,
+    ADD COLUMN evidencia_bytes INT COMMENT 'Tamaño de la foto en bytes' AFTER evidencia_sha256,
+    ADD COLUMN evidencia_mime VARCHAR(50) COMMENT 'Tipo MIME de la foto' AFTER evidencia_bytes,
+    ADD INDEX idx_evidencia (evidencia_sha256);
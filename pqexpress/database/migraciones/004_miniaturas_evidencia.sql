@@ -0,0 +1,14 @@
+-- ============================================================
+-- PQEXPRESS - Migración 004
+-- Miniaturas de las fotos de evidencia
+-- ============================================================
+-- app/imagenes.py recomprime cada foto (sin EXIF) y genera una miniatura
+-- JPEG en el almacén de evidencias. Para procesar las fotos existentes:
+--     python -m herramientas.migrar_evidencias --optimizar
+-- ============================================================
+
+USE pqexpress_db;
+
+ALTER TABLE confirmaciones_entrega
+    ADD COLUMN miniatura_sha256 CHAR(64) COMMENT 'SHA-256 de la miniatura JPEG en el almacén de evidencias' AFTER evidencia_mime,
+    ADD COLUMN miniatura_bytes INT COMMENT 'Tamaño de la miniatura en bytes' AFTER miniatura_sha256;
@@ -0,0 +1,51 @@
+-- ============================================================
+-- PQEXPRESS - Migración 005
+-- Sincronización incremental de envíos (GET /envios/sync)
+-- ============================================================
+-- /sync devuelve los envíos con modificado_en posterior al token del
+-- cliente, usando idx_envios_rep_modificado. Las reasignaciones y
+-- eliminaciones quedan en envios_bajas mediante triggers para que la
+-- app borre su copia local.
+-- ============================================================
+
+USE pqexpress_db;
+
+ALTER TABLE envios
+    ADD INDEX idx_envios_rep_modificado (id_repartidor, modificado_en, id_envio);
+
+CREATE TABLE IF NOT EXISTS envios_bajas (
+    id_baja INT PRIMARY KEY AUTO_INCREMENT,
+    id_envio INT NOT NULL COMMENT 'Envío reasignado o eliminado (sin FK: la marca sobrevive al envío)',
+    id_repartidor INT NOT NULL COMMENT 'Repartidor que tenía el envío',
+    motivo ENUM('reasignado', 'eliminado') NOT NULL,
+    registrado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_bajas_rep_registrado (id_repartidor, registrado_en)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='Bajas de envíos para sincronización incremental';
+
+DELIMITER //
+
+CREATE TRIGGER trg_envios_baja_reasignado
+AFTER UPDATE ON envios
+FOR EACH ROW
+BEGIN
+    IF OLD.id_repartidor IS NOT NULL AND NOT (OLD.id_repartidor <=> NEW.id_repartidor) THEN
+        INSERT INTO envios_bajas (id_envio, id_repartidor, motivo)
+        VALUES (OLD.id_envio, OLD.id_repartidor, 'reasignado');
+    END IF;
+END //
+
+CREATE TRIGGER trg_envios_baja_eliminado
+AFTER DELETE ON envios
+FOR EACH ROW
+BEGIN
+    IF OLD.id_repartidor IS NOT NULL THEN
+        INSERT INTO envios_bajas (id_envio, id_repartidor, motivo)
+        VALUES (OLD.id_envio, OLD.id_repartidor, 'eliminado');
+    END IF;
+END //
+
+DELIMITER ;
+
+-- Bajas de más de 90 días ya no las necesita ningún cliente activo
+-- (un token más antiguo debe hacer sincronización completa). Limpiar con:
+-- DELETE FROM envios_bajas WHERE registrado_en < NOW() - INTERVAL 90 DAY;
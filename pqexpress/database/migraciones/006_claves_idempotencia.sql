@@ -0,0 +1,22 @@
+-- ============================================================
+-- PQEXPRESS - Migración 006
+-- Claves de idempotencia compartidas entre workers
+-- ============================================================
+-- Solo se usa con IDEMPOTENCIA_BACKEND=bd; con el valor por defecto
+-- (memoria) las claves viven en cada proceso.
+-- Las filas expiradas se reemplazan al reutilizar la clave; para purgar
+-- el resto periódicamente:
+-- DELETE FROM claves_idempotencia WHERE expira_en < UTC_TIMESTAMP();
+-- ============================================================
+
+USE pqexpress_db;
+
+CREATE TABLE IF NOT EXISTS claves_idempotencia (
+    clave CHAR(64) PRIMARY KEY COMMENT 'SHA-256 de repartidor + endpoint + Idempotency-Key',
+    huella CHAR(64) NOT NULL COMMENT 'SHA-256 del cuerpo de la solicitud',
+    estado ENUM('en_proceso', 'completada') NOT NULL,
+    codigo_estado INT COMMENT 'Código HTTP de la respuesta guardada',
+    cuerpo MEDIUMTEXT COMMENT 'Respuesta JSON guardada',
+    expira_en DATETIME NOT NULL,
+    INDEX idx_expira (expira_en)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='Claves de idempotencia de operaciones de escritura';
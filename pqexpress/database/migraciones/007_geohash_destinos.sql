@@ -0,0 +1,50 @@
+-- ============================================================
+-- PQEXPRESS - Migración 007
+-- Índice geohash de destinos (GET /envios/cercanos)
+-- ============================================================
+-- Cada envío guarda el geohash de 9 caracteres de su destino. Una
+-- búsqueda por radio o caja se traduce en pocos rangos de prefijo que
+-- idx_envios_rep_geohash resuelve sin recorrer los envíos del repartidor.
+-- Los triggers mantienen la columna en cualquier INSERT/UPDATE.
+-- ============================================================
+
+USE pqexpress_db;
+
+ALTER TABLE envios
+    ADD COLUMN geohash_destino VARCHAR(12) COMMENT 'Geohash de 9 caracteres del destino (lo calculan los triggers)' AFTER lng_destino,
+    ADD INDEX idx_envios_rep_geohash (id_repartidor, geohash_destino);
+
+DELIMITER //
+
+CREATE TRIGGER trg_envios_geohash_insert
+BEFORE INSERT ON envios
+FOR EACH ROW
+BEGIN
+    IF NEW.lat_destino IS NULL OR NEW.lng_destino IS NULL THEN
+        SET NEW.geohash_destino = NULL;
+    ELSE
+        SET NEW.geohash_destino = ST_GeoHash(NEW.lng_destino, NEW.lat_destino, 9);
+    END IF;
+END //
+
+CREATE TRIGGER trg_envios_geohash_update
+BEFORE UPDATE ON envios
+FOR EACH ROW
+BEGIN
+    IF NOT (NEW.lat_destino <=> OLD.lat_destino AND NEW.lng_destino <=> OLD.lng_destino) THEN
+        IF NEW.lat_destino IS NULL OR NEW.lng_destino IS NULL THEN
+            SET NEW.geohash_destino = NULL;
+        ELSE
+            SET NEW.geohash_destino = ST_GeoHash(NEW.lng_destino, NEW.lat_destino, 9);
+        END IF;
+    END IF;
+END //
+
+DELIMITER ;
+
+-- Completar las filas existentes sin cambiar modificado_en
+-- (/sync no necesita volver a enviarlas)
+UPDATE envios
+SET geohash_destino = ST_GeoHash(lng_destino, lat_destino, 9),
+    modificado_en = modificado_en
+WHERE lat_destino IS NOT NULL AND lng_destino IS NOT NULL;
@@ -0,0 +1,22 @@
+-- ============================================================
+-- PQEXPRESS - Migración 008
+-- Rastreo GPS de repartidores (POST /rastreo/puntos)
+-- ============================================================
+-- La API acumula los puntos en memoria y los inserta por lotes
+-- (RASTREO_LOTE_MAX filas por INSERT). La tabla solo crece: para
+-- conservar, por ejemplo, 30 días, purgar periódicamente con
+-- DELETE FROM puntos_rastreo WHERE capturado_en < UTC_TIMESTAMP() - INTERVAL 30 DAY LIMIT 10000;
+-- ============================================================
+
+USE pqexpress_db;
+
+CREATE TABLE IF NOT EXISTS puntos_rastreo (
+    id_punto BIGINT PRIMARY KEY AUTO_INCREMENT,
+    id_repartidor INT NOT NULL COMMENT 'Sin FK: solo se agregan filas, por lotes',
+    lat DECIMAL(10,8) NOT NULL,
+    lng DECIMAL(11,8) NOT NULL,
+    precision_metros SMALLINT COMMENT 'Precisión del GPS redondeada a metros',
+    velocidad DECIMAL(5,2) COMMENT 'm/s',
+    capturado_en DATETIME NOT NULL COMMENT 'Hora del dispositivo (UTC)',
+    INDEX idx_rastreo_rep_capturado (id_repartidor, capturado_en)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='Recorrido GPS de los repartidores';
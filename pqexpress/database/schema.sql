@@ -35,12 +35,14 @@ CREATE TABLE IF NOT EXISTS tokens_sesion (
     id_token INT PRIMARY KEY AUTO_INCREMENT,
     id_repartidor INT NOT NULL,
     jwt_token TEXT NOT NULL COMMENT 'Token JWT generado',
+    token_hash CHAR(64) NOT NULL COMMENT 'SHA-256 del token JWT (búsqueda indexada)',
     info_dispositivo VARCHAR(300) COMMENT 'Información del dispositivo',
     direccion_ip VARCHAR(50) COMMENT 'IP desde donde se conectó',
     creado_en DATETIME DEFAULT CURRENT_TIMESTAMP,
     expira_en DATETIME NOT NULL COMMENT 'Fecha/hora de expiración del token',
     token_activo BOOLEAN DEFAULT TRUE COMMENT 'Si el token sigue siendo válido',
     FOREIGN KEY (id_repartidor) REFERENCES repartidores(id_repartidor) ON DELETE CASCADE,
+    UNIQUE INDEX idx_token_hash (token_hash),
     INDEX idx_repartidor (id_repartidor),
     INDEX idx_activo (token_activo)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='Tokens de sesión activos';
@@ -63,6 +65,7 @@ CREATE TABLE IF NOT EXISTS envios (
     referencias_adicionales TEXT COMMENT 'Referencias para ubicar la dirección',
     lat_destino DECIMAL(10,8) COMMENT 'Latitud del punto de entrega',
     lng_destino DECIMAL(11,8) COMMENT 'Longitud del punto de entrega',
+    geohash_destino VARCHAR(12) COMMENT 'Geohash de 9 caracteres del destino (lo calculan los triggers)',
     estatus_envio ENUM('asignado', 'en_camino', 'completado', 'fallido') DEFAULT 'asignado' COMMENT 'Estado actual del envío',
     fecha_asignacion DATETIME COMMENT 'Cuándo se asignó al repartidor',
     fecha_completado DATETIME COMMENT 'Cuándo se marcó como entregado',
@@ -70,11 +73,48 @@ CREATE TABLE IF NOT EXISTS envios (
     creado_en DATETIME DEFAULT CURRENT_TIMESTAMP,
     modificado_en DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (id_repartidor) REFERENCES repartidores(id_repartidor) ON DELETE SET NULL,
-    INDEX idx_repartidor (id_repartidor),
     INDEX idx_estatus (estatus_envio),
-    INDEX idx_guia (numero_guia)
+    INDEX idx_guia (numero_guia),
+    -- Índices compuestos para las consultas del API (ver models.Envio.__table_args__)
+    -- También sirven al FOREIGN KEY de id_repartidor (columna inicial)
+    INDEX idx_envios_rep_creado (id_repartidor, creado_en, id_envio),
+    INDEX idx_envios_rep_estatus_creado (id_repartidor, estatus_envio, creado_en, id_envio),
+    INDEX idx_envios_rep_estatus_asignacion (id_repartidor, estatus_envio, fecha_asignacion),
+    INDEX idx_envios_rep_completado (id_repartidor, fecha_completado, id_envio, estatus_envio),
+    INDEX idx_envios_rep_modificado (id_repartidor, modificado_en, id_envio),
+    INDEX idx_envios_rep_geohash (id_repartidor, geohash_destino)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='Paquetes/envíos a entregar';
 
+-- Geohash del destino para GET /envios/cercanos (ver app/geo.py).
+-- Se crean junto a la tabla para que también cubran los datos de prueba.
+DELIMITER //
+
+CREATE TRIGGER trg_envios_geohash_insert
+BEFORE INSERT ON envios
+FOR EACH ROW
+BEGIN
+    IF NEW.lat_destino IS NULL OR NEW.lng_destino IS NULL THEN
+        SET NEW.geohash_destino = NULL;
+    ELSE
+        SET NEW.geohash_destino = ST_GeoHash(NEW.lng_destino, NEW.lat_destino, 9);
+    END IF;
+END //
+
+CREATE TRIGGER trg_envios_geohash_update
+BEFORE UPDATE ON envios
+FOR EACH ROW
+BEGIN
+    IF NOT (NEW.lat_destino <=> OLD.lat_destino AND NEW.lng_destino <=> OLD.lng_destino) THEN
+        IF NEW.lat_destino IS NULL OR NEW.lng_destino IS NULL THEN
+            SET NEW.geohash_destino = NULL;
+        ELSE
+            SET NEW.geohash_destino = ST_GeoHash(NEW.lng_destino, NEW.lat_destino, 9);
+        END IF;
+    END IF;
+END //
+
+DELIMITER ;
+
 -- ============================================================
 -- TABLA: confirmaciones_entrega
 -- Registro de entregas realizadas con evidencia
@@ -86,7 +126,12 @@ CREATE TABLE IF NOT EXISTS confirmaciones_entrega (
     lat_confirmacion DECIMAL(10,8) NOT NULL COMMENT 'Latitud GPS donde se entregó',
     lng_confirmacion DECIMAL(11,8) NOT NULL COMMENT 'Longitud GPS donde se entregó',
     precision_metros DECIMAL(10,2) COMMENT 'Precisión del GPS en metros',
-    imagen_evidencia LONGTEXT COMMENT 'Foto de evidencia en Base64',
+    imagen_evidencia LONGTEXT COMMENT 'Obsoleto: foto en Base64 (ver herramientas/migrar_evidencias.py)',
+    evidencia_sha256 CHAR(64) COMMENT 'SHA-256 de la foto en el almacén de evidencias',
+    evidencia_bytes INT COMMENT 'Tamaño de la foto en bytes',
+    evidencia_mime VARCHAR(50) COMMENT 'Tipo MIME de la foto',
+    miniatura_sha256 CHAR(64) COMMENT 'SHA-256 de la miniatura JPEG en el almacén de evidencias',
+    miniatura_bytes INT COMMENT 'Tamaño de la miniatura en bytes',
     nombre_receptor VARCHAR(120) COMMENT 'Nombre de quien recibió el paquete',
     resultado_entrega ENUM('exitosa', 'rechazada', 'parcial') NOT NULL DEFAULT 'exitosa',
     razon_fallo TEXT COMMENT 'Motivo si la entrega falló',
@@ -95,9 +140,52 @@ CREATE TABLE IF NOT EXISTS confirmaciones_entrega (
     FOREIGN KEY (id_envio) REFERENCES envios(id_envio) ON DELETE CASCADE,
     FOREIGN KEY (id_repartidor) REFERENCES repartidores(id_repartidor) ON DELETE CASCADE,
     INDEX idx_envio (id_envio),
-    INDEX idx_repartidor (id_repartidor)
+    INDEX idx_repartidor (id_repartidor),
+    INDEX idx_evidencia (evidencia_sha256)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='Confirmaciones de entrega con evidencia';
 
+-- ============================================================
+-- TABLA: claves_idempotencia
+-- Respuestas guardadas por Idempotency-Key (IDEMPOTENCIA_BACKEND=bd)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS claves_idempotencia (
+    clave CHAR(64) PRIMARY KEY COMMENT 'SHA-256 de repartidor + endpoint + Idempotency-Key',
+    huella CHAR(64) NOT NULL COMMENT 'SHA-256 del cuerpo de la solicitud',
+    estado ENUM('en_proceso', 'completada') NOT NULL,
+    codigo_estado INT COMMENT 'Código HTTP de la respuesta guardada',
+    cuerpo MEDIUMTEXT COMMENT 'Respuesta JSON guardada',
+    expira_en DATETIME NOT NULL,
+    INDEX idx_expira (expira_en)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='Claves de idempotencia de operaciones de escritura';
+
+-- ============================================================
+-- TABLA: puntos_rastreo
+-- Recorrido GPS de los repartidores (POST /rastreo/puntos)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS puntos_rastreo (
+    id_punto BIGINT PRIMARY KEY AUTO_INCREMENT,
+    id_repartidor INT NOT NULL COMMENT 'Sin FK: solo se agregan filas, por lotes',
+    lat DECIMAL(10,8) NOT NULL,
+    lng DECIMAL(11,8) NOT NULL,
+    precision_metros SMALLINT COMMENT 'Precisión del GPS redondeada a metros',
+    velocidad DECIMAL(5,2) COMMENT 'm/s',
+    capturado_en DATETIME NOT NULL COMMENT 'Hora del dispositivo (UTC)',
+    INDEX idx_rastreo_rep_capturado (id_repartidor, capturado_en)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='Recorrido GPS de los repartidores';
+
+-- ============================================================
+-- TABLA: envios_bajas
+-- Marcas de envíos que dejaron de pertenecer a un repartidor (GET /envios/sync)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS envios_bajas (
+    id_baja INT PRIMARY KEY AUTO_INCREMENT,
+    id_envio INT NOT NULL COMMENT 'Envío reasignado o eliminado (sin FK: la marca sobrevive al envío)',
+    id_repartidor INT NOT NULL COMMENT 'Repartidor que tenía el envío',
+    motivo ENUM('reasignado', 'eliminado') NOT NULL,
+    registrado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_bajas_rep_registrado (id_repartidor, registrado_en)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='Bajas de envíos para sincronización incremental';
+
 -- ============================================================
 -- DATOS DE PRUEBA
 -- ============================================================
@@ -165,6 +253,29 @@ BEGIN
     COMMIT;
 END //
 
+-- Marcar la baja cuando un envío cambia de repartidor o se elimina.
+-- Nota: las acciones de FOREIGN KEY (ON DELETE SET NULL al borrar un
+-- repartidor) no disparan triggers en MySQL.
+CREATE TRIGGER trg_envios_baja_reasignado
+AFTER UPDATE ON envios
+FOR EACH ROW
+BEGIN
+    IF OLD.id_repartidor IS NOT NULL AND NOT (OLD.id_repartidor <=> NEW.id_repartidor) THEN
+        INSERT INTO envios_bajas (id_envio, id_repartidor, motivo)
+        VALUES (OLD.id_envio, OLD.id_repartidor, 'reasignado');
+    END IF;
+END //
+
+CREATE TRIGGER trg_envios_baja_eliminado
+AFTER DELETE ON envios
+FOR EACH ROW
+BEGIN
+    IF OLD.id_repartidor IS NOT NULL THEN
+        INSERT INTO envios_bajas (id_envio, id_repartidor, motivo)
+        VALUES (OLD.id_envio, OLD.id_repartidor, 'eliminado');
+    END IF;
+END //
+
 DELIMITER ;
 
 -- ============================================================